@@ -0,0 +1,168 @@
+import asyncio
+import functools
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Optional
+
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+from starlette.routing import Route, WebSocketRoute
+from starlette.websockets import WebSocket, WebSocketDisconnect
+
+from maafw_appium import api_handlers
+from maafw_appium.async_stream import FrameHub, FrameHubs
+from maafw_appium.stream_client import StreamClient
+
+# 与 server.py 使用相同的端口环境变量，两种服务可以互相替换
+port = int(os.environ.get('FLASK_PORT', 5000))
+
+# WebDriver 调用等阻塞操作使用的线程池，连接数量不影响线程数量
+executor = ThreadPoolExecutor(
+    max_workers=int(os.environ.get('MAA_ASGI_WORKERS', 32)),
+    thread_name_prefix="AsgiBlocking"
+)
+# 推流帧编码使用单独的线程池，不会排在等待设备响应的操作后面
+# 同一帧的编码结果在连接之间共享，大部分调用只是打包帧头，线程数不需要与 CPU 核数一致
+encode_executor = ThreadPoolExecutor(
+    max_workers=int(os.environ.get('MAA_ASGI_ENCODERS', 8)),
+    thread_name_prefix="AsgiEncode"
+)
+hubs = FrameHubs()
+
+
+async def run_blocking(func, *args, pool: ThreadPoolExecutor = None):
+    """在线程池中执行阻塞调用"""
+    return await asyncio.get_running_loop().run_in_executor(pool or executor, functools.partial(func, *args))
+
+
+def endpoint_for(func, method: str):
+    async def endpoint(request: Request):
+        data = dict(request.query_params)
+        if method == 'POST':
+            try:
+                body = await request.json()
+            except ValueError:
+                body = None
+            if isinstance(body, dict):
+                data.update(body)
+        return JSONResponse(await run_blocking(func, data))
+
+    return endpoint
+
+
+async def receive_control(ws: WebSocket, client: StreamClient, changed: asyncio.Event):
+    """读取客户端的控制消息，连接断开时返回"""
+    while True:
+        message = await ws.receive()
+        if message["type"] == "websocket.disconnect":
+            return
+        data = message.get("text") if message.get("text") is not None else message.get("bytes")
+        if data is not None and client.handle_control(data):
+            changed.set()
+
+
+async def screen_stream(ws: WebSocket):
+    """屏幕推流，参数和消息格式与 server.py 的 /screen 相同
+
+    同一设备的连接共享一个 FrameHub，在事件循环中等待新帧，编码在线程池中进行，
+    相同参数的连接共用同一帧的编码结果。
+    """
+    await ws.accept()
+    client = StreamClient.from_args(ws.query_params)
+    session_id = ws.query_params.get('session_id')
+    changed = asyncio.Event()
+    receiver = asyncio.create_task(receive_control(ws, client, changed))
+    hub: Optional[FrameHub] = None
+    token = 0
+    requested = None
+    reported = None
+    try:
+        while not receiver.done():
+            session, current = api_handlers.stream_source(session_id)
+            if current is not (hub.broadcaster if hub else None):
+                # 会话重建后切换到新的生产者
+                if hub:
+                    await run_blocking(hub.broadcaster.unsubscribe, token)
+                    hubs.release(hub)
+                    hub = None
+                client.reset()
+                requested = None
+                if current:
+                    token = await run_blocking(current.subscribe)
+                    hub = hubs.acquire(current)
+
+            if hub is not None and (changed.is_set() or requested != client.interval):
+                changed.clear()
+                requested = client.interval
+                await run_blocking(hub.broadcaster.request_interval, token, requested)
+
+            if hub is None:
+                # 会话初始化期间推送进度
+                if session is not None and (session.session_id, session.state) != reported:
+                    reported = (session.session_id, session.state)
+                    status = await run_blocking(lambda: session.status)
+                    await ws.send_text(json.dumps({"type": "session", **status}))
+                await asyncio.sleep(0.5)
+                continue
+
+            # 按自适应帧率限速，期间产生的旧帧直接跳过，只有输入操作后的突发帧立即发送
+            wait = client.wait_time()
+            paced = wait > 0
+            frame = await hub.wait_for_frame(client.last_seq, timeout=min(wait, 0.5) if paced else 0.5, burst_only=paced)
+            if frame is None:
+                heartbeat = None if paced else client.heartbeat()
+                if heartbeat:
+                    await ws.send_text(heartbeat)
+                continue
+
+            started = time.monotonic()
+            if client.is_cached(frame):
+                # 其他连接已经编码过，直接在事件循环中打包
+                message = client.render(frame, hub.broadcaster.capture_seconds)
+            else:
+                message = await run_blocking(client.render, frame, hub.broadcaster.capture_seconds, pool=encode_executor)
+            encoded = time.monotonic()
+            if isinstance(message, bytes):
+                await ws.send_bytes(message)
+            else:
+                await ws.send_text(message)
+            client.record_sent(message, encoded - started, time.monotonic() - encoded)
+    except WebSocketDisconnect:
+        pass
+    except Exception as e:
+        print(f"WebSocket error: {e}")
+    finally:
+        receiver.cancel()
+        if hub:
+            hubs.release(hub)
+            try:
+                await run_blocking(hub.broadcaster.unsubscribe, token)
+            except Exception:
+                pass
+
+
+@asynccontextmanager
+async def lifespan(app):
+    api_handlers.preload_resources()
+    yield
+    executor.shutdown(wait=False)
+    encode_executor.shutdown(wait=False)
+
+
+routes = [
+    Route(path, endpoint_for(func, method), methods=[method], name=func.__name__)
+    for (method, path), func in api_handlers.ROUTES.items()
+]
+routes.append(WebSocketRoute('/screen', screen_stream))
+
+app = Starlette(routes=routes, lifespan=lifespan)
+
+
+if __name__ == '__main__':
+    import uvicorn
+
+    uvicorn.run(app, host='127.0.0.1', port=port)
@@ -0,0 +1,154 @@
+import math
+from dataclasses import dataclass, fields
+from typing import Any, Dict, Optional
+
+# 输出缩放档位，量化后多个客户端更容易共享同一份编码
+SCALE_LEVELS = (1.0, 0.75, 0.5, 0.375, 0.25)
+QUALITY_STEP = 5
+
+# 指数滑动平均系数
+EWMA_ALPHA = 0.3
+
+# 约束字段的取值范围，超出范围的值被截断；帧率和缩放必须为正数，否则忽略
+BOUND_LIMITS = {
+    "target_fps": (0.1, 60.0),
+    "min_fps": (0.1, 60.0),
+    "min_quality": (1, 100),
+    "max_quality": (1, 100),
+    "min_scale": (0.05, 1.0),
+    "max_scale": (0.05, 1.0),
+}
+
+
+def _ewma(current: Optional[float], sample: float) -> float:
+    if current is None:
+        return sample
+    return current + EWMA_ALPHA * (sample - current)
+
+
+def _parse_bound(name: str, raw: Any) -> Optional[float]:
+    """解析单个约束字段，无法解析、非有限值或应为正数却不是正数时返回 None"""
+    try:
+        value = float(raw)
+    except (TypeError, ValueError):
+        return None
+    if not math.isfinite(value):
+        return None
+    limits = BOUND_LIMITS.get(name)
+    if limits is None:
+        return value
+    if value <= 0:
+        return None
+    value = max(limits[0], min(limits[1], value))
+    return int(value) if name in ("min_quality", "max_quality") else value
+
+
+@dataclass
+class StreamBounds:
+    """客户端给定的推流约束
+
+    自适应控制器只在这些范围内调整帧率、质量和缩放。
+    """
+    target_fps: float = 2.0
+    min_fps: float = 0.5
+    max_kbps: Optional[float] = None  # None 表示不限制带宽
+    min_quality: int = 40
+    max_quality: int = 90
+    min_scale: float = 0.25
+    max_scale: float = 1.0
+
+    def update(self, values: Dict[str, Any]):
+        """用控制消息或查询参数中的字段更新约束，忽略未知字段和无效的值"""
+        for field in fields(self):
+            if field.name not in values or values[field.name] is None:
+                continue
+            value = _parse_bound(field.name, values[field.name])
+            if value is None:
+                print(f"忽略无效的推流参数 {field.name}={values[field.name]!r}")
+                continue
+            setattr(self, field.name, value)
+        if self.max_kbps is not None and self.max_kbps <= 0:
+            self.max_kbps = None
+        self.min_fps = min(self.min_fps, self.target_fps)
+        self.min_quality = min(self.min_quality, self.max_quality)
+        self.min_scale = min(self.min_scale, self.max_scale)
+
+
+class AdaptiveRateController:
+    """根据截图耗时、编码耗时和发送背压调整推流参数
+
+    - 帧间隔: 不快于 target_fps，也不快于设备截图能力；发送阻塞时放慢，最慢到 min_fps
+    - 质量/缩放: 超出带宽预算或发送阻塞时先降质量，质量到底后再降分辨率；
+      余量充足时按相反顺序恢复
+    """
+
+    def __init__(self, bounds: Optional[StreamBounds] = None):
+        self.bounds = bounds or StreamBounds()
+        self.quality = self.bounds.max_quality
+        self.scale = self._clamp_scale(self.bounds.max_scale)
+        self._slowdown = 1.0
+        self.capture_seconds: Optional[float] = None
+        self.encode_seconds: Optional[float] = None
+        self.send_seconds: Optional[float] = None
+        self.frame_bytes: Optional[float] = None
+
+    def update_bounds(self, values: Dict[str, Any]):
+        self.bounds.update(values)
+        self.quality = max(self.bounds.min_quality, min(self.bounds.max_quality, self.quality))
+        self.scale = self._clamp_scale(self.scale)
+
+    @property
+    def interval(self) -> float:
+        """当前帧间隔(秒)"""
+        interval = self._slowdown / self.bounds.target_fps
+        if self.capture_seconds is not None:
+            interval = max(interval, self.capture_seconds)
+        return min(interval, 1.0 / self.bounds.min_fps)
+
+    def record_capture(self, seconds: float):
+        self.capture_seconds = _ewma(self.capture_seconds, seconds)
+
+    def record_frame(self, nbytes: int, encode_seconds: float, send_seconds: float):
+        """记录一帧的发送情况并调整参数"""
+        self.frame_bytes = _ewma(self.frame_bytes, nbytes)
+        self.encode_seconds = _ewma(self.encode_seconds, encode_seconds)
+        self.send_seconds = _ewma(self.send_seconds, send_seconds)
+
+        frame_interval = 1.0 / self.bounds.target_fps
+        congested = self.send_seconds > frame_interval * 0.5
+        over_budget = False
+        under_budget = True
+        if self.bounds.max_kbps is not None:
+            budget = self.bounds.max_kbps * 1000 / 8 * self.interval
+            over_budget = self.frame_bytes > budget * 1.1
+            under_budget = self.frame_bytes < budget * 0.6
+
+        if congested or over_budget:
+            self._degrade()
+            if congested:
+                self._slowdown = min(self._slowdown * 1.25, self.bounds.target_fps / self.bounds.min_fps)
+        elif under_budget and self.send_seconds < frame_interval * 0.2:
+            self._slowdown = max(1.0, self._slowdown / 1.1)
+            self._improve()
+
+    def _degrade(self):
+        if self.quality - QUALITY_STEP * 2 >= self.bounds.min_quality:
+            self.quality -= QUALITY_STEP * 2
+            return
+        self.quality = self.bounds.min_quality
+        smaller = [level for level in SCALE_LEVELS if level < self.scale and level >= self.bounds.min_scale]
+        if smaller:
+            self.scale = smaller[0]
+
+    def _improve(self):
+        larger = [level for level in SCALE_LEVELS if self.scale < level <= self.bounds.max_scale]
+        if larger:
+            self.scale = larger[-1]
+            return
+        self.quality = min(self.bounds.max_quality, self.quality + QUALITY_STEP)
+
+    def _clamp_scale(self, scale: float) -> float:
+        allowed = [level for level in SCALE_LEVELS if self.bounds.min_scale <= level <= self.bounds.max_scale]
+        if not allowed:
+            return self.bounds.max_scale
+        return min(allowed, key=lambda level: abs(level - scale))
@@ -0,0 +1,307 @@
+"""HTTP 接口的处理逻辑，Flask(server.py) 和 ASGI(asgi_server.py) 两种服务共用
+
+每个处理函数接收合并后的查询参数和 JSON 请求体，返回 {"status": ..., ...} 字典。
+处理函数会阻塞在 WebDriver 调用上，异步服务需要在线程池中调用。
+"""
+import atexit
+import functools
+import os
+import threading
+from typing import Any, Callable, Dict, Optional
+
+from .appium_android_controller import AppiumAndroidController
+from .appium_ios_controller import AppiumIOSController
+from .connection import ConnectionOptions
+from .device_session import DeviceSession, STATE_READY
+from .resource_cache import resource_cache
+from .screen_broadcaster import ScreenBroadcaster
+from .session_registry import SessionRegistry, device_key
+from .session_worker import WorkerPool
+
+# 所有设备会话，请求通过 session_id 指定设备，未指定时使用最近创建的会话
+sessions = SessionRegistry()
+
+# 启动时预加载的资源路径，/init 未指定 resource_path 时使用
+preload_resource_path = os.environ.get('MAA_RESOURCE_PATH')
+
+# 会话隔离方式: thread(默认，所有会话在本进程内运行) / process(每个会话一个工作进程)
+# process 模式下每个工作进程各自加载资源和 OCR 模型，不与其他会话共享
+session_isolation = os.environ.get('MAA_SESSION_ISOLATION', 'thread')
+# process 模式的工作进程池，第一次使用时创建
+worker_pool: Optional[WorkerPool] = None
+worker_pool_lock = threading.Lock()
+
+NOT_READY = {"status": "error", "message": "控制器未初始化"}
+NOT_FOUND = {"status": "error", "message": "会话不存在"}
+
+
+def get_worker_pool() -> WorkerPool:
+    global worker_pool
+    with worker_pool_lock:
+        if worker_pool is None:
+            worker_pool = WorkerPool(standby=int(os.environ.get('MAA_WORKER_STANDBY', 1)))
+            # 服务退出时结束工作进程，避免进程和其中的 Appium 会话残留
+            atexit.register(worker_pool.shutdown)
+        return worker_pool
+
+
+def controller_class_for(capabilities: dict):
+    """根据 platformName 选择控制器，默认 iOS"""
+    platform = capabilities.get('platformName') or capabilities.get('appium:platformName') or ''
+    if str(platform).lower() == 'android':
+        return AppiumAndroidController
+    return AppiumIOSController
+
+
+def find_session(data: Dict[str, Any]) -> Optional[DeviceSession]:
+    """按 session_id 查找会话，未指定时返回最近创建的会话"""
+    return sessions.get(data.get('session_id'))
+
+
+def ready_session(data: Dict[str, Any]) -> Optional[DeviceSession]:
+    """返回已就绪的会话"""
+    session = find_session(data)
+    if session is None or session.state != STATE_READY:
+        return None
+    return session
+
+
+def handler(func: Callable[[Dict[str, Any]], dict]) -> Callable[[Dict[str, Any]], dict]:
+    """把处理函数抛出的异常转换为错误响应"""
+
+    @functools.wraps(func)
+    def wrapper(data: Dict[str, Any]) -> dict:
+        try:
+            return func(data)
+        except Exception as e:
+            return {"status": "error", "message": str(e)}
+
+    return wrapper
+
+
+def on_session_lost(lost: ScreenBroadcaster, error: Exception):
+    print(f"会话已断开: {error}")
+    # 只关闭这个生产者所属的会话，其他设备不受影响
+    session = sessions.find_by_broadcaster(lost)
+    if session is not None:
+        sessions.remove(session.session_id)
+        session.close()
+
+
+@handler
+def init_controller(data: Dict[str, Any]) -> dict:
+    capabilities = data.get('capabilities', {})
+    server_url = data.get('server_url', 'http://127.0.0.1:4723')
+    # 截图来源: png(默认) / jpeg / mjpeg，或 {"type": "mjpeg", "url": ...}
+    screenshot_source = data.get('screenshot_source')
+    # 连接池配置: {"pool_size": 4, "connect_timeout": 10, "read_timeout": 120, "retries": 2, "compression": true}
+    connection_options = ConnectionOptions.from_dict(data.get('connection'))
+    # 文本查找使用的页面结构快照有效期(秒)，默认 0 每次都在设备端查询，大于 0 时开启快照
+    page_source_ttl = float(data.get('page_source_ttl', 0))
+    # 资源路径，指定时与 WebDriver 会话并行加载
+    resource_path = data.get('resource_path') or preload_resource_path
+    # 为 true 时立即返回 session_id，通过 /init/status 或 /screen 查询进度
+    run_async = bool(data.get('async', False))
+    # thread / process，process 时会话在独立的工作进程中运行，识别不会拖慢其他设备
+    isolation = data.get('isolation', session_isolation)
+    controller_class = controller_class_for(capabilities)
+    controller_kwargs = {
+        "capabilities": capabilities,
+        "server_url": server_url,
+        "screenshot_source": screenshot_source,
+        "connection_options": connection_options,
+        "page_source_ttl": page_source_ttl
+    }
+
+    if isolation == 'process':
+        session = get_worker_pool().create_session(
+            controller_class,
+            controller_kwargs,
+            resource_path=resource_path,
+            on_session_lost=on_session_lost
+        )
+    else:
+        session = DeviceSession(
+            lambda: controller_class(**controller_kwargs),
+            resource_path=resource_path,
+            on_session_lost=on_session_lost
+        )
+    # 同一设备重新初始化时关闭旧会话，其他设备的会话不受影响；无法识别设备时替换同一服务上的上一个此类会话
+    for replaced in sessions.add(session, device_key(capabilities, server_url)):
+        replaced.close()
+    session.start()
+
+    if run_async:
+        return {"status": "success", "session_id": session.session_id, "data": session.status}
+
+    if not session.wait():
+        sessions.remove(session.session_id)
+        session.close()
+        return {"status": "error", "message": session.error or "会话初始化失败"}
+    return {"status": "success", "session_id": session.session_id}
+
+
+@handler
+def init_status(data: Dict[str, Any]) -> dict:
+    session = find_session(data)
+    if session is None:
+        return NOT_FOUND
+    return {"status": "success", "data": session.status}
+
+
+@handler
+def list_sessions(data: Dict[str, Any]) -> dict:
+    return {"status": "success", "data": [session.status for session in sessions.all()]}
+
+
+@handler
+def close_session(data: Dict[str, Any]) -> dict:
+    session = find_session(data)
+    if session is None:
+        return NOT_FOUND
+    sessions.remove(session.session_id)
+    session.close()
+    return {"status": "success"}
+
+
+@handler
+def tap(data: Dict[str, Any]) -> dict:
+    session = ready_session(data)
+    if not session:
+        return NOT_READY
+
+    x = data.get('x', 0)
+    y = data.get('y', 0)
+
+    # 使用 click 方法替代 tap
+    success = session.controller.click(int(x), int(y))
+    if not success:
+        return {"status": "error", "message": "点击操作失败"}
+    # 推流立即截取操作后的画面，不必等到下一次定时截图
+    session.notify_input()
+    return {"status": "success"}
+
+
+@handler
+def swipe(data: Dict[str, Any]) -> dict:
+    session = ready_session(data)
+    if not session:
+        return NOT_READY
+
+    start_x = data.get('startX', 0)
+    start_y = data.get('startY', 0)
+    end_x = data.get('endX', 0)
+    end_y = data.get('endY', 0)
+    duration = data.get('duration', 0.5)
+
+    # 转换为整数并将秒转为毫秒
+    success = session.controller.swipe(
+        int(start_x),
+        int(start_y),
+        int(end_x),
+        int(end_y),
+        int(duration * 1000)
+    )
+    if not success:
+        return {"status": "error", "message": "滑动操作失败"}
+    session.notify_input()
+    return {"status": "success"}
+
+
+@handler
+def long_press(data: Dict[str, Any]) -> dict:
+    session = ready_session(data)
+    if not session:
+        return NOT_READY
+
+    x = data.get('x', 0)
+    y = data.get('y', 0)
+    duration = data.get('duration', 1.0)
+
+    success = session.controller.long_click(x, y, duration)
+
+    if not success:
+        return {"status": "error", "message": "长按操作失败"}
+    session.notify_input()
+    return {"status": "success"}
+
+
+@handler
+def batch(data: Dict[str, Any]) -> dict:
+    session = ready_session(data)
+    if not session:
+        return NOT_READY
+
+    # {"actions": [{"type": "tap", "x": 1, "y": 2}, {"type": "pause", "duration": 0.2}, ...]}
+    actions = data.get('actions', [])
+    if not isinstance(actions, list):
+        return {"status": "error", "message": "actions 必须是数组"}
+
+    success = session.controller.perform_batch(actions)
+    if not success:
+        return {"status": "error", "message": "批量操作失败"}
+    session.notify_input()
+    return {"status": "success", "count": len(actions)}
+
+
+@handler
+def screen_info(data: Dict[str, Any]) -> dict:
+    session = ready_session(data)
+    if not session:
+        return NOT_READY
+    return {"status": "success", "data": session.info()}
+
+
+@handler
+def run_pipeline(data: Dict[str, Any]) -> dict:
+    session = ready_session(data)
+    if not session:
+        return NOT_READY
+
+    # {"pipeline": {"Entry": {...}, ...}}，使用会话的资源运行
+    pipeline = data.get('pipeline')
+    if not isinstance(pipeline, dict):
+        return {"status": "error", "message": "pipeline 必须是对象"}
+
+    return {"status": "success", "data": session.run_pipeline(pipeline)}
+
+
+# (方法, 路径) -> 处理函数
+ROUTES = {
+    ('POST', '/init'): init_controller,
+    ('GET', '/init/status'): init_status,
+    ('GET', '/sessions'): list_sessions,
+    ('POST', '/session/close'): close_session,
+    ('POST', '/action/tap'): tap,
+    ('POST', '/action/swipe'): swipe,
+    ('POST', '/action/long_press'): long_press,
+    ('POST', '/action/batch'): batch,
+    ('GET', '/screen_info'): screen_info,
+    ('POST', '/pipeline/run'): run_pipeline,
+}
+
+
+def stream_source(session_id: Optional[str]):
+    """/screen 连接当前应订阅的会话和生产者，会话未就绪时生产者为 None"""
+    session = sessions.get(session_id)
+    if session is None or session.state != STATE_READY:
+        return session, None
+    return session, session.broadcaster
+
+
+def preload_resources():
+    """在后台预加载 MAA_RESOURCE_PATH 指定的资源，第一次 /init 直接命中缓存"""
+    if session_isolation == 'process':
+        # 资源在工作进程中加载，这里只预热进程池
+        get_worker_pool().warm()
+        return
+    if not preload_resource_path:
+        return
+
+    def load():
+        try:
+            resource_cache.preload(preload_resource_path)
+        except Exception as e:
+            print(f"预加载资源失败: {e}")
+
+    threading.Thread(target=load, name="ResourcePreload", daemon=True).start()
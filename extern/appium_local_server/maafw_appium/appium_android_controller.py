@@ -1,19 +1,14 @@
 from appium import webdriver
-import numpy as np
 from maa.notification_handler import NotificationHandler
-from selenium.webdriver.common.action_chains import ActionChains
-from selenium.webdriver.common.actions import interaction
-from selenium.webdriver.common.actions.action_builder import ActionBuilder
-from selenium.webdriver.common.actions.pointer_input import PointerInput
-from typing import Dict, Any
+from typing import Dict, Any, Union
 from appium.options.android import UiAutomator2Options
-import cv2
 
-from maa.resource import Resource
-from maa.tasker import Tasker
-from .custom_actions import LongPressAction, RecNext, RatioPanel, AppBack, ForEach, FindText
 
 from .appium_controller import AppiumController
+from .connection import ConnectionOptions, create_connection
+from .frame_cache import invalidates_frame_cache
+from .screencap_pipeline import ScreencapOptions
+from .screenshot_source import ScreenshotSource
 
 
 class AppiumAndroidController(AppiumController):
@@ -22,12 +17,25 @@ class AppiumAndroidController(AppiumController):
         capabilities: Dict[str, Any],
         server_url: str = "http://127.0.0.1:4723",
         notification_handler: NotificationHandler = None,
+        screencap_options: ScreencapOptions = None,
+        preview_options: ScreencapOptions = None,
+        screenshot_source: Union[str, Dict[str, Any], ScreenshotSource] = None,
+        frame_cache_max_age: float = 0.2,
+        connection_options: ConnectionOptions = None,
+        page_source_ttl: float = 0,
     ):
         """
         初始化 Android Appium 控制器
         :param capabilities: Appium capabilities 配置字典
         :param server_url: Appium 服务器地址
         :param notification_handler: 通知处理器
+        :param screencap_options: MAA 识别用截图的解码配置
+        :param preview_options: 推流预览用截图的解码配置
+        :param screenshot_source: 截图来源 "png" / "jpeg" / "mjpeg" 或其配置字典，默认 "png"
+        :param frame_cache_max_age: MAA 识别与推流共用截图缓存的有效期(秒)，0 表示不缓存
+        :param connection_options: 与 Appium 服务器之间的连接池、超时和重试配置
+        :param page_source_ttl: 文本查找使用的页面结构快照有效期(秒)，默认 0 每次都在设备端查询；
+            快照只在输入操作后失效，动画、网络加载等引起的画面变化期间可能返回旧结果
         """
         super().__init__(notification_handler=notification_handler)
         self.notification_handler = notification_handler
@@ -36,7 +44,13 @@ class AppiumAndroidController(AppiumController):
         self.device_height = 0
         self.server_url = server_url
         self.capabilities = capabilities
+        self.connection_options = connection_options or ConnectionOptions()
+        self.init_screencap_pipelines(screencap_options, preview_options, frame_cache_max_age)
+        self.init_actions()
         self.init_driver()
+        self.init_scheduler()
+        self.init_screenshot_source(screenshot_source, "android")
+        self.init_page_source(page_source_ttl, "android")
         self.init_device_size()
 
     def init_driver(self):
@@ -49,12 +63,14 @@ class AppiumAndroidController(AppiumController):
             if "platformName" not in self.capabilities:
                 options.set_capability("platformName", "Android")
 
-            self.driver = webdriver.Remote(self.server_url, options=options)
+            self.connection = create_connection(self.server_url, self.connection_options)
+            self.driver = webdriver.Remote(command_executor=self.connection, options=options)
             print("Successfully connected to Appium server")
         except Exception as e:
             print(f"Failed to initialize driver: {e}")
             raise
 
+    @invalidates_frame_cache
     def start_app(self, intent: str) -> bool:
         try:
             self.driver.start_activity(intent.split("/")[0], intent.split("/")[1])
@@ -63,6 +79,7 @@ class AppiumAndroidController(AppiumController):
             print(f"Start app failed: {e}")
             return False
 
+    @invalidates_frame_cache
     def stop_app(self, intent: str) -> bool:
         try:
             self.driver.terminate_app(intent.split("/")[0])
@@ -96,112 +113,7 @@ class AppiumAndroidController(AppiumController):
         except Exception as e:
             print(f"获取设备尺寸失败: {e}")
 
-    def screencap(self) -> np.ndarray:
-        print("screencap start")
-        try:
-            # 获取截图
-            screenshot = self.driver.get_screenshot_as_png()
-            # 直接将PNG转换为numpy数组
-            image_array = cv2.imdecode(
-                np.frombuffer(screenshot, np.uint8), cv2.IMREAD_COLOR
-            )
-
-            # 计算目标尺寸（竖屏应用，以宽度为短边）
-            target_w = self.device_width
-            target_h = int(self.device_height * self.device_width / self.device_width)
-
-            image_array = cv2.resize(
-                image_array, (target_w, target_h), interpolation=cv2.INTER_LANCZOS4
-            )
-
-            return image_array
-        except Exception as e:
-            print(f"Screenshot failed: {e}")
-            return np.zeros((1280, 720, 3), dtype=np.uint8)
-
-    def click(self, x: int, y: int) -> bool:
-        try:
-            print(f"Click {x} {y}")
-            actions = ActionChains(self.driver)
-            actions.w3c_actions = ActionBuilder(
-                self.driver, mouse=PointerInput(interaction.POINTER_TOUCH, "touch")
-            )
-            actions.w3c_actions.pointer_action.move_to_location(x, y)
-            actions.w3c_actions.pointer_action.pointer_down()
-            actions.w3c_actions.pointer_action.pause(0.1)
-            actions.w3c_actions.pointer_action.release()
-            actions.perform()
-            return True
-        except Exception as e:
-            print(f"Click failed: {e}")
-            return False
-
-    def long_click(self, x: int, y: int, duration: float = 2.0) -> bool:
-        try:
-            print(f"Long click at {x}, {y} for {duration} seconds")
-            actions = ActionChains(self.driver)
-            actions.w3c_actions = ActionBuilder(
-                self.driver, mouse=PointerInput(interaction.POINTER_TOUCH, "touch")
-            )
-            actions.w3c_actions.pointer_action.move_to_location(x, y)
-            actions.w3c_actions.pointer_action.pointer_down()
-            actions.w3c_actions.pointer_action.pause(duration)
-            actions.w3c_actions.pointer_action.release()
-            actions.perform()
-            return True
-        except Exception as e:
-            print(f"Long click failed: {e}")
-            return False
-
-    def swipe(self, x1: int, y1: int, x2: int, y2: int, duration: int) -> bool:
-        print("swipe start")
-        try:
-            actions = ActionChains(self.driver)
-            actions.w3c_actions = ActionBuilder(
-                self.driver, mouse=PointerInput(interaction.POINTER_TOUCH, "touch")
-            )
-            actions.w3c_actions.pointer_action.move_to_location(x1, y1)
-            actions.w3c_actions.pointer_action.pointer_down()
-            actions.w3c_actions.pointer_action.pause(duration / 1000)
-            actions.w3c_actions.pointer_action.move_to_location(x2, y2)
-            actions.w3c_actions.pointer_action.release()
-            actions.perform()
-            return True
-        except Exception as e:
-            print(f"Swipe failed: {e}")
-            return False
-
-    def touch_down(self, contact: int, x: int, y: int, pressure: int) -> bool:
-        print("touch_down start")
-        try:
-            actions = self.driver.action.pointer_inputs[contact]
-            actions.move_to(x=x, y=y)
-            actions.pointer_down(pressure)
-            self.driver.perform(actions)
-            return True
-        except:
-            return False
-
-    def touch_move(self, contact: int, x: int, y: int, pressure: int) -> bool:
-        print("touch_move start")
-        try:
-            actions = self.driver.action.pointer_inputs[contact]
-            actions.move_to(x=x, y=y)
-            self.driver.perform(actions)
-            return True
-        except:
-            return False
-
-    def touch_up(self, contact: int) -> bool:
-        print("touch_up start")
-        try:
-            actions = self.driver.action.pointer_inputs[contact]
-            actions.pointer_up()
-            self.driver.perform(actions)
-            return True
-        except:
-            return False
-
+    @invalidates_frame_cache
     def press_key(self, keycode: int) -> bool:
         print("press_key start")
         try:
@@ -211,6 +123,7 @@ class AppiumAndroidController(AppiumController):
             print(f"Press key failed: {e}")
             return False
 
+    @invalidates_frame_cache
     def input_text(self, text: str) -> bool:
         print("input_text start ", text)
         try:
@@ -224,57 +137,10 @@ class AppiumAndroidController(AppiumController):
             print(f"Input text failed: {e}")
             return False
 
-    def run_pipeline(
-        self, pipeline: Dict[str, Any], resource_path: str = None
-    ) -> Dict[str, Any]:
-        try:
-            if resource_path is None:
-                import os
-
-                resource_path = os.path.join(os.path.dirname(__file__), "resource")
-
-            resource = Resource()
-            resource.use_cpu()
-            resource.register_custom_action("LongPress", LongPressAction(self))
-            resource.register_custom_action("RecNext", RecNext(self))
-            resource.register_custom_action("RatioPanel", RatioPanel(self))
-            resource.register_custom_action("AppBack", AppBack(self))
-            resource.register_custom_action("ForEach", ForEach(self))
-            resource.register_custom_recognition("FindText", FindText(self))
-
-            res_job = resource.post_bundle(resource_path)
-            result = res_job.wait()
-            if not result.succeeded:
-                print(f"资源加载失败: {result}")
-                return {}
-
-            self.set_screenshot_target_short_side(self.device_width)
-
-            conn_result = self.post_connection().wait()
-            if not conn_result.succeeded:
-                print(f"控制器连接失败: {conn_result}")
-                return {}
-
-            tasker = Tasker(notification_handler=self.notification_handler)
-
-            if not tasker.bind(resource, self):
-                print("任务管理器绑定失败")
-                return {}
-
-            if not tasker.inited:
-                print("MAA 初始化失败")
-                return {}
-
-            task_detail = tasker.post_task("Entry", pipeline).wait().get()
-            return task_detail
-
-        except Exception as e:
-            print(f"运行流水线失败: {e}")
-            return {}
-
     def device_size(self) -> tuple[int, int]:
         return self.device_width, self.device_height
 
+    @invalidates_frame_cache
     def app_back(self) -> bool:
         try:
             self.driver.back()
@@ -282,7 +148,7 @@ class AppiumAndroidController(AppiumController):
         except Exception:
             return False
 
-    def find_element_by_text(self, text: str) -> list[tuple[int, int, int, int]]:
+    def query_elements_by_text(self, text: str) -> list[tuple[int, int, int, int]]:
         print(f"Finding elements with text: {text}")
         try:
             # 使用 UiSelector 查找包含文本的元素
@@ -1,9 +1,83 @@
 from maa.controller import CustomController
 from abc import abstractmethod
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable
+import os
+import threading
+import time
+import numpy as np
 from numpy import ndarray
 
+from .command_scheduler import CommandScheduler
+from .connection import PooledAppiumConnection
+from .frame_cache import FrameCache, invalidates_frame_cache
+from .page_source import PageSnapshot, PageSourceCache
+from .screencap_pipeline import ScreencapOptions, ScreencapPipeline
+from .screenshot_source import ScreenshotSource, create_screenshot_source
+from .text_index import MATCH_CONTAINS
+from .w3c_actions import MultiTouchSequence, TouchActionBuilder
+
 
 class AppiumController(CustomController):
+    # 截图解码流水线，由子类在 __init__ 中通过 init_screencap_pipelines 创建
+    screencap_pipeline: ScreencapPipeline
+    preview_pipeline: ScreencapPipeline
+    # 截图来源，由子类在创建 driver 后通过 init_screenshot_source 创建
+    screenshot_source: ScreenshotSource = None
+    # MAA 识别与推流共用的最新截图缓存
+    frame_cache: FrameCache
+    # 与 Appium 服务器之间的连接，由子类在 init_driver 中创建
+    connection: PooledAppiumConnection = None
+    # 每个线程当前打开的手势批次，由子类在 __init__ 中通过 init_actions 创建
+    _action_local: threading.local
+    # 尚未发送的 touch_down / touch_move / touch_up 事件
+    _touch_sequence: MultiTouchSequence = None
+    _touch_timer: threading.Timer = None
+    # 页面结构快照缓存，为 None 时文本查找直接在设备端执行
+    page_source_cache: PageSourceCache = None
+    # driver 命令调度器，由子类在创建 driver 后通过 init_scheduler 创建
+    scheduler: CommandScheduler = None
+
+    def init_screencap_pipelines(
+            self,
+            screencap_options: ScreencapOptions = None,
+            preview_options: ScreencapOptions = None,
+            frame_cache_max_age: float = 0.2,
+    ):
+        """
+        :param screencap_options: MAA 识别用截图的解码配置，默认缩小时使用 AREA 插值
+        :param preview_options: 推流预览用截图的解码配置，默认使用缩小解码和 LINEAR 插值
+        :param frame_cache_max_age: 截图缓存有效期(秒)，0 表示不缓存
+        """
+        self.frame_cache = FrameCache(frame_cache_max_age)
+        self.screencap_pipeline = ScreencapPipeline(screencap_options or ScreencapOptions(reduce="auto"))
+        self.preview_pipeline = ScreencapPipeline(
+            preview_options or ScreencapOptions(interpolation="linear", reduce="auto")
+        )
+
+    def init_actions(self, touch_idle_timeout: float = 0.5):
+        """
+        :param touch_idle_timeout: 所有触点都已抬起但事件未发送时，超过该时长(秒)没有新事件就发送；
+            仍有触点按下时不会提前发送，长按和慢速拖动保持为一个完整手势
+        """
+        self._action_local = threading.local()
+        self._touch_lock = threading.RLock()
+        self.touch_idle_timeout = touch_idle_timeout
+
+    def init_scheduler(self, max_delay: float = 0.5):
+        """
+        :param max_delay: 截图等低优先级命令为输入让行的最长时间(秒)
+        """
+        self.scheduler = CommandScheduler(max_delay)
+        self.scheduler.wrap_driver(self.driver)
+
+    @property
+    def scheduler_stats(self) -> dict:
+        """driver 命令排队统计"""
+        if self.scheduler is None:
+            return {}
+        return self.scheduler.stats
+
     @abstractmethod
     def connect(self) -> bool:
         raise NotImplementedError
@@ -20,19 +94,125 @@ class AppiumController(CustomController):
     def stop_app(self, intent: str) -> bool:
         raise NotImplementedError
 
-    @abstractmethod
+    def init_screenshot_source(self, spec=None, platform: str = "ios"):
+        """
+        :param spec: 截图来源配置，见 create_screenshot_source，默认通过 WebDriver 获取 PNG
+        :param platform: "ios" 或 "android"，用于推断默认 MJPEG 端口
+        """
+        self.screenshot_source = create_screenshot_source(spec, self.server_url, self.capabilities, platform)
+        self.screenshot_source.start(self)
+
+    @property
+    def connection_stats(self) -> dict:
+        """Appium 请求耗时统计(毫秒)"""
+        if self.connection is None:
+            return {}
+        return self.connection.latency.stats
+
+    def init_page_source(self, ttl: float = 0, platform: str = "ios"):
+        """
+        :param ttl: 页面结构快照有效期(秒)，0 表示不使用快照，每次查找都在设备端执行
+        :param platform: "ios" 或 "android"
+        """
+        if ttl <= 0:
+            self.page_source_cache = None
+            return
+        self.page_source_cache = PageSourceCache(lambda: self.driver.page_source, platform, ttl)
+        # 输入操作使截图缓存失效时，页面结构同样失效
+        self.frame_cache.add_listener(self.page_source_cache.invalidate)
+
+    def fetch_screenshot(self) -> bytes:
+        """获取编码后的截图数据"""
+        return self.screenshot_source.fetch()
+
+    def close(self):
+        """停止截图来源并结束 WebDriver 会话"""
+        if self.screenshot_source:
+            try:
+                self.screenshot_source.stop()
+            except Exception as e:
+                print(f"Stop screenshot source failed: {e}")
+        if getattr(self, "driver", None):
+            try:
+                self.driver.quit()
+            except Exception as e:
+                print(f"Quit driver failed: {e}")
+
     def screencap(self) -> ndarray:
-        raise NotImplementedError
+        """MAA 识别使用的截图，缩放到设备逻辑尺寸"""
+        return self._run_screencap(self.screencap_pipeline)
 
-    @abstractmethod
+    def screencap_preview(self) -> ndarray:
+        """推流预览使用的截图，优先选择开销最小的解码方式"""
+        return self._run_screencap(self.preview_pipeline)
+
+    def _run_screencap(self, pipeline: ScreencapPipeline) -> ndarray:
+        try:
+            return pipeline.run(lambda: self.frame_cache.get(self.fetch_screenshot), self.device_size())
+        except Exception as e:
+            print(f"Screenshot failed: {e}")
+            return np.zeros((1280, 720, 3), dtype=np.uint8)
+
+    @contextmanager
+    def action_batch(self):
+        """在 with 块内调用的 click / long_click / swipe 只记录，退出时合并为一次 W3C actions 请求发送
+
+        批次按线程区分，不影响其他线程的操作；嵌套使用时并入最外层批次。
+        with 块内抛出异常时不会发送任何操作。
+        """
+        builder = getattr(self._action_local, "builder", None)
+        if builder is not None:
+            yield builder
+            return
+        builder = TouchActionBuilder()
+        self._action_local.builder = builder
+        try:
+            yield builder
+        finally:
+            self._action_local.builder = None
+        try:
+            builder.perform(self.driver)
+        finally:
+            self.frame_cache.invalidate()
+
+    @invalidates_frame_cache
+    def perform_batch(self, gestures: Iterable[Dict[str, Any]]) -> bool:
+        """一次请求执行多个手势
+
+        :param gestures: 手势列表，格式见 TouchActionBuilder.add
+        """
+        builder = TouchActionBuilder().extend(gestures)
+        try:
+            builder.perform(self.driver)
+            return True
+        except Exception as e:
+            print(f"Perform batch failed: {e}")
+            return False
+
+    def _perform_gesture(self, name: str, build: Callable[[TouchActionBuilder], Any]) -> bool:
+        builder = getattr(self._action_local, "builder", None)
+        if builder is not None:
+            build(builder)
+            return True
+        try:
+            builder = TouchActionBuilder()
+            build(builder)
+            builder.perform(self.driver)
+            return True
+        except Exception as e:
+            print(f"{name} failed: {e}")
+            return False
+
+    @invalidates_frame_cache
     def click(self, x: int, y: int) -> bool:
-        raise NotImplementedError
+        print(f"Click {x} {y}")
+        return self._perform_gesture("Click", lambda builder: builder.tap(x, y))
 
-    @abstractmethod
+    @invalidates_frame_cache
     def swipe(self, x1: int, y1: int, x2: int, y2: int, duration: int) -> bool:
-        raise NotImplementedError
+        print("swipe start")
+        return self._perform_gesture("Swipe", lambda builder: builder.swipe(x1, y1, x2, y2, duration))
 
-    @abstractmethod
     def touch_down(
             self,
             contact: int,
@@ -40,9 +220,18 @@ class AppiumController(CustomController):
             y: int,
             pressure: int,
     ) -> bool:
-        raise NotImplementedError
+        """触摸事件先按触点记录，所有触点抬起时合并为一个多指针 W3C actions 请求发送
+
+        返回 True 只表示事件已记录，此时设备上还没有按下。事件在最后一个触点 touch_up、
+        调用 flush_touch 或所有触点抬起后空闲超时时才发送，在按下和抬起之间截图看不到按下的效果。
+
+        :param pressure: 不使用。MAA 的压力值没有统一的取值范围，Appium 各驱动对 W3C 触摸压力的
+            支持也不一致，按默认压力发送
+        """
+        with self._touch_lock:
+            self._touch_events().down(contact, x, y)
+        return True
 
-    @abstractmethod
     def touch_move(
             self,
             contact: int,
@@ -50,11 +239,68 @@ class AppiumController(CustomController):
             y: int,
             pressure: int,
     ) -> bool:
-        raise NotImplementedError
+        """与 touch_down 相同，只记录事件，pressure 不使用"""
+        with self._touch_lock:
+            self._touch_events().move(contact, x, y)
+        return True
 
-    @abstractmethod
     def touch_up(self, contact: int) -> bool:
-        raise NotImplementedError
+        with self._touch_lock:
+            sequence = self._touch_events()
+            sequence.up(contact)
+            if sequence.pressed:
+                return True
+            return self.flush_touch()
+
+    def flush_touch(self) -> bool:
+        """立即发送已记录的触摸事件
+
+        仍按下的触点在下一段序列开头重新按下后继续，Appium 不会在两次 actions 请求之间保留按下状态。
+        """
+        with self._touch_lock:
+            sequence = self._touch_sequence
+            if sequence is None:
+                return True
+            self._touch_sequence = MultiTouchSequence(sequence.pressed) if sequence.pressed else None
+            if not len(sequence):
+                return True
+            print(f"Perform touch sequence of {len(sequence)} events")
+            try:
+                sequence.perform(self.driver)
+                return True
+            except Exception as e:
+                print(f"Touch failed: {e}")
+                return False
+            finally:
+                self.frame_cache.invalidate()
+
+    def _touch_events(self) -> MultiTouchSequence:
+        if self._touch_sequence is None:
+            self._touch_sequence = MultiTouchSequence()
+        if self._touch_timer is None:
+            self._schedule_touch_flush(self.touch_idle_timeout)
+        return self._touch_sequence
+
+    def _schedule_touch_flush(self, delay: float):
+        self._touch_timer = threading.Timer(delay, self._on_touch_idle)
+        self._touch_timer.daemon = True
+        self._touch_timer.start()
+
+    def _on_touch_idle(self):
+        with self._touch_lock:
+            self._touch_timer = None
+            sequence = self._touch_sequence
+            if sequence is None:
+                return
+            idle = time.monotonic() - sequence.last_event
+            if idle < self.touch_idle_timeout:
+                self._schedule_touch_flush(self.touch_idle_timeout - idle)
+                return
+            if sequence.pressed:
+                # 触点仍按下时拆分发送会变成两个不完整的手势，等待最后一个 touch_up
+                return
+            if len(sequence):
+                self.flush_touch()
 
     @abstractmethod
     def press_key(self, keycode: int) -> bool:
@@ -64,22 +310,103 @@ class AppiumController(CustomController):
     def input_text(self, text: str) -> bool:
         raise NotImplementedError
 
-    @abstractmethod
+    @invalidates_frame_cache
     def long_click(self, x: int, y: int, duration: float = 2.0) -> bool:
-        raise NotImplementedError
+        print(f"Long click at {x}, {y} for {duration} seconds")
+        return self._perform_gesture("Long click", lambda builder: builder.long_press(x, y, duration))
 
-    @abstractmethod
-    def find_element_by_text(self, text: str) -> list[tuple[int, int, int, int]]:
-        """查找包含指定文本的元素并返回其坐标列表
+    def find_element_by_text(
+            self,
+            text: str,
+            match: str = MATCH_CONTAINS,
+            max_distance: int = 1,
+    ) -> list[tuple[int, int, int, int]]:
+        """查找文本匹配的元素并返回其坐标列表
+
+        启用页面结构快照时在本地索引中查找，否则 contains 查找在设备端执行，
+        其他查找方式临时获取一次页面结构
         
         Args:
             text: 要查找的文本
+            match: 查找方式 exact / contains / prefix / fuzzy
+            max_distance: fuzzy 查找允许的最大编辑距离
             
         Returns:
-            坐标列表 [(x1, y1), (x2, y2), ...]
+            坐标列表 [(x, y, w, h), ...]
         """
+        try:
+            if self.page_source_cache is not None:
+                return self.page_source_cache.snapshot().find(text, match, max_distance)
+            if match != MATCH_CONTAINS:
+                return PageSnapshot(self.driver.page_source).find(text, match, max_distance)
+        except Exception as e:
+            print(f"Page source snapshot failed: {e}")
+            if match != MATCH_CONTAINS:
+                return []
+        return self.query_elements_by_text(text)
+
+    def find_elements_by_texts(
+            self,
+            texts: list[str],
+            match: str = MATCH_CONTAINS,
+            max_distance: int = 1,
+    ) -> dict[str, list[tuple[int, int, int, int]]]:
+        """在同一份页面结构中查找多个文本
+
+        :return: 文本 -> 坐标列表 [(x, y, w, h), ...]
+        """
+        try:
+            if self.page_source_cache is not None:
+                snapshot = self.page_source_cache.snapshot()
+            else:
+                snapshot = PageSnapshot(self.driver.page_source)
+            return {text: snapshot.find(text, match, max_distance) for text in texts}
+        except Exception as e:
+            print(f"Page source snapshot failed: {e}")
+            if match != MATCH_CONTAINS:
+                return {text: [] for text in texts}
+        return {text: self.query_elements_by_text(text) for text in texts}
+
+    @abstractmethod
+    def query_elements_by_text(self, text: str) -> list[tuple[int, int, int, int]]:
+        """在设备端查询包含指定文本的元素，每个元素需要额外的位置和尺寸请求"""
         raise NotImplementedError
 
+    def run_pipeline(
+        self, pipeline: Dict[str, Any], resource_path: str = None
+    ) -> Dict[str, Any]:
+        """
+        运行 MAA 任务流水线
+        资源和任务管理器从进程内缓存中借用，同一资源包只在文件变化时重新加载
+        :param pipeline: 任务流水线配置
+        :param resource_path: 资源路径，默认为当前目录下的 resource 文件夹
+        :return: 任务执行结果
+        """
+        # resource_cache 依赖 custom_actions，custom_actions 又依赖本模块，这里延迟导入
+        from .resource_cache import resource_cache
+
+        try:
+            if resource_path is None:
+                resource_path = os.path.join(os.path.dirname(__file__), "resource")
+
+            # 设置截图目标短边
+            self.set_screenshot_target_short_side(self.device_width)
+
+            # 连接控制器
+            conn_result = self.post_connection().wait()
+            if not conn_result.succeeded:
+                print(f"控制器连接失败: {conn_result}")
+                return {}
+
+            with resource_cache.lease(resource_path, self, self.notification_handler) as (resource, tasker):
+                # 运行任务
+                task_detail = tasker.post_task("Entry", pipeline).wait().get()
+                return task_detail
+
+        except Exception as e:
+            print(f"运行流水线失败: {e}")
+            return {}
+
     def device_size(self) -> tuple[int, int]:
         raise NotImplementedError
 
@@ -0,0 +1,114 @@
+import asyncio
+import threading
+from typing import Dict, Optional
+
+from .screen_broadcaster import Frame, ScreenBroadcaster
+
+
+class FrameHub:
+    """把一个截图生产者的新帧分发给事件循环中的所有异步 /screen 连接
+
+    每个生产者只占用一个等待线程，连接只在事件循环中等待，连接数量不增加线程。
+    最后一个连接断开后等待线程退出；退出前有新连接时继续使用这个线程，不会启动第二个。
+    """
+
+    def __init__(self, broadcaster: ScreenBroadcaster, loop: asyncio.AbstractEventLoop):
+        """
+        :param broadcaster: 截图生产者，或工作进程中生产者的代理
+        :param loop: 连接所在的事件循环
+        """
+        self.broadcaster = broadcaster
+        self.loop = loop
+        self.latest: Optional[Frame] = None
+        self.clients = 0
+        # 所有等待中的连接共用的"下一帧"，收到新帧时一次性唤醒
+        self._next: asyncio.Future = loop.create_future()
+        # 等待线程的启动、停止和退出都在 _lock 中判断
+        self._lock = threading.Lock()
+        self._pump_thread: Optional[threading.Thread] = None
+        self._stopping = False
+
+    @property
+    def idle(self) -> bool:
+        """没有连接且等待线程已经退出"""
+        with self._lock:
+            return self.clients <= 0 and self._pump_thread is None
+
+    def attach(self):
+        with self._lock:
+            self.clients += 1
+            self._stopping = False
+            if self._pump_thread is None:
+                self._pump_thread = threading.Thread(target=self._pump, name="FrameHub", daemon=True)
+                self._pump_thread.start()
+
+    def detach(self):
+        with self._lock:
+            self.clients -= 1
+            if self.clients <= 0:
+                self._stopping = True
+
+    async def wait_for_frame(self, after_seq: int = 0, timeout: float = 1.0, burst_only: bool = False) -> Optional[Frame]:
+        """等待序号大于 after_seq 的最新帧，超时返回 None
+
+        :param burst_only: 只返回突发截图产生的帧
+        """
+        latest = self.latest
+        if latest is not None and latest.seq > after_seq and (not burst_only or latest.burst):
+            return latest
+        deadline = self.loop.time() + timeout
+        while True:
+            remaining = deadline - self.loop.time()
+            if remaining <= 0:
+                return None
+            try:
+                # shield 保证单个连接超时不会取消其他连接共用的 future
+                frame = await asyncio.wait_for(asyncio.shield(self._next), remaining)
+            except asyncio.TimeoutError:
+                return None
+            if not burst_only or frame.burst:
+                return frame
+
+    def _pump(self):
+        seq = 0
+        while True:
+            with self._lock:
+                if self._stopping:
+                    self._pump_thread = None
+                    return
+            frame = self.broadcaster.wait_for_frame(seq, timeout=0.5)
+            if frame is None:
+                if not getattr(self.broadcaster, "running", True):
+                    # 生产者已停止，连接会切换到新会话的生产者
+                    with self._lock:
+                        self._pump_thread = None
+                    return
+                continue
+            seq = frame.seq
+            self.loop.call_soon_threadsafe(self._publish, frame)
+
+    def _publish(self, frame: Frame):
+        self.latest = frame
+        waiting, self._next = self._next, self.loop.create_future()
+        waiting.set_result(frame)
+
+
+class FrameHubs:
+    """按生产者共享 FrameHub，只在事件循环线程中使用"""
+
+    def __init__(self):
+        self._hubs: Dict[int, FrameHub] = {}
+
+    def acquire(self, broadcaster: ScreenBroadcaster) -> FrameHub:
+        # 等待线程已经退出的空闲 FrameHub 才移除，线程退出前的新连接继续使用原来的 FrameHub
+        for key in [key for key, hub in self._hubs.items() if hub.idle]:
+            del self._hubs[key]
+        hub = self._hubs.get(id(broadcaster))
+        if hub is None or hub.broadcaster is not broadcaster:
+            hub = FrameHub(broadcaster, asyncio.get_running_loop())
+            self._hubs[id(broadcaster)] = hub
+        hub.attach()
+        return hub
+
+    def release(self, hub: FrameHub):
+        hub.detach()
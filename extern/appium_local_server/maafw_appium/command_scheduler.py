@@ -0,0 +1,202 @@
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+from selenium.webdriver.remote.command import Command
+
+from .connection import LatencyStats
+
+# 优先级，数值越小越先执行
+PRIORITY_INPUT = 0
+PRIORITY_QUERY = 1
+PRIORITY_CAPTURE = 2
+
+PRIORITY_NAMES = {
+    PRIORITY_INPUT: "input",
+    PRIORITY_QUERY: "query",
+    PRIORITY_CAPTURE: "capture",
+}
+
+# 用户输入类 WebDriver 命令
+INPUT_COMMANDS = frozenset({
+    Command.W3C_ACTIONS,
+    Command.W3C_CLEAR_ACTIONS,
+    Command.CLICK_ELEMENT,
+    Command.SEND_KEYS_TO_ELEMENT,
+    Command.CLEAR_ELEMENT,
+    Command.GO_BACK,
+})
+# 通过 executeScript 调用的输入类扩展命令
+INPUT_SCRIPTS = frozenset({
+    "mobile: pressKey",
+    "mobile: hideKeyboard",
+    "mobile: activateApp",
+    "mobile: terminateApp",
+    "mobile: startActivity",
+    "mobile: backgroundApp",
+    "mobile: clickGesture",
+    "mobile: longClickGesture",
+    "mobile: swipeGesture",
+    "mobile: tap",
+    "mobile: swipe",
+})
+CAPTURE_COMMANDS = frozenset({Command.SCREENSHOT})
+
+
+def command_priority(command: str, params: Optional[dict] = None) -> int:
+    """WebDriver 命令的优先级: 输入 > 查询 > 截图"""
+    if command in INPUT_COMMANDS:
+        return PRIORITY_INPUT
+    if command in CAPTURE_COMMANDS:
+        return PRIORITY_CAPTURE
+    if command == Command.W3C_EXECUTE_SCRIPT and params and params.get("script") in INPUT_SCRIPTS:
+        return PRIORITY_INPUT
+    return PRIORITY_QUERY
+
+
+class _Command:
+    __slots__ = ("priority", "key", "enqueued", "granted", "done", "result", "error", "followers")
+
+    def __init__(self, priority: int, key: Optional[str]):
+        self.priority = priority
+        self.key = key
+        self.enqueued = time.monotonic()
+        self.granted = False
+        self.done = threading.Event()
+        self.result = None
+        self.error: Optional[BaseException] = None
+        # 合并到这条命令上的等待者数量
+        self.followers = 0
+
+
+class CommandScheduler:
+    """单个设备会话的 WebDriver 命令调度器
+
+    同一时刻只有一条命令在发送，空闲时按优先级放行排队中的命令，用户输入不会排在
+    截图后面。低优先级命令等待超过 max_delay 后按先后顺序放行，持续点击时推流不会停顿。
+    排队中的相同截图命令合并为一次请求，结果分给所有等待者。
+
+    命令在调用线程中执行，调度器本身不占用线程。
+    """
+
+    def __init__(self, max_delay: float = 0.5):
+        """
+        :param max_delay: 低优先级命令的最长排队时间(秒)，超过后不再让行
+        """
+        self.max_delay = max_delay
+        self._cond = threading.Condition()
+        self._queues: Dict[int, Deque[_Command]] = {priority: deque() for priority in PRIORITY_NAMES}
+        # 排队中可合并的命令，key -> 命令
+        self._pending: Dict[str, _Command] = {}
+        self._busy = False
+        self._owner: Optional[int] = None
+        self._wait = {priority: LatencyStats() for priority in PRIORITY_NAMES}
+        self._executed = {priority: 0 for priority in PRIORITY_NAMES}
+        self._coalesced = 0
+
+    def run(self, priority: int, func: Callable[..., Any], *args, key: Optional[str] = None, **kwargs):
+        """按优先级执行 func
+
+        :param priority: PRIORITY_INPUT / PRIORITY_QUERY / PRIORITY_CAPTURE
+        :param func: 访问 driver 的调用
+        :param key: 相同 key 的排队命令只执行一次，共享结果
+        """
+        if self._owner == threading.get_ident():
+            # 命令执行过程中再次访问 driver，直接执行
+            return func(*args, **kwargs)
+
+        with self._cond:
+            if key is not None and key in self._pending:
+                command = self._pending[key]
+                command.followers += 1
+                self._coalesced += 1
+                follower = True
+            else:
+                command = _Command(priority, key)
+                follower = False
+                if not self._busy and not any(self._queues.values()):
+                    self._grant(command)
+                else:
+                    self._queues[priority].append(command)
+                    if key is not None:
+                        self._pending[key] = command
+                    while not command.granted:
+                        self._cond.wait()
+
+        if follower:
+            command.done.wait()
+            if command.error is not None:
+                raise command.error
+            return command.result
+
+        self._owner = threading.get_ident()
+        try:
+            command.result = func(*args, **kwargs)
+            return command.result
+        except BaseException as e:
+            command.error = e
+            raise
+        finally:
+            self._owner = None
+            command.done.set()
+            with self._cond:
+                self._busy = False
+                self._executed[command.priority] += 1
+                self._grant_next()
+
+    def wrap_driver(self, driver):
+        """让 driver 的所有命令经过调度器，截图命令可以合并"""
+        execute = driver.execute
+
+        def scheduled_execute(command: str, params: Optional[dict] = None):
+            priority = command_priority(command, params)
+            key = command if priority == PRIORITY_CAPTURE else None
+            return self.run(priority, execute, command, params, key=key)
+
+        # 实例属性覆盖方法，WebDriver 内部的 self.execute 调用同样经过调度器
+        driver.execute = scheduled_execute
+        return driver
+
+    def _grant(self, command: _Command):
+        self._busy = True
+        command.granted = True
+        self._wait[command.priority].record((time.monotonic() - command.enqueued) * 1000)
+        if command.key is not None and self._pending.get(command.key) is command:
+            # 开始执行后不再合并，之后的请求需要拿到更新的结果
+            del self._pending[command.key]
+
+    def _grant_next(self):
+        command = self._next_command()
+        if command is not None:
+            self._grant(command)
+            self._cond.notify_all()
+
+    def _next_command(self) -> Optional[_Command]:
+        now = time.monotonic()
+        # 等待超时的低优先级命令先放行，多条时取最早排队的
+        overdue: List[Deque[_Command]] = [
+            queue for priority, queue in self._queues.items()
+            if priority != PRIORITY_INPUT and queue and now - queue[0].enqueued >= self.max_delay
+        ]
+        if overdue:
+            return min(overdue, key=lambda queue: queue[0].enqueued).popleft()
+        for priority in sorted(self._queues):
+            if self._queues[priority]:
+                return self._queues[priority].popleft()
+        return None
+
+    @property
+    def stats(self) -> Dict[str, Any]:
+        """队列长度、排队耗时(毫秒)、已执行与合并的命令数"""
+        with self._cond:
+            depth = {PRIORITY_NAMES[priority]: len(queue) for priority, queue in self._queues.items()}
+            executed = {PRIORITY_NAMES[priority]: count for priority, count in self._executed.items()}
+            busy, coalesced = self._busy, self._coalesced
+        return {
+            "busy": busy,
+            "depth": depth,
+            "executed": executed,
+            "coalesced": coalesced,
+            "wait": {PRIORITY_NAMES[priority]: stats.stats for priority, stats in self._wait.items()},
+        }
@@ -0,0 +1,147 @@
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+from urllib.parse import urlparse
+
+import urllib3
+from appium.webdriver.appium_connection import AppiumConnection
+from selenium.webdriver.remote.client_config import ClientConfig
+from urllib3.util.retry import Retry
+
+
+@dataclass
+class ConnectionOptions:
+    """Appium 服务器连接配置
+
+    - pool_size: 连接池大小。截图线程、MAA 任务线程和操作请求会并发访问同一会话，
+      池太小会导致连接反复建立和丢弃
+    - connect_timeout / read_timeout: 连接与读取超时(秒)
+    - retries: 连接失败的重试次数；读取失败只对幂等请求(GET/DELETE 等)重试，
+      不会重复发送点击等 POST 操作
+    - backoff_factor: 重试间隔的退避系数
+    - compression: 请求 gzip 压缩的响应，减小截图等大响应的体积
+    """
+    pool_size: int = 4
+    connect_timeout: float = 10.0
+    read_timeout: float = 120.0
+    retries: int = 2
+    backoff_factor: float = 0.2
+    compression: bool = True
+
+    @classmethod
+    def from_dict(cls, values: Optional[Dict[str, Any]]) -> "ConnectionOptions":
+        """从 /init 的 connection 参数创建，未知字段忽略，无法解析的值使用默认值"""
+        options = cls()
+        for key, value in (values or {}).items():
+            if not hasattr(options, key) or value is None:
+                continue
+            try:
+                setattr(options, key, _parse_option(type(getattr(options, key)), value))
+            except (TypeError, ValueError):
+                print(f"忽略无效的连接参数 {key}={value!r}")
+        return options
+
+
+def _parse_option(kind: type, value: Any) -> Any:
+    if kind is bool:
+        if isinstance(value, str):
+            text = value.strip().lower()
+            if text in ("1", "true", "yes", "on"):
+                return True
+            if text in ("0", "false", "no", "off", ""):
+                return False
+            raise ValueError(value)
+        return bool(value)
+    if kind is int:
+        # 接受 "5.0" 这样的字符串，但不接受 "5.5"
+        number = float(value)
+        if not number.is_integer():
+            raise ValueError(value)
+        return int(number)
+    return kind(value)
+
+
+class LatencyStats:
+    """按请求统计耗时(毫秒)，保留最近 window 个样本用于计算分位数"""
+
+    def __init__(self, window: int = 512):
+        self.count = 0
+        self.total = 0.0
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, milliseconds: float):
+        with self._lock:
+            self.count += 1
+            self.total += milliseconds
+            self._samples.append(milliseconds)
+
+    @property
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            samples = sorted(self._samples)
+            count, total = self.count, self.total
+        if not samples:
+            return {"count": 0, "average": 0.0, "p50": 0.0, "p95": 0.0}
+        return {
+            "count": count,
+            "average": total / count,
+            "p50": samples[len(samples) // 2],
+            "p95": samples[min(len(samples) - 1, int(len(samples) * 0.95))],
+        }
+
+
+class PooledAppiumConnection(AppiumConnection):
+    """按 ConnectionOptions 配置的 AppiumConnection
+
+    selenium 默认的连接没有超时(socket 默认超时为 None)，Appium 或 WebDriverAgent 卡住时
+    请求会一直阻塞，推流和点击线程随之挂起。这里设置连接/读取超时、重试策略和连接池大小，
+    并记录每个请求的耗时。
+    """
+
+    def __init__(self, remote_server_addr: str, options: Optional[ConnectionOptions] = None):
+        self.options = options or ConnectionOptions()
+        self.latency = LatencyStats()
+        retries = Retry(
+            total=self.options.retries,
+            connect=self.options.retries,
+            read=self.options.retries,
+            status=0,
+            backoff_factor=self.options.backoff_factor,
+            raise_on_status=False,
+        )
+        # ClientConfig 的 timeout / init_args_for_pool_manager 需要 selenium>=4.26，
+        # AppiumConnection 接受 client_config 需要 Appium-Python-Client>=4.3
+        client_config = ClientConfig(
+            remote_server_addr=remote_server_addr,
+            keep_alive=True,
+            timeout=urllib3.Timeout(connect=self.options.connect_timeout, read=self.options.read_timeout),
+            # selenium 从这个嵌套键中读取 PoolManager 的参数
+            init_args_for_pool_manager={
+                "init_args_for_pool_manager": {"maxsize": self.options.pool_size, "retries": retries}
+            },
+        )
+        super().__init__(client_config=client_config)
+
+    def get_remote_connection_headers(self, parsed_url, keep_alive=True):
+        headers = super().get_remote_connection_headers(parsed_url, keep_alive=keep_alive)
+        if self.options.compression:
+            headers["Accept-Encoding"] = "gzip, deflate"
+        return headers
+
+    def _request(self, method, url, body=None):
+        started = time.perf_counter()
+        try:
+            return super()._request(method, url, body)
+        finally:
+            self.latency.record((time.perf_counter() - started) * 1000)
+
+
+def create_connection(server_url: str, options: Optional[ConnectionOptions] = None) -> PooledAppiumConnection:
+    """创建用于 webdriver.Remote(command_executor=...) 的连接"""
+    parsed = urlparse(server_url)
+    if not parsed.scheme:
+        server_url = f"http://{server_url}"
+    return PooledAppiumConnection(server_url, options)
@@ -0,0 +1,142 @@
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Tuple
+
+from .param_cache import loads
+
+# RecNext / RatioPanel 会改写的坐标参数
+COORDINATE_KEYS = (
+    "target",
+    "target_offset",
+    "roi",
+    "roi_offset",
+    "begin",
+    "begin_offset",
+    "end",
+    "end_offset",
+)
+
+# RecNext 特殊值 -> (来源, 下标, 符号)，来源 box 为识别框 (x, y, w, h)，device 为设备屏幕 (w, h)
+REC_NEXT_CODES = {
+    10001: ("box", 0, 1),
+    10002: ("box", 1, 1),
+    10003: ("box", 2, 1),
+    10004: ("box", 3, 1),
+    20003: ("device", 0, 1),
+    20004: ("device", 1, 1),
+    -10001: ("box", 0, -1),
+    -10002: ("box", 1, -1),
+    -10003: ("box", 2, -1),
+    -10004: ("box", 3, -1),
+    -20003: ("device", 0, -1),
+    -20004: ("device", 1, -1),
+}
+
+# RatioPanel 中 (x, y, w, h) 各项按比例换算时对应的设备屏幕尺寸下标
+RATIO_AXES = (0, 1, 0, 1)
+
+Path = Tuple[Any, ...]
+
+
+class CoordinatePlan:
+    """预先编译好的坐标改写计划
+
+    template 为解析后的参数，不需要运行时数据的坐标已经换算好；
+    substitutions 为 (坐标列表路径, 下标, 代码) 的平铺列表，执行时一次性替换。
+    只复制替换路径上的字典和列表，其余部分与 template 共用，调用方不能修改返回值。
+    """
+
+    def __init__(self, template: dict, substitutions: List[Tuple[Path, int, Any]]):
+        self.template = template
+        self.substitutions = substitutions
+
+    def render(self, resolve: Callable[[Any], Any]) -> dict:
+        """
+        :param resolve: 把代码换算成坐标值的函数
+        """
+        if not self.substitutions:
+            return self.template
+        copies: Dict[Path, Any] = {(): dict(self.template)}
+        for path, slot, code in self.substitutions:
+            self._copied(copies, path)[slot] = int(resolve(code))
+        return copies[()]
+
+    def _copied(self, copies: Dict[Path, Any], path: Path):
+        node = copies.get(path)
+        if node is None:
+            parent = self._copied(copies, path[:-1])
+            original = parent[path[-1]]
+            node = list(original) if isinstance(original, list) else dict(original)
+            parent[path[-1]] = node
+            copies[path] = node
+        return node
+
+
+def _walk(data: dict, path: Path, skip_nested_rec_next: bool):
+    """深度优先遍历所有层级的字典，返回 (路径, 字典)"""
+    yield path, data
+    for key, value in data.items():
+        if isinstance(value, dict):
+            if skip_nested_rec_next and data.get("custom_action", "") == "RecNext" and key == "custom_action_param":
+                continue
+            yield from _walk(value, path + (key,), skip_nested_rec_next)
+
+
+def _compile(param: str, skip_nested_rec_next: bool, slot_code: Callable[[int, Any], Any]) -> CoordinatePlan:
+    template = loads(param)
+    substitutions = []
+    for path, data in _walk(template, (), skip_nested_rec_next):
+        for key in COORDINATE_KEYS:
+            value = data.get(key)
+            if not isinstance(value, list):
+                continue
+            box = list(value[:4])
+            if len(box) < 4:
+                raise IndexError(f"{key} 需要 4 个坐标值: {value}")
+            for slot, item in enumerate(box):
+                code = slot_code(slot, item)
+                if code is None:
+                    box[slot] = int(item)
+                else:
+                    substitutions.append((path + (key,), slot, code))
+            data[key] = box
+    return CoordinatePlan(template, substitutions)
+
+
+def _rec_next_code(slot: int, value):
+    if isinstance(value, (int, float)) and value in REC_NEXT_CODES:
+        return REC_NEXT_CODES[value]
+    return None
+
+
+def _ratio_code(slot: int, value):
+    if 0 < value < 1:
+        return RATIO_AXES[slot], value
+    return None
+
+
+def plan_cache_stats() -> dict:
+    """compile_rec_next / compile_ratio_panel 的缓存命中统计"""
+    stats = {}
+    for func in (compile_rec_next, compile_ratio_panel):
+        info = func.cache_info()
+        total = info.hits + info.misses
+        stats[func.__name__] = {
+            "hits": info.hits,
+            "misses": info.misses,
+            "hit_rate": info.hits / total if total else 0.0,
+            "size": info.currsize,
+            "maxsize": info.maxsize,
+        }
+    return stats
+
+
+@lru_cache(maxsize=256)
+def compile_rec_next(param: str) -> CoordinatePlan:
+    """编译 RecNext 参数，嵌套 RecNext 的 custom_action_param 留给它自己处理"""
+    return _compile(param, True, _rec_next_code)
+
+
+@lru_cache(maxsize=256)
+def compile_ratio_panel(param: str) -> CoordinatePlan:
+    """编译 RatioPanel 参数，0-1 之间的值在执行时按设备屏幕尺寸换算"""
+    return _compile(param, False, _ratio_code)
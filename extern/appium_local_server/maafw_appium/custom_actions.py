@@ -1,16 +1,57 @@
-from maa.define import Rect
 from maa.context import Context
 from maa.custom_action import CustomAction
 from maa.custom_recognition import CustomRecognition
 from maa.resource import Resource
+from collections.abc import Mapping
 import json
+import os
+import threading
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from .appium_controller import AppiumController  # 新增导入
+from .coordinate_plan import compile_ratio_panel, compile_rec_next
+from .param_cache import ParamCache, thaw
 
 resource = Resource()
 
+# 所有自定义动作和识别共用的参数解析缓存，返回值只能读取
+param_cache = ParamCache()
+
+# MaaFramework 没有说明同一 tasker 上并发调用 MaaContextRunRecognition 是否安全，
+# 默认逐个识别(仍共用一张截图并提前结束)，确认安全后设置为 1 开启并发
+CONCURRENT_RECOGNITION = os.environ.get('MAA_CONCURRENT_RECOGNITION', '0') == '1'
+# 并发识别中被取消、没有执行的项
+CANCELLED = (None, 0.0)
+
+# tasker 句柄 -> 控制器。同一个 Resource 绑定到多台设备的 Tasker 时，
+# 自定义动作按执行它的 tasker 找到对应设备的控制器
+_tasker_controllers: "weakref.WeakValueDictionary[int, AppiumController]" = weakref.WeakValueDictionary()
+
+
+def bind_tasker_controller(tasker, controller: AppiumController):
+    _tasker_controllers[tasker._handle] = controller
+
+
+def unbind_tasker_controller(tasker):
+    _tasker_controllers.pop(tasker._handle, None)
+
+
+class ControllerBound:
+    """构造时传入 controller 的实例固定使用该控制器，否则按 context.tasker 查找"""
+    controller: AppiumController = None
+
+    def controller_for(self, context: Context) -> AppiumController:
+        if self.controller is not None:
+            return self.controller
+        controller = _tasker_controllers.get(getattr(context.tasker, "_handle", None))
+        if controller is None:
+            raise RuntimeError("tasker 未绑定控制器")
+        return controller
+
 
 @resource.custom_action("LongPress")
-class LongPressAction(CustomAction):
+class LongPressAction(ControllerBound, CustomAction):
     """长按指定位置
     
     参数格式:
@@ -39,12 +80,12 @@ class LongPressAction(CustomAction):
             # 获取参数
             x = argv.box.x
             y = argv.box.y
-            params = json.loads(argv.custom_action_param)
+            params = param_cache.get(argv.custom_action_param)
             duration = params.get("duration", 2.0)
 
             print(f"执行长按动作: 坐标({x}, {y}), 时长{duration}秒")
 
-            success = self.controller.long_click(x, y, duration)
+            success = self.controller_for(context).long_click(x, y, duration)
             # 使用传入的 controller 或 context 中的 controller
 
             return CustomAction.RunResult(success=success)
@@ -55,7 +96,7 @@ class LongPressAction(CustomAction):
 
 
 @resource.custom_action("RecNext")
-class RecNext(CustomAction):
+class RecNext(ControllerBound, CustomAction):
     """识别后执行下一个任务
     
     参数格式:
@@ -99,74 +140,18 @@ class RecNext(CustomAction):
         super().__init__()
         self.controller = controller
 
-    def _process_code(self, code: int, rec_box: Rect):
-        device_size = self.controller.device_size()
-        if code == 10001:
-            return rec_box.x
-        if code == 10002:
-            return rec_box.y
-        if code == 10003:
-            return rec_box.w
-        if code == 10004:
-            return rec_box.h
-        if code == 20003:
-            return device_size[0]
-        if code == 20004:
-            return device_size[1]
-        if code == -10001:
-            return -rec_box.x
-        if code == -10002:
-            return -rec_box.y
-        if code == -10003:
-            return -rec_box.w
-        if code == -10004:
-            return -rec_box.h
-        if code == -20003:
-            return -device_size[0]
-        if code == -20004:
-            return -device_size[1]
-        return code
-
-    def _process_box(self, rec_box: Rect, target: str, data: dict):
-        """递归处理所有层级的 target 参数"""
-        # 处理字典中的 target
-        if data.__contains__(target):
-            if isinstance(data[target], list):
-                x = self._process_code(data[target][0], rec_box)
-                y = self._process_code(data[target][1], rec_box)
-                w = self._process_code(data[target][2], rec_box)
-                h = self._process_code(data[target][3], rec_box)
-                print(f"target {target} {x} {y} {w} {h}")
-                data[target] = [
-                    int(x),
-                    int(y),
-                    int(w),
-                    int(h),
-                ]
-
-            # 递归处理字典中的其他值
-        for key, value in data.items():
-            if isinstance(value, dict):
-                if data.get("custom_action", "") == "RecNext" and key == "custom_action_param":
-                    continue
-                data[key] = self._process_box(rec_box, target, value)
-        return data
-
     def run(
             self, context: Context, argv: CustomAction.RunArg
     ) -> CustomAction.RunResult:
         try:
-            params = json.loads(argv.custom_action_param)
-            params = self._process_box(argv.box, "target", params)
-            params = self._process_box(argv.box, "target_offset", params)
-            params = self._process_box(argv.box, "roi", params)
-            params = self._process_box(argv.box, "roi_offset", params)
-            params = self._process_box(argv.box, "begin", params)
-            params = self._process_box(argv.box, "begin_offset", params)
-            params = self._process_box(argv.box, "end", params)
-            params = self._process_box(argv.box, "end_offset", params)
+            # 参数按字符串缓存编译结果，每次只替换特殊值
+            plan = compile_rec_next(argv.custom_action_param)
+            sources = {
+                "box": (argv.box.x, argv.box.y, argv.box.w, argv.box.h),
+                "device": self.controller_for(context).device_size(),
+            }
+            pipeline = plan.render(lambda code: code[2] * sources[code[0]][code[1]])
             new_context = context.clone()
-            pipeline = params
             result = new_context.run_task(
                 "Entry",
                 pipeline,
@@ -183,7 +168,7 @@ class RecNext(CustomAction):
 
 
 @resource.custom_action("RatioPanel")
-class RatioPanel(CustomAction):
+class RatioPanel(ControllerBound, CustomAction):
     """按比例处理面板区域
     
     参数格式:
@@ -217,51 +202,14 @@ class RatioPanel(CustomAction):
         super().__init__()
         self.controller = controller
 
-    def _process_xy(self, target: str, data: dict):
-        """递归处理所有层级的 target 参数"""
-        # 处理字典中的 target
-        if data.__contains__(target):
-            # 这里添加对 target 的处理逻辑
-            device_size = self.controller.device_size()
-            if isinstance(data[target], list):
-                x = data[target][0]
-                y = data[target][1]
-                w = data[target][2]
-                h = data[target][3]
-                if 1 < x < 0:
-                    x = int(x * device_size[0])
-                if 0 < y < 1:
-                    y = int(y * device_size[1])
-                if 0 < w < 1:
-                    w = int(w * device_size[0])
-                if 0 < h < 1:
-                    h = int(h * device_size[1])
-                data[target] = [
-                    int(x),
-                    int(y),
-                    int(w),
-                    int(h),
-                ]
-
-            # 递归处理字典中的其他值
-        for key, value in data.items():
-            if isinstance(value, dict):
-                data[key] = self._process_xy(target, value)
-        return data
-
     def run(
             self, context: Context, argv: CustomAction.RunArg
     ) -> CustomAction.RunResult:
         try:
-            params = json.loads(argv.custom_action_param)
-            params = self._process_xy("target", params)
-            params = self._process_xy("target_offset", params)
-            params = self._process_xy("roi", params)
-            params = self._process_xy("roi_offset", params)
-            params = self._process_xy("begin", params)
-            params = self._process_xy("begin_offset", params)
-            params = self._process_xy("end", params)
-            params = self._process_xy("end_offset", params)
+            # 参数按字符串缓存编译结果，每次只按设备尺寸换算比例值
+            plan = compile_ratio_panel(argv.custom_action_param)
+            device_size = self.controller_for(context).device_size()
+            params = plan.render(lambda code: code[1] * device_size[code[0]])
             new_context = context.clone()
             result = new_context.run_task("Entry", params)
             if result.status.succeeded:
@@ -273,7 +221,7 @@ class RatioPanel(CustomAction):
 
 
 @resource.custom_action("AppBack")
-class AppBack(CustomAction):
+class AppBack(ControllerBound, CustomAction):
     """执行返回操作
     
     参数格式:
@@ -297,7 +245,7 @@ class AppBack(CustomAction):
             self, context: Context, argv: CustomAction.RunArg
     ) -> CustomAction.RunResult:
         try:
-            self.controller.app_back()
+            self.controller_for(context).app_back()
             return CustomAction.RunResult(success=True)
         except Exception as e:
             print(f"返回动作执行失败: {e}")
@@ -305,7 +253,7 @@ class AppBack(CustomAction):
 
 
 @resource.custom_action("ForEach")
-class ForEach(CustomAction):
+class ForEach(ControllerBound, CustomAction):
     """遍历执行任务列表
     
     参数格式:
@@ -321,7 +269,9 @@ class ForEach(CustomAction):
                     "roi": "placeholder"
                 }
             },
-            "flag": 0  # 可选，执行结果判断标志，0:全部成功才算成功，1:有一个成功就算成功，默认为0
+            "flag": 0,  # 可选，执行结果判断标志，0:全部成功才算成功，1:有一个成功就算成功，默认为0
+            "parallel": false,  # 可选，只做识别的流水线在同一张截图上并发识别，默认 false
+            "max_workers": 4  # 可选，并发识别的线程数
         }
     }
     
@@ -332,6 +282,21 @@ class ForEach(CustomAction):
     - flag: 执行结果判断标志
       * 0: 所有任务都成功才返回成功（AND）
       * 1: 任意任务成功就返回成功（OR）
+    - parallel: 流水线中所有节点都没有动作且入口节点没有 next 时，
+      先截一张图，再用 run_recognition 识别每一项，结果按 forEachList 顺序汇总；
+      只有设置了 MAA_CONCURRENT_RECOGNITION=1 时才按 max_workers 并发识别，否则逐个识别；
+      带动作的流水线仍然逐项串行执行。
+      与逐项 run_task 不同，每一项只在这一张截图上识别一次，不会按节点的 timeout 重新截图重试，
+      rate_limit、pre_delay 等节点等待也不生效；画面还在变化时识别不到的项直接记为失败，
+      需要等待目标出现的流水线不要开启 parallel
+    - 每一项使用流水线的独立副本，不会修改原始参数
+    - 结果一旦确定就提前结束: flag 为 0 时遇到第一个失败，flag 为 1 时遇到第一个成功，
+      之后的项不再执行，动作返回汇总后的结果；并发识别时已经开始的项仍会完成并如实记录，
+      尚未开始而被取消的项记为 cancelled
+    - 每一项的结果和耗时打印到日志，同一个 Resource 被多台设备共用，结果不保存在实例上:
+      {"success": true, "flag": 1, "elapsed_ms": 12.3,
+       "items": [{"item": "A", "status": "failed", "elapsed_ms": 5.1}, {"item": "B", "status": "success", ...},
+                 {"item": "C", "status": "skipped", "elapsed_ms": 0}]}
     
     示例:
     {
@@ -358,7 +323,6 @@ class ForEach(CustomAction):
 
     def _process_pipeline(self, pipeline: dict, targets: list[list], replaceVal):
         for target in targets:
-            print(f"for-each 8 {target} {replaceVal}")
             last = pipeline
             last2 = None
             last2val = None
@@ -369,37 +333,137 @@ class ForEach(CustomAction):
             last2[last2val] = replaceVal
         return pipeline
 
+    @staticmethod
+    def _is_recognition_only(pipeline: dict) -> bool:
+        """流水线只包含识别: 所有节点没有动作，入口节点没有后续节点"""
+        for node in pipeline.values():
+            if not isinstance(node, Mapping):
+                return False
+            if node.get("action", "DoNothing") != "DoNothing":
+                return False
+        return not pipeline.get("Entry", {}).get("next")
+
+    def _run_item(self, context: Context, pipeline: dict) -> bool:
+        return context.clone().run_task("Entry", pipeline).status.succeeded
+
+    @staticmethod
+    def _decided(flag: int, succeeded: bool) -> bool:
+        """单项结果是否已经决定了整体结果"""
+        return succeeded if flag == 1 else not succeeded
+
+    @staticmethod
+    def _status(outcome) -> str:
+        if outcome is None:
+            return "skipped"
+        if outcome is CANCELLED:
+            return "cancelled"
+        return "success" if outcome[0] else "failed"
+
+    @staticmethod
+    def _timed(func, *args) -> tuple[bool, float]:
+        started = time.perf_counter()
+        succeeded = func(*args)
+        return succeeded, (time.perf_counter() - started) * 1000
+
+    def _run_items(self, context: Context, pipelines: list[dict], flag: int) -> list:
+        outcomes = [None] * len(pipelines)
+        for i, pipeline in enumerate(pipelines):
+            outcomes[i] = self._timed(self._run_item, context, pipeline)
+            if self._decided(flag, outcomes[i][0]):
+                break
+        return outcomes
+
+    def _recognize_items(self, context: Context, pipelines: list[dict], flag: int, max_workers: int) -> list:
+        # 所有项共用一张截图
+        controller = context.tasker.controller
+        controller.post_screencap().wait()
+        image = controller.cached_image
+
+        def recognize(pipeline: dict) -> bool:
+            detail = context.clone().run_recognition("Entry", image, pipeline)
+            return detail is not None and detail.box is not None
+
+        decided = threading.Event()
+
+        def attempt(pipeline: dict) -> tuple:
+            # 结果确定后才轮到的项直接取消，不再识别
+            if decided.is_set():
+                return CANCELLED
+            outcome = self._timed(recognize, pipeline)
+            if self._decided(flag, outcome[0]):
+                # 在工作线程中标记，同一线程接下来取到的项不会再识别
+                decided.set()
+            return outcome
+
+        if not CONCURRENT_RECOGNITION:
+            max_workers = 1
+        outcomes = [None] * len(pipelines)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {executor.submit(attempt, pipeline): i for i, pipeline in enumerate(pipelines)}
+            for future in as_completed(futures):
+                outcome = outcomes[futures[future]] = future.result()
+                if decided.is_set():
+                    break
+            for future, i in futures.items():
+                if outcomes[i] is not None:
+                    continue
+                # 尚未开始的识别不再执行，已经开始的等待完成并记录真实结果
+                outcomes[i] = CANCELLED if future.cancel() else future.result()
+        return outcomes
+
     def run(
             self, context: Context, argv: CustomAction.RunArg
     ) -> CustomAction.RunResult:
+        started = time.perf_counter()
         try:
-            params = json.loads(argv.custom_action_param)
+            params = param_cache.get(argv.custom_action_param)
             forEachList: list = params.get("forEachList")
             forEachTarget: list[list] = params.get("forEachTarget")
             pipeline: dict = params.get("pipeline")
             flag = params.get("flag", 0)
-            result: bool
+            parallel = params.get("parallel", False)
+            max_workers = max(1, int(params.get("max_workers", 4)))
+
+            pipelines = [
+                self._process_pipeline(thaw(pipeline), forEachTarget, thaw(item))
+                for item in forEachList
+            ]
+            if parallel and self._is_recognition_only(pipeline):
+                print(f"for-each 识别 {len(pipelines)} 项, max_workers={max_workers if CONCURRENT_RECOGNITION else 1}")
+                outcomes = self._recognize_items(context, pipelines, flag, max_workers)
+            else:
+                if parallel:
+                    print("for-each 流水线包含动作，按顺序执行")
+                outcomes = self._run_items(context, pipelines, flag)
+
+            finished = [outcome[0] for outcome in outcomes if outcome is not None and outcome is not CANCELLED]
             if flag == 0:
-                result = True
+                result = all(finished)
             else:
-                result = False
-            for item in forEachList:
-                new_context = context.clone()
-                pipeline = self._process_pipeline(pipeline, forEachTarget, item)
-                print(f"for-each pipeline: {pipeline}")
-                r1 = new_context.run_task("Entry", pipeline)
-                if flag == 0:
-                    result &= r1.status.succeeded
-                else:
-                    result |= r1.status.succeeded
-            return CustomAction.RunResult(success=True)
+                result = any(finished)
+
+            detail = {
+                "success": result,
+                "flag": flag,
+                "elapsed_ms": (time.perf_counter() - started) * 1000,
+                "items": [
+                    {
+                        "item": thaw(item),
+                        "status": self._status(outcome),
+                        "elapsed_ms": 0 if outcome is None else outcome[1],
+                    }
+                    for item, outcome in zip(forEachList, outcomes)
+                ],
+            }
+            print(f"for-each 结果: {json.dumps(detail, ensure_ascii=False)}")
+            return CustomAction.RunResult(success=result)
         except Exception as e:
-            print(f"for-each执行失败: {e}")
+            print(f"for-each执行失败: {e}, 耗时 {(time.perf_counter() - started) * 1000:.1f}ms")
             return CustomAction.RunResult(success=False)
 
 
 @resource.custom_recognition("FindText")
-class FindText(CustomRecognition):
+class FindText(ControllerBound, CustomRecognition):
     """使用文本查找进行识别
     参数格式:
     {
@@ -407,10 +471,16 @@ class FindText(CustomRecognition):
         "custom_recognition": "FindText",
         "custom_recognition_param": {
             "text": "要查找的文本",
-            "index": 0  # 可选，指定使用第几个匹配的元素，默认0表示第一个
+            "texts": ["候选文本1", "候选文本2"],  # 可选，代替 text 一次查找多个文本，
+                   # 只获取一次页面结构，按列表顺序选择第一个在 ROI 内命中的文本
+            "index": 0,  # 可选，指定使用第几个匹配的元素，默认0表示第一个
                    # 负数表示从后往前数，如 -1 表示最后一个
+            "match": "contains",  # 可选，查找方式 exact / contains / prefix / fuzzy，默认 contains
+            "max_distance": 1  # 可选，fuzzy 查找允许的最大编辑距离
         }
     }
+    使用 texts 时 detail 为 JSON:
+    {"hits": {"文本": [[x, y, w, h], ...]}, "selected": {"text": "文本", "index": 0, "box": [x, y, w, h]}}
     """
 
     def __init__(self, controller: AppiumController = None):
@@ -424,38 +494,26 @@ class FindText(CustomRecognition):
     ) -> CustomRecognition.AnalyzeResult:
         try:
             # 获取参数
-            params = json.loads(argv.custom_recognition_param)
-            text = params.get("text", "")
+            params = param_cache.get(argv.custom_recognition_param)
+            texts = params.get("texts")
             index = params.get("index", 0)
+            match = params.get("match", "contains")
+            max_distance = int(params.get("max_distance", 1))
 
-            print(f"识别文本: {text}, 索引: {index}, ROI: {argv.roi}")
+            if texts is not None:
+                return self._analyze_texts(context, list(texts), index, match, max_distance, argv.roi)
+
+            text = params.get("text", "")
+            print(f"识别文本: {text}, 索引: {index}, 查找方式: {match}, ROI: {argv.roi}")
 
             # 使用 controller 查找元素
-            positions = self.controller.find_element_by_text(text)
-            valid_positions = []
-
-            # 过滤出在 ROI 内的元素
-            for pos in positions:
-                x, y, w, h = pos
-                # 检查元素中心点是否在 ROI 内
-                center_x = x + w / 2
-                center_y = y + h / 2
-                if (argv.roi.x <= center_x <= argv.roi.x + argv.roi.w and
-                        argv.roi.y <= center_y <= argv.roi.y + argv.roi.h):
-                    valid_positions.append(pos)
-
-            if valid_positions:
-                # 处理负数索引
-                if index < 0:
-                    index = len(valid_positions) + index
-
-                # 检查索引是否有效
-                if 0 <= index < len(valid_positions):
-                    x, y, w, h = valid_positions[index]
-                    return CustomRecognition.AnalyzeResult(
-                        box=(x, y, w, h),
-                        detail=f"Found text '{text}' at index {index} in ROI"
-                    )
+            positions = self.controller_for(context).find_element_by_text(text, match, max_distance)
+            box = self._select(self._in_roi(positions, argv.roi), index)
+            if box is not None:
+                return CustomRecognition.AnalyzeResult(
+                    box=box,
+                    detail=f"Found text '{text}' at index {index} in ROI"
+                )
 
             return CustomRecognition.AnalyzeResult(
                 box=None,
@@ -468,3 +526,51 @@ class FindText(CustomRecognition):
                 box=None,
                 detail=f"Recognition failed: {str(e)}"
             )
+
+    def _analyze_texts(self, context, texts, index, match, max_distance, roi) -> CustomRecognition.AnalyzeResult:
+        print(f"识别文本: {texts}, 索引: {index}, 查找方式: {match}, ROI: {roi}")
+
+        # 所有文本在同一份页面结构中查找
+        found = self.controller_for(context).find_elements_by_texts(texts, match, max_distance)
+        hits = {text: self._in_roi(found.get(text, []), roi) for text in texts}
+
+        selected = None
+        for text in texts:
+            box = self._select(hits[text], index)
+            if box is not None:
+                selected = {"text": text, "index": index, "box": list(box)}
+                break
+
+        detail = json.dumps({
+            "hits": {text: [list(pos) for pos in positions] for text, positions in hits.items() if positions},
+            "selected": selected,
+        }, ensure_ascii=False)
+        return CustomRecognition.AnalyzeResult(
+            box=tuple(selected["box"]) if selected else None,
+            detail=detail
+        )
+
+    @staticmethod
+    def _in_roi(positions, roi) -> list:
+        """过滤出中心点在 ROI 内的元素"""
+        valid_positions = []
+        for pos in positions:
+            x, y, w, h = pos
+            center_x = x + w / 2
+            center_y = y + h / 2
+            if (roi.x <= center_x <= roi.x + roi.w and
+                    roi.y <= center_y <= roi.y + roi.h):
+                valid_positions.append(pos)
+        return valid_positions
+
+    @staticmethod
+    def _select(positions, index):
+        """按索引选择元素，负数表示从后往前数"""
+        if not positions:
+            return None
+        if index < 0:
+            index = len(positions) + index
+        if 0 <= index < len(positions):
+            x, y, w, h = positions[index]
+            return x, y, w, h
+        return None
@@ -0,0 +1,213 @@
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from maa.resource import Resource
+from maa.tasker import Tasker
+
+from .appium_controller import AppiumController
+from .coordinate_plan import plan_cache_stats
+from .custom_actions import param_cache
+from .resource_cache import resource_cache
+from .screen_broadcaster import ScreenBroadcaster
+
+# 会话状态
+STATE_PENDING = "pending"
+STATE_LOADING = "loading"
+STATE_READY = "ready"
+STATE_ERROR = "error"
+STATE_CLOSED = "closed"
+
+# 资源加载与 WebDriver 会话创建并行执行
+_loader = ThreadPoolExecutor(max_workers=2, thread_name_prefix="ResourceLoader")
+
+
+class DeviceSession:
+    """一次 /init 创建的设备会话
+
+    WebDriver 会话创建和资源加载在后台并行进行，调用方可以立即拿到 session_id，
+    通过 status 查询每个步骤的进度。全部就绪后创建 Tasker 并启动截图生产者。
+    """
+
+    def __init__(
+            self,
+            controller_factory: Callable[[], AppiumController],
+            resource_path: str = None,
+            on_ready: Callable[["DeviceSession"], None] = None,
+            on_session_lost: Callable[[ScreenBroadcaster, Exception], None] = None,
+    ):
+        """
+        :param controller_factory: 创建控制器(包括 WebDriver 会话)的函数
+        :param resource_path: 资源路径，指定时提前加载并放入资源缓存，之后的 run_pipeline 直接命中
+        :param on_ready: 全部就绪后调用
+        :param on_session_lost: 截图生产者发现会话断开时调用
+        """
+        self.session_id = uuid.uuid4().hex
+        self.controller_factory = controller_factory
+        self.resource_path = resource_path
+        self.on_ready = on_ready
+        self.on_session_lost = on_session_lost
+        self.state = STATE_PENDING
+        self.error: Optional[str] = None
+        self.steps: Dict[str, Dict[str, Any]] = {}
+        self.controller: Optional[AppiumController] = None
+        self.resource: Optional[Resource] = None
+        self.tasker: Optional[Tasker] = None
+        self.broadcaster: Optional[ScreenBroadcaster] = None
+        self.created_at = time.monotonic()
+        self._done = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def status(self) -> Dict[str, Any]:
+        return {
+            "session_id": self.session_id,
+            "state": self.state,
+            "error": self.error,
+            "steps": {name: dict(step) for name, step in self.steps.items()},
+            "elapsed_ms": (time.monotonic() - self.created_at) * 1000,
+        }
+
+    def info(self) -> Dict[str, Any]:
+        """设备尺寸以及截图、连接、缓存等统计信息"""
+        controller = self.controller
+        return {
+            "width": controller.device_width,
+            "height": controller.device_height,
+            "screencap": {
+                "recognition": controller.screencap_pipeline.stats,
+                "preview": controller.preview_pipeline.stats,
+                "cache": controller.frame_cache.stats
+            },
+            "connection": controller.connection_stats,
+            "scheduler": controller.scheduler_stats,
+            "stream": {
+                "skipped_frames": self.broadcaster.skipped_frames,
+                "burst_captures": self.broadcaster.burst_captures
+            } if self.broadcaster else None,
+            "page_source": controller.page_source_cache.stats if controller.page_source_cache else None,
+            "params": {**param_cache.stats, "plans": plan_cache_stats()},
+            "resources": resource_cache.stats
+        }
+
+    def notify_input(self):
+        """HTTP 输入操作完成后调用，推流立即安排一组突发截图"""
+        if self.broadcaster:
+            self.broadcaster.trigger_burst()
+
+    def run_pipeline(self, pipeline: Dict[str, Any]) -> Dict[str, Any]:
+        """使用会话的资源运行任务流水线，返回可序列化的执行结果"""
+        detail = self.controller.run_pipeline(pipeline, self.resource_path)
+        if not detail:
+            return {"succeeded": False, "nodes": []}
+        return {
+            "task_id": detail.task_id,
+            "entry": detail.entry,
+            "succeeded": detail.status.succeeded,
+            "nodes": [{"name": node.name, "completed": node.completed} for node in detail.nodes],
+        }
+
+    def start(self) -> "DeviceSession":
+        threading.Thread(target=self._run, name=f"DeviceSession-{self.session_id[:8]}", daemon=True).start()
+        return self
+
+    def wait(self, timeout: float = None) -> bool:
+        """等待初始化结束，返回是否就绪"""
+        self._done.wait(timeout)
+        return self.state == STATE_READY
+
+    def close(self):
+        """关闭会话，初始化尚未结束时在结束后清理"""
+        with self._lock:
+            if self.state == STATE_CLOSED:
+                return
+            finished = self._done.is_set()
+            self.state = STATE_CLOSED
+        if finished:
+            self._release()
+
+    def _release(self):
+        if self.broadcaster:
+            self.broadcaster.stop()
+        if self.controller:
+            resource_cache.release(self.controller)
+            self.controller.close()
+        self.broadcaster = None
+        self.controller = None
+        self.tasker = None
+        self.resource = None
+
+    def _step(self, name: str, func: Callable[[], Any]) -> Any:
+        step = {"status": "running", "elapsed_ms": 0.0}
+        self.steps[name] = step
+        started = time.monotonic()
+        try:
+            result = func()
+            step["status"] = "done"
+            return result
+        except Exception:
+            step["status"] = "error"
+            raise
+        finally:
+            step["elapsed_ms"] = (time.monotonic() - started) * 1000
+
+    def _create_controller(self) -> AppiumController:
+        controller = self.controller_factory()
+        # 先记录下来，后续步骤失败时也能关闭会话
+        self.controller = controller
+        if not controller.connect():
+            raise RuntimeError("控制器连接失败")
+        try:
+            controller.driver.session_id
+        except Exception as e:
+            raise RuntimeError(f"会话创建失败: {e}")
+        return controller
+
+    def _load_resource(self) -> Resource:
+        if self.resource_path:
+            return resource_cache.preload(self.resource_path).resource
+        resource = Resource()
+        resource.use_cpu()
+        return resource
+
+    def _bind_tasker(self) -> Tasker:
+        if self.resource_path:
+            # 绑定结果保存在资源缓存中，run_pipeline 直接复用
+            with resource_cache.lease(self.resource_path, self.controller) as (_, tasker):
+                return tasker
+        tasker = Tasker()
+        if not tasker.bind(self.resource, self.controller):
+            raise RuntimeError("任务管理器绑定失败")
+        return tasker
+
+    def _start_stream(self) -> ScreenBroadcaster:
+        broadcaster = ScreenBroadcaster(self.controller, on_session_lost=self.on_session_lost)
+        broadcaster.start()
+        return broadcaster
+
+    def _run(self):
+        with self._lock:
+            if self.state == STATE_PENDING:
+                self.state = STATE_LOADING
+        resource_future = _loader.submit(self._step, "resource", self._load_resource)
+        try:
+            self._step("session", self._create_controller)
+            self.resource = resource_future.result()
+            self.tasker = self._step("tasker", self._bind_tasker)
+            self.broadcaster = self._step("stream", self._start_stream)
+        except Exception as e:
+            print(f"会话初始化失败: {e}")
+            self.error = str(e)
+            # 等待资源加载结束，保证状态完整
+            resource_future.exception()
+        with self._lock:
+            closed = self.state == STATE_CLOSED
+            if not closed:
+                self.state = STATE_READY if self.error is None else STATE_ERROR
+            self._done.set()
+        if closed or self.error is not None:
+            self._release()
+        elif self.on_ready:
+            self.on_ready(self)
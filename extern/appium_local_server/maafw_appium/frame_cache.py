@@ -0,0 +1,103 @@
+import functools
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, List, Optional
+
+
+@dataclass
+class CachedCapture:
+    """一次设备截图的原始数据"""
+    capture_id: int
+    timestamp: float
+    data: bytes
+
+
+class FrameCache:
+    """带时间戳的最新截图缓存
+
+    MAA 识别和 /screen 推流共用同一个缓存: 在 max_age 秒内的截图直接复用，
+    不再重复向设备请求。并发的未命中只会触发一次截图，其余调用等待并复用结果。
+    输入操作后调用 invalidate()，保证之后拿到的是操作后的画面。
+    """
+
+    def __init__(self, max_age: float = 0.2):
+        """
+        :param max_age: 缓存有效期(秒)，0 表示不缓存
+        """
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        self._capture: Optional[CachedCapture] = None
+        self._generation = 0
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self._fetch_lock = threading.Lock()
+        # 缓存失效时一并通知的回调，如页面结构快照缓存
+        self._listeners: List[Callable[[], None]] = []
+
+    def add_listener(self, callback: Callable[[], None]):
+        self._listeners.append(callback)
+
+    @property
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "max_age": self.max_age,
+        }
+
+    def invalidate(self):
+        with self._lock:
+            self._capture = None
+            self._generation += 1
+        for callback in self._listeners:
+            callback()
+
+    def get(self, fetch: Callable[[], bytes]) -> CachedCapture:
+        """返回足够新的缓存截图，过期时调用 fetch 重新截图"""
+        capture = self._fresh()
+        if capture is not None:
+            self.hits += 1
+            return capture
+
+        with self._fetch_lock:
+            # 等待期间其他线程可能已经完成了截图
+            capture = self._fresh()
+            if capture is not None:
+                self.hits += 1
+                return capture
+
+            self.misses += 1
+            with self._lock:
+                generation = self._generation
+            data = fetch()
+            with self._lock:
+                self._next_id += 1
+                capture = CachedCapture(self._next_id, time.monotonic(), data)
+                # 截图期间发生过输入操作，画面可能已过时，不写入缓存
+                if generation == self._generation and self.max_age > 0:
+                    self._capture = capture
+            return capture
+
+    def _fresh(self) -> Optional[CachedCapture]:
+        with self._lock:
+            capture = self._capture
+        if capture is None or time.monotonic() - capture.timestamp > self.max_age:
+            return None
+        return capture
+
+
+def invalidates_frame_cache(method):
+    """装饰控制器的输入操作，操作结束后使截图缓存失效"""
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            self.frame_cache.invalidate()
+
+    return wrapper
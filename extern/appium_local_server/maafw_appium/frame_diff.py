@@ -0,0 +1,92 @@
+from typing import List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+
+def block_means(image: np.ndarray, grid: Tuple[int, int]) -> np.ndarray:
+    """把图像缩成 grid 大小的灰度图，每个像素即原图对应块的亮度均值"""
+    if image.ndim == 3:
+        image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    return cv2.resize(image, grid, interpolation=cv2.INTER_AREA).astype(np.float32)
+
+
+class FrameChangeDetector:
+    """基于分块平均绝对差的画面变化检测
+
+    把每帧缩成 grid 个块的亮度均值，与上一次判定为“有变化”的参考帧逐块比较，
+    任一块的差值超过 threshold 即认为画面变化。只比较很小的缩略图，
+    开销远低于一次 JPEG 编码。
+    """
+
+    def __init__(self, grid: Tuple[int, int] = (64, 64), threshold: float = 1.0):
+        """
+        :param grid: 分块数量 (列, 行)
+        :param threshold: 块亮度均值的最大允许差值(0-255)
+        """
+        self.grid = grid
+        self.threshold = threshold
+        self._reference: Optional[np.ndarray] = None
+        self._reference_shape: Optional[tuple] = None
+
+    def reset(self):
+        self._reference = None
+        self._reference_shape = None
+
+    def changed(self, image: np.ndarray) -> bool:
+        """判断画面相对参考帧是否变化，变化时更新参考帧"""
+        thumb = block_means(image, self.grid)
+        if self._reference is None or self._reference_shape != image.shape:
+            self._reference = thumb
+            self._reference_shape = image.shape
+            return True
+        if float(np.max(np.abs(thumb - self._reference))) <= self.threshold:
+            return False
+        self._reference = thumb
+        return True
+
+
+# dirty_rects 默认的逐像素差值阈值(0-255)。同一画面经 JPEG/MJPEG 重新编码后的噪声
+# 一般在 20 以内，超过阈值的像素才算变化，避免编码噪声让每一块都被当成变化。
+# 低于阈值的缓慢渐变不会产生补丁，由推流定期发送的关键帧纠正
+DIRTY_THRESHOLD = 24
+
+
+def dirty_rects(
+        previous: np.ndarray,
+        current: np.ndarray,
+        tile_size: int = 64,
+        threshold: int = DIRTY_THRESHOLD,
+) -> List[Tuple[int, int, int, int]]:
+    """逐块比较两帧，返回发生变化的矩形区域列表 [(x, y, w, h), ...]
+
+    块内任一像素(任一通道)的差值超过 threshold 即认为该块变化。
+    同一行中相邻的变化块会合并成一个矩形，减少补丁数量。
+    """
+    height, width = current.shape[:2]
+    channels = current.shape[2] if current.ndim == 3 else 1
+    # 按行展开通道，逐行块用 cv2.reduce 取列最大值，再按块宽分段取最大值
+    diff = cv2.absdiff(previous, current).reshape(height, width * channels)
+    rows = (height + tile_size - 1) // tile_size
+    cols = (width + tile_size - 1) // tile_size
+    col_starts = np.arange(0, width * channels, tile_size * channels)
+    changed = np.zeros((rows, cols), dtype=bool)
+    for row in range(rows):
+        band = diff[row * tile_size:(row + 1) * tile_size]
+        col_max = cv2.reduce(band, 0, cv2.REDUCE_MAX).reshape(-1)
+        changed[row] = np.maximum.reduceat(col_max, col_starts) > threshold
+
+    rects = []
+    for row in range(rows):
+        col = 0
+        while col < cols:
+            if not changed[row, col]:
+                col += 1
+                continue
+            start = col
+            while col < cols and changed[row, col]:
+                col += 1
+            x = start * tile_size
+            y = row * tile_size
+            rects.append((x, y, min(col * tile_size, width) - x, min(y + tile_size, height) - y))
+    return rects
@@ -0,0 +1,185 @@
+import base64
+import json
+import struct
+import time
+from typing import List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+# 推流格式
+FORMAT_JSON = "json"  # 旧版: base64 图像包在 JSON 文本消息中
+FORMAT_BINARY = "binary"  # 新版: 固定帧头 + 原始图像字节的二进制消息
+
+# 图像编码
+CODEC_JPEG = 1
+CODEC_WEBP = 2
+
+CODEC_NAMES = {
+    "jpeg": CODEC_JPEG,
+    "jpg": CODEC_JPEG,
+    "webp": CODEC_WEBP,
+}
+
+_CODEC_EXTENSIONS = {
+    CODEC_JPEG: ".jpg",
+    CODEC_WEBP: ".webp",
+}
+
+_CODEC_QUALITY_FLAGS = {
+    CODEC_JPEG: cv2.IMWRITE_JPEG_QUALITY,
+    CODEC_WEBP: cv2.IMWRITE_WEBP_QUALITY,
+}
+
+# 帧类型
+FRAME_TYPE_FULL = 0  # 完整帧（增量模式下即关键帧）
+FRAME_TYPE_DELTA = 1  # 增量帧: 只包含变化区域的图像补丁
+
+# 二进制帧头（网络字节序，共 22 字节）:
+#   magic(2s) version(B) frame_type(B) codec(B) 保留(x)
+#   seq(I) timestamp_ms(Q) width(H) height(H)
+FRAME_MAGIC = b"MF"
+PROTOCOL_VERSION = 1
+FRAME_HEADER = struct.Struct("!2sBBBxIQHH")
+
+# 增量帧在帧头之后的负载: 补丁数量(H)，随后每个补丁为 x(H) y(H) w(H) h(H) 长度(I) + 图像字节
+DELTA_COUNT = struct.Struct("!H")
+DELTA_TILE = struct.Struct("!HHHHI")
+
+# 增量帧补丁: (x, y, w, h, 编码后的图像字节)
+Tile = Tuple[int, int, int, int, bytes]
+
+
+def parse_codec(name: Optional[str]) -> int:
+    """将客户端传入的编码名称转换为编码常量，未知名称回退到 JPEG"""
+    if not name:
+        return CODEC_JPEG
+    return CODEC_NAMES.get(name.lower(), CODEC_JPEG)
+
+
+def encode_image(image: np.ndarray, codec: int = CODEC_JPEG, quality: Optional[int] = None) -> bytes:
+    """将图像编码为指定格式的字节串
+
+    :param image: BGR 图像
+    :param codec: CODEC_JPEG 或 CODEC_WEBP
+    :param quality: 编码质量 1-100，None 表示使用 OpenCV 默认值
+    :return: 编码后的图像字节
+    """
+    params = []
+    if quality is not None:
+        params = [_CODEC_QUALITY_FLAGS[codec], int(quality)]
+    success, buffer = cv2.imencode(_CODEC_EXTENSIONS[codec], image, params)
+    if not success:
+        raise ValueError(f"图像编码失败: codec={codec}")
+    return buffer.tobytes()
+
+
+def timestamp_ms(timestamp: Optional[float] = None) -> int:
+    """将秒级时间戳转换为毫秒整数，默认取当前时间"""
+    if timestamp is None:
+        timestamp = time.time()
+    return int(timestamp * 1000)
+
+
+def pack_frame(
+        payload: bytes,
+        seq: int,
+        timestamp: float,
+        width: int,
+        height: int,
+        codec: int = CODEC_JPEG,
+        frame_type: int = FRAME_TYPE_FULL,
+) -> bytes:
+    """按二进制协议打包一帧: 帧头 + 图像字节"""
+    header = FRAME_HEADER.pack(
+        FRAME_MAGIC,
+        PROTOCOL_VERSION,
+        frame_type,
+        codec,
+        seq & 0xFFFFFFFF,
+        timestamp_ms(timestamp),
+        width,
+        height,
+    )
+    return header + payload
+
+
+def pack_delta_frame(
+        tiles: List[Tile],
+        seq: int,
+        timestamp: float,
+        width: int,
+        height: int,
+        codec: int = CODEC_JPEG,
+) -> bytes:
+    """按二进制协议打包增量帧，width/height 为完整画面尺寸"""
+    parts = [DELTA_COUNT.pack(len(tiles))]
+    for x, y, w, h, payload in tiles:
+        parts.append(DELTA_TILE.pack(x, y, w, h, len(payload)))
+        parts.append(payload)
+    return pack_frame(b"".join(parts), seq, timestamp, width, height, codec, FRAME_TYPE_DELTA)
+
+
+def unpack_frame_header(message: bytes) -> dict:
+    """解析二进制帧头，返回帧头字段和图像数据的起始偏移"""
+    magic, version, frame_type, codec, seq, ts, width, height = FRAME_HEADER.unpack_from(message)
+    if magic != FRAME_MAGIC:
+        raise ValueError("无效的帧头")
+    return {
+        "version": version,
+        "frame_type": frame_type,
+        "codec": codec,
+        "seq": seq,
+        "timestamp": ts,
+        "width": width,
+        "height": height,
+        "offset": FRAME_HEADER.size,
+    }
+
+
+def heartbeat_message(seq: int, timestamp: Optional[float] = None) -> str:
+    """画面无变化时定期发送的心跳消息，两种推流格式都以文本消息发送"""
+    return json.dumps({
+        'type': 'heartbeat',
+        'seq': seq,
+        'timestamp': timestamp_ms(timestamp),
+    })
+
+
+def json_delta_frame(
+        tiles: List[Tile],
+        seq: int,
+        timestamp: float,
+        width: int,
+        height: int,
+) -> str:
+    """按 JSON 协议生成增量帧消息"""
+    return json.dumps({
+        'type': 'delta',
+        'seq': seq,
+        'timestamp': timestamp_ms(timestamp),
+        'width': width,
+        'height': height,
+        'tiles': [
+            {'x': x, 'y': y, 'w': w, 'h': h, 'data': base64.b64encode(payload).decode('utf-8')}
+            for x, y, w, h, payload in tiles
+        ],
+    })
+
+
+def json_frame(
+        payload: bytes,
+        seq: int,
+        timestamp: float,
+        width: int,
+        height: int,
+) -> str:
+    """按旧版协议生成 JSON 文本消息，保持 type/data 字段兼容旧客户端"""
+    return json.dumps({
+        'type': 'screen',
+        'data': base64.b64encode(payload).decode('utf-8'),
+        'seq': seq,
+        'timestamp': timestamp_ms(timestamp),
+        'width': width,
+        'height': height,
+    })
@@ -0,0 +1,153 @@
+import re
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Tuple
+
+from .text_index import MATCH_CONTAINS, TextIndex
+
+try:
+    from lxml import etree
+except ImportError:  # lxml 为可选依赖，缺失时使用标准库解析，速度较慢
+    import xml.etree.ElementTree as etree
+
+# 建立文本索引的属性: iOS 为 label/name/value，Android 为 text/content-desc
+TEXT_ATTRIBUTES = ("label", "name", "value", "text", "content-desc")
+
+_ANDROID_BOUNDS = re.compile(r"\[(-?\d+),(-?\d+)\]\[(-?\d+),(-?\d+)\]")
+
+Bounds = Tuple[int, int, int, int]
+
+
+@dataclass
+class SnapshotElement:
+    """页面结构中的一个元素"""
+    bounds: Bounds
+    texts: Dict[str, str] = field(default_factory=dict)
+
+
+def parse_bounds(attrib) -> Optional[Bounds]:
+    """解析元素坐标，iOS 为 x/y/width/height 属性，Android 为 bounds="[x1,y1][x2,y2]" """
+    bounds = attrib.get("bounds")
+    if bounds:
+        match = _ANDROID_BOUNDS.match(bounds)
+        if not match:
+            return None
+        x1, y1, x2, y2 = (int(v) for v in match.groups())
+        return x1, y1, x2 - x1, y2 - y1
+    try:
+        return (
+            int(float(attrib["x"])),
+            int(float(attrib["y"])),
+            int(float(attrib["width"])),
+            int(float(attrib["height"])),
+        )
+    except (KeyError, ValueError):
+        return None
+
+
+class PageSnapshot:
+    """一次 driver.page_source 的本地解析结果，所有文本查找都在本地索引上完成"""
+
+    def __init__(self, source: str, platform: str = "ios"):
+        """
+        :param source: driver.page_source 返回的 XML
+        :param platform: "ios" 或 "android"
+        """
+        self.platform = platform
+        self.timestamp = time.monotonic()
+        self.elements = self._parse(source)
+        self.index = TextIndex((element.bounds, element.texts.values()) for element in self.elements)
+        # (文本, 查找方式, 编辑距离) -> 查找结果
+        self._lookups: Dict[tuple, List[Bounds]] = {}
+
+    @staticmethod
+    def _parse(source: str) -> List[SnapshotElement]:
+        data = source.encode("utf-8") if isinstance(source, str) else source
+        root = etree.fromstring(data)
+        elements = []
+        for node in root.iter():
+            bounds = parse_bounds(node.attrib)
+            if bounds is None:
+                continue
+            texts = {name: node.attrib[name] for name in TEXT_ATTRIBUTES if node.attrib.get(name)}
+            if texts:
+                elements.append(SnapshotElement(bounds, texts))
+        return elements
+
+    def find(self, text: str, match: str = MATCH_CONTAINS, max_distance: int = 1) -> List[Bounds]:
+        """返回文本属性与 text 匹配的元素坐标 (x, y, w, h)，查找方式见 TextIndex.find"""
+        key = (text, match, max_distance)
+        positions = self._lookups.get(key)
+        if positions is None:
+            positions = self.index.find(text, match, max_distance)
+            self._lookups[key] = positions
+        return positions
+
+
+class PageSourceCache:
+    """页面结构快照缓存
+
+    在 ttl 秒内或发生输入操作前，所有文本查找复用同一份快照，
+    并发的未命中只会请求一次 page_source。
+    """
+
+    def __init__(self, fetch: Callable[[], str], platform: str = "ios", ttl: float = 1.0):
+        """
+        :param fetch: 获取页面结构 XML 的函数，一般为 lambda: driver.page_source
+        :param platform: "ios" 或 "android"
+        :param ttl: 快照有效期(秒)
+        """
+        self.fetch = fetch
+        self.platform = platform
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._snapshot: Optional[PageSnapshot] = None
+        self._generation = 0
+        self._lock = threading.Lock()
+        self._fetch_lock = threading.Lock()
+
+    @property
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "ttl": self.ttl,
+        }
+
+    def invalidate(self):
+        with self._lock:
+            self._snapshot = None
+            self._generation += 1
+
+    def snapshot(self) -> PageSnapshot:
+        snapshot = self._fresh()
+        if snapshot is not None:
+            self.hits += 1
+            return snapshot
+
+        with self._fetch_lock:
+            snapshot = self._fresh()
+            if snapshot is not None:
+                self.hits += 1
+                return snapshot
+
+            self.misses += 1
+            with self._lock:
+                generation = self._generation
+            snapshot = PageSnapshot(self.fetch(), self.platform)
+            with self._lock:
+                # 获取期间发生过输入操作，快照可能已过时，不写入缓存
+                if generation == self._generation:
+                    self._snapshot = snapshot
+            return snapshot
+
+    def _fresh(self) -> Optional[PageSnapshot]:
+        with self._lock:
+            snapshot = self._snapshot
+        if snapshot is None or time.monotonic() - snapshot.timestamp > self.ttl:
+            return None
+        return snapshot
@@ -0,0 +1,92 @@
+import json
+import threading
+from collections import OrderedDict
+from collections.abc import Mapping
+from types import MappingProxyType
+from typing import Any
+
+try:
+    import orjson
+except ImportError:  # orjson 为可选依赖，未安装时使用标准库
+    orjson = None
+
+_MISSING = object()
+
+
+def loads(data: str) -> Any:
+    """解析 JSON，安装了 orjson 时使用 orjson"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def freeze(value: Any) -> Any:
+    """把解析结果转换为只读结构: dict -> MappingProxyType，list -> tuple"""
+    if isinstance(value, dict):
+        return MappingProxyType({key: freeze(item) for key, item in value.items()})
+    if isinstance(value, list):
+        return tuple(freeze(item) for item in value)
+    return value
+
+
+def thaw(value: Any) -> Any:
+    """把只读结构还原为可修改的 dict / list，返回的是独立的副本"""
+    if isinstance(value, Mapping):
+        return {key: thaw(item) for key, item in value.items()}
+    if isinstance(value, tuple):
+        return [thaw(item) for item in value]
+    return value
+
+
+class ParamCache:
+    """自定义动作/识别参数的 JSON 解析缓存
+
+    循环执行的流水线会反复传入相同的参数字符串，解析结果按字符串缓存，
+    超过 maxsize 时淘汰最久未使用的条目。
+    get() 返回所有调用方共用的只读结构(对象为 MappingProxyType，数组为 tuple)，
+    需要修改或传给 MAA 时用 thaw() 得到可修改的副本。
+    """
+
+    def __init__(self, maxsize: int = 256):
+        """
+        :param maxsize: 最多缓存的参数字符串数量
+        """
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[str, Any] = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "backend": "orjson" if orjson is not None else "json",
+        }
+
+    def get(self, param: str) -> Any:
+        """返回共用的只读解析结果"""
+        with self._lock:
+            value = self._entries.get(param, _MISSING)
+            if value is not _MISSING:
+                self._entries.move_to_end(param)
+                self.hits += 1
+                return value
+            self.misses += 1
+
+        value = freeze(loads(param))
+        with self._lock:
+            self._entries[param] = value
+            self._entries.move_to_end(param)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
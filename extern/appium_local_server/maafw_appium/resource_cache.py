@@ -0,0 +1,216 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Tuple
+
+from maa.resource import Resource
+from maa.tasker import Tasker
+
+from .custom_actions import (
+    LongPressAction, RecNext, RatioPanel, AppBack, ForEach, FindText, bind_tasker_controller, unbind_tasker_controller
+)
+
+# 注册到每个 Resource 的自定义动作和识别
+CUSTOM_ACTIONS = {
+    "LongPress": LongPressAction,
+    "RecNext": RecNext,
+    "RatioPanel": RatioPanel,
+    "AppBack": AppBack,
+    "ForEach": ForEach,
+}
+CUSTOM_RECOGNITIONS = {
+    "FindText": FindText,
+}
+
+
+def bundle_fingerprint(path: str) -> str:
+    """资源目录的指纹，由所有文件的相对路径、大小和修改时间计算
+
+    不读取文件内容，OCR 模型等大文件也只需要一次 stat。
+    """
+    digest = hashlib.sha1()
+    for root, dirs, files in os.walk(path):
+        dirs.sort()
+        for name in sorted(files):
+            file_path = os.path.join(root, name)
+            try:
+                stat = os.stat(file_path)
+            except OSError:
+                continue
+            digest.update(f"{os.path.relpath(file_path, path)}\0{stat.st_size}\0{stat.st_mtime_ns}\n".encode())
+    return digest.hexdigest()
+
+
+@dataclass
+class ResourceEntry:
+    """一个已加载的资源包，以及每个控制器绑定在它上面的 Tasker"""
+    fingerprint: str
+    resource: Resource
+    customs: List[Any]
+    # 控制器 -> (通知处理器, Tasker)，Tasker 持有控制器，控制器关闭时需要调用 release
+    taskers: Dict[Any, Tuple[Any, Tasker]] = field(default_factory=dict)
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+
+class ResourceCache:
+    """进程内共用的 Resource 缓存
+
+    按 (资源路径, 选项) 保存已加载的 Resource 和每个控制器绑定好的 Tasker，
+    资源目录中的文件发生变化时才重新加载。目录指纹在 fingerprint_ttl 内复用，
+    连续运行流水线不会每次都遍历资源目录。
+    多台设备共用同一份 Resource(包括 OCR 模型)，自定义动作按执行它的 tasker 找到对应的控制器。
+    """
+
+    def __init__(self, max_entries: int = 4, fingerprint_ttl: float = 2.0):
+        """
+        :param max_entries: 最多保留的资源包数量，超出时淘汰最久未使用的
+        :param fingerprint_ttl: 目录指纹的复用时间(秒)，0 表示每次都重新计算
+        """
+        self.max_entries = max_entries
+        self.fingerprint_ttl = fingerprint_ttl
+        self.hits = 0
+        self.misses = 0
+        self.reloads = 0
+        self._entries: OrderedDict[Tuple, ResourceEntry] = OrderedDict()
+        # 资源路径 -> (计算时间, 指纹)
+        self._fingerprints: Dict[str, Tuple[float, str]] = {}
+        # 控制器 -> 绑定过的所有 Tasker，资源包被淘汰或重新加载后仍能在 release 时解绑
+        self._bound: Dict[Any, List[Tasker]] = {}
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+
+    @property
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "reloads": self.reloads,
+            "hit_rate": self.hits / total if total else 0.0,
+            "entries": len(self._entries),
+        }
+
+    def invalidate(self, path: str = None):
+        """丢弃指定路径或全部的缓存资源"""
+        with self._lock:
+            if path is None:
+                self._entries.clear()
+                self._fingerprints.clear()
+                return
+            path = os.path.abspath(path)
+            self._fingerprints.pop(path, None)
+            for key in [key for key in self._entries if key[0] == path]:
+                del self._entries[key]
+
+    def release(self, controller):
+        """释放控制器绑定过的所有 Tasker，包括已被淘汰或重新加载的资源包上的"""
+        with self._lock:
+            taskers = self._bound.pop(controller, [])
+            entries = list(self._entries.values())
+        for entry in entries:
+            with entry.lock:
+                entry.taskers.pop(controller, None)
+        for tasker in taskers:
+            unbind_tasker_controller(tasker)
+
+    def preload(self, path: str, use_cpu: bool = True) -> ResourceEntry:
+        """提前加载资源包，之后的 lease 直接命中"""
+        return self._entry(path, use_cpu)
+
+    @contextmanager
+    def lease(self, path: str, controller, notification_handler=None, use_cpu: bool = True):
+        """借用已加载的 Resource 和绑定到 controller 的 Tasker，不同控制器可以同时借用
+
+        :param path: 资源路径
+        :param controller: 执行任务的控制器
+        :param notification_handler: Tasker 的通知处理器
+        :param use_cpu: 是否使用 CPU 推理
+        :return: (resource, tasker)
+        """
+        entry = self._entry(path, use_cpu)
+        yield entry.resource, self._tasker(entry, controller, notification_handler)
+
+    def _entry(self, path: str, use_cpu: bool) -> ResourceEntry:
+        key = (os.path.abspath(path), use_cpu)
+        fingerprint = self._fingerprint(key[0])
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.fingerprint == fingerprint:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+
+        with self._load_lock:
+            # 等待期间其他线程可能已经加载完成
+            with self._lock:
+                current = self._entries.get(key)
+                if current is not None and current.fingerprint == fingerprint:
+                    self.hits += 1
+                    return current
+                self.misses += 1
+                if current is not None:
+                    self.reloads += 1
+            entry = self._load(key[0], use_cpu, fingerprint)
+            with self._lock:
+                self._entries[key] = entry
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+            return entry
+
+    def _fingerprint(self, path: str) -> str:
+        now = time.monotonic()
+        with self._lock:
+            cached = self._fingerprints.get(path)
+        if cached is not None and now - cached[0] < self.fingerprint_ttl:
+            return cached[1]
+        fingerprint = bundle_fingerprint(path)
+        with self._lock:
+            self._fingerprints[path] = (now, fingerprint)
+        return fingerprint
+
+    @staticmethod
+    def _load(path: str, use_cpu: bool, fingerprint: str) -> ResourceEntry:
+        print(f"加载资源: {path}")
+        resource = Resource()
+        if use_cpu:
+            resource.use_cpu()
+        customs = []
+        for name, action_class in CUSTOM_ACTIONS.items():
+            action = action_class()
+            resource.register_custom_action(name, action)
+            customs.append(action)
+        for name, recognition_class in CUSTOM_RECOGNITIONS.items():
+            recognition = recognition_class()
+            resource.register_custom_recognition(name, recognition)
+            customs.append(recognition)
+
+        result = resource.post_bundle(path).wait()
+        if not result.succeeded:
+            raise RuntimeError(f"资源加载失败: {result}")
+        return ResourceEntry(fingerprint, resource, customs)
+
+    def _tasker(self, entry: ResourceEntry, controller, notification_handler) -> Tasker:
+        with entry.lock:
+            bound = entry.taskers.get(controller)
+            if bound is not None and bound[0] is notification_handler and bound[1].inited:
+                return bound[1]
+
+            tasker = Tasker(notification_handler=notification_handler)
+            if not tasker.bind(entry.resource, controller):
+                raise RuntimeError("任务管理器绑定失败")
+            if not tasker.inited:
+                raise RuntimeError("MAA 初始化失败")
+            bind_tasker_controller(tasker, controller)
+            entry.taskers[controller] = (notification_handler, tasker)
+        with self._lock:
+            self._bound.setdefault(controller, []).append(tasker)
+        return tasker
+
+
+# 进程内共用的资源缓存
+resource_cache = ResourceCache()
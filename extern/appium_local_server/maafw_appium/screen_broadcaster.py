@@ -0,0 +1,327 @@
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+
+from .adaptive_rate import EWMA_ALPHA
+from .appium_controller import AppiumController
+from .frame_diff import FrameChangeDetector, dirty_rects
+from .frame_protocol import CODEC_JPEG, Tile, encode_image
+
+# 变化区域超过整帧的该比例时，增量帧不比完整帧划算，直接发送完整帧
+DELTA_MAX_AREA_RATIO = 0.5
+# 输入操作结束后额外截图的时间点(秒)，覆盖界面立即响应、动画进行中和动画结束
+BURST_OFFSETS = (0.05, 0.15, 0.4)
+
+
+class Frame:
+    """一帧截图及其编码结果
+
+    同一帧的缩放图像和编码结果按 (codec, quality, scale) 缓存，
+    多个订阅者共享同一份编码，编码在第一次被请求时进行。增量补丁同样按需计算并缓存。
+    """
+
+    def __init__(
+            self,
+            seq: int,
+            timestamp: float,
+            image: np.ndarray,
+            prev: Optional["Frame"] = None,
+            keyframe: bool = True,
+            burst: bool = False,
+    ):
+        """
+        :param seq: 帧序号
+        :param timestamp: 采集时间戳(秒)
+        :param image: BGR 图像
+        :param prev: 上一帧，用于计算增量补丁
+        :param keyframe: 是否为关键帧，关键帧总是完整发送
+        :param burst: 是否为输入操作后的突发截图，限速中的连接也会立即发送
+        """
+        self.seq = seq
+        self.timestamp = timestamp
+        self.image = image
+        self.height, self.width = image.shape[:2]
+        self.prev = prev
+        self.keyframe = keyframe or prev is None
+        self.burst = burst
+        self._scaled: Dict[float, np.ndarray] = {}
+        self._encoded: Dict[Tuple[int, Optional[int], float], bytes] = {}
+        self._deltas: Dict[Tuple[int, Optional[int], int, float], Optional[List[Tile]]] = {}
+        self._lock = threading.RLock()
+
+    def scaled(self, scale: float = 1.0) -> np.ndarray:
+        """按比例缩放后的图像"""
+        if scale >= 1.0:
+            return self.image
+        with self._lock:
+            image = self._scaled.get(scale)
+            if image is None:
+                size = (max(1, int(self.width * scale)), max(1, int(self.height * scale)))
+                image = cv2.resize(self.image, size, interpolation=cv2.INTER_AREA)
+                self._scaled[scale] = image
+            return image
+
+    def size(self, scale: float = 1.0) -> Tuple[int, int]:
+        """缩放后的 (宽, 高)"""
+        height, width = self.scaled(scale).shape[:2]
+        return width, height
+
+    def encoded(self, codec: int = CODEC_JPEG, quality: Optional[int] = None, scale: float = 1.0) -> bytes:
+        key = (codec, quality, scale)
+        with self._lock:
+            payload = self._encoded.get(key)
+            if payload is None:
+                payload = encode_image(self.scaled(scale), codec, quality)
+                self._encoded[key] = payload
+            return payload
+
+    def is_encoded(self, codec: int = CODEC_JPEG, quality: Optional[int] = None, scale: float = 1.0) -> bool:
+        """encoded() 是否可以直接返回缓存的编码结果"""
+        return (codec, quality, scale) in self._encoded
+
+    def is_delta_ready(
+            self,
+            codec: int = CODEC_JPEG,
+            quality: Optional[int] = None,
+            tile_size: int = 64,
+            scale: float = 1.0,
+    ) -> bool:
+        """delta() 是否可以直接返回缓存的结果"""
+        return (codec, quality, tile_size, scale) in self._deltas
+
+    def delta(
+            self,
+            codec: int = CODEC_JPEG,
+            quality: Optional[int] = None,
+            tile_size: int = 64,
+            scale: float = 1.0,
+    ) -> Optional[List[Tile]]:
+        """相对上一帧的增量补丁列表，坐标为缩放后的坐标
+
+        关键帧、缺少上一帧或变化区域过大时返回 None，此时应发送完整帧。
+        """
+        prev = self.prev
+        if self.keyframe or prev is None:
+            return None
+        key = (codec, quality, tile_size, scale)
+        with self._lock:
+            if key in self._deltas:
+                return self._deltas[key]
+            tiles = None
+            image = self.scaled(scale)
+            rects = dirty_rects(prev.scaled(scale), image, tile_size)
+            area = sum(w * h for _, _, w, h in rects)
+            if area <= image.shape[0] * image.shape[1] * DELTA_MAX_AREA_RATIO:
+                tiles = [
+                    (x, y, w, h, encode_image(image[y:y + h, x:x + w], codec, quality))
+                    for x, y, w, h in rects
+                ]
+            self._deltas[key] = tiles
+            return tiles
+
+
+class ScreenBroadcaster:
+    """单会话共享的截图生产者
+
+    后台线程按固定间隔调用 controller.screencap_preview()，把最新帧写入环形缓冲区，
+    所有 /screen 订阅者都从缓冲区读取最新帧。慢速客户端直接跳到最新帧，
+    不会排队积压；截图开销与订阅者数量无关。没有订阅者时暂停截图。
+    画面没有变化的截图直接丢弃，不编码也不推送。
+    每 keyframe_interval 帧产生一个关键帧，增量模式的客户端借此重新同步。
+    截图间隔取所有订阅者期望间隔的最小值，但不会快于设备的截图耗时。
+    输入操作后调用 trigger_burst()，在 burst_offsets 的时间点额外截图，之后恢复原来的间隔。
+    """
+
+    def __init__(
+            self,
+            controller: AppiumController,
+            interval: float = 0.5,
+            buffer_size: int = 4,
+            on_session_lost: Callable[["ScreenBroadcaster", Exception], None] = None,
+            change_detector: Optional[FrameChangeDetector] = None,
+            keyframe_interval: int = 30,
+            burst_offsets: Sequence[float] = BURST_OFFSETS,
+    ):
+        """
+        :param controller: 截图使用的控制器
+        :param interval: 没有订阅者指定间隔时的默认截图间隔(秒)
+        :param buffer_size: 环形缓冲区保留的帧数
+        :param on_session_lost: 会话断开时的回调，参数为 (broadcaster, error)
+        :param change_detector: 画面变化检测器，默认使用 FrameChangeDetector()
+        :param keyframe_interval: 关键帧间隔(帧数)
+        :param burst_offsets: 输入操作后额外截图的时间点(秒)
+        """
+        self.controller = controller
+        self.interval = interval
+        self.on_session_lost = on_session_lost
+        self.change_detector = change_detector or FrameChangeDetector()
+        self.keyframe_interval = keyframe_interval
+        self.skipped_frames = 0
+        self.burst_offsets = tuple(burst_offsets)
+        self.burst_captures = 0
+        # 尚未执行的突发截图时间点(time.monotonic())
+        self._burst_at: List[float] = []
+        self._frames: deque = deque(maxlen=buffer_size)
+        self._seq = 0
+        self._subscribers: Dict[int, Optional[float]] = {}
+        self._next_token = 0
+        self.capture_seconds: Optional[float] = None
+        self._running = False
+        self._thread: Optional[threading.Thread] = None
+        self._cond = threading.Condition()
+
+    def start(self):
+        with self._cond:
+            if self._running:
+                return
+            self._running = True
+        self._thread = threading.Thread(target=self._run, name="ScreenBroadcaster", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        thread = self._thread
+        if thread and thread is not threading.current_thread():
+            thread.join(timeout=5)
+        self._thread = None
+
+    @property
+    def running(self) -> bool:
+        return self._running
+
+    def subscribe(self) -> int:
+        """注册订阅者，有订阅者时才会截图
+
+        :return: 订阅标识，用于 request_interval 和 unsubscribe
+        """
+        with self._cond:
+            self._next_token += 1
+            self._subscribers[self._next_token] = None
+            self._cond.notify_all()
+            return self._next_token
+
+    def unsubscribe(self, token: int):
+        with self._cond:
+            self._subscribers.pop(token, None)
+
+    def request_interval(self, token: int, interval: float):
+        """订阅者声明期望的截图间隔(秒)"""
+        with self._cond:
+            if token in self._subscribers:
+                self._subscribers[token] = interval
+
+    def trigger_burst(self):
+        """输入操作结束后调用，安排一组突发截图，新的操作会替换未执行完的一组"""
+        now = time.monotonic()
+        with self._cond:
+            if not self._subscribers:
+                # 没有人观看时不需要额外截图
+                return
+            self._burst_at = [now + offset for offset in self.burst_offsets]
+            self._cond.notify_all()
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    @property
+    def capture_interval(self) -> float:
+        with self._cond:
+            requested = [interval for interval in self._subscribers.values() if interval]
+        return min(requested) if requested else self.interval
+
+    def latest(self) -> Optional[Frame]:
+        with self._cond:
+            return self._frames[-1] if self._frames else None
+
+    def wait_for_frame(self, after_seq: int = 0, timeout: float = 1.0, burst_only: bool = False) -> Optional[Frame]:
+        """等待序号大于 after_seq 的最新帧，超时返回 None
+
+        :param burst_only: 只返回突发截图产生的帧
+        """
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while self._running:
+                if self._frames and self._frames[-1].seq > after_seq and (not burst_only or self._frames[-1].burst):
+                    return self._frames[-1]
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                self._cond.wait(remaining)
+        return None
+
+    def _publish(self, image: np.ndarray, timestamp: float, burst: bool = False):
+        with self._cond:
+            prev = self._frames[-1] if self._frames else None
+            if prev is not None and prev.image.shape != image.shape:
+                prev = None
+            self._seq += 1
+            keyframe = (self._seq - 1) % self.keyframe_interval == 0
+            self._frames.append(Frame(self._seq, timestamp, image, prev, keyframe, burst))
+            # 只保留相邻一帧的引用，避免帧链无限增长
+            if prev is not None:
+                prev.prev = None
+            self._cond.notify_all()
+
+    def _check_session(self):
+        # 检查会话状态并尝试重连
+        if not self.controller.driver.session_id:
+            if not self.controller.connect():
+                raise Exception("会话重连失败")
+
+    def _run(self):
+        burst = False
+        while True:
+            with self._cond:
+                while self._running and not self._subscribers:
+                    self._cond.wait()
+                if not self._running:
+                    return
+
+            started = time.monotonic()
+            try:
+                self._check_session()
+                screen = self.controller.screencap_preview()
+                captured_at = time.time()
+                self._record_capture(time.monotonic() - started)
+            except Exception as e:
+                print(f"截图失败，会话可能已断开: {e}")
+                with self._cond:
+                    self._running = False
+                    self._cond.notify_all()
+                if self.on_session_lost:
+                    self.on_session_lost(self, e)
+                return
+
+            if screen is not None:
+                if self.change_detector.changed(screen):
+                    self._publish(screen, captured_at, burst)
+                else:
+                    self.skipped_frames += 1
+
+            # 控制刷新率，有突发截图安排时提前截图
+            with self._cond:
+                while self._running:
+                    due = min([started + self.capture_interval] + self._burst_at)
+                    remaining = due - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                # 截图耗时内错过的多个时间点合并为一次截图
+                now = time.monotonic()
+                burst = any(at <= now for at in self._burst_at)
+                self._burst_at = [at for at in self._burst_at if at > now]
+                if burst:
+                    self.burst_captures += 1
+
+    def _record_capture(self, seconds: float):
+        if self.capture_seconds is None:
+            self.capture_seconds = seconds
+        else:
+            self.capture_seconds += EWMA_ALPHA * (seconds - self.capture_seconds)
@@ -0,0 +1,145 @@
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, Optional, Tuple, Union
+
+import cv2
+import numpy as np
+
+from .frame_cache import CachedCapture
+
+INTERPOLATIONS = {
+    "nearest": cv2.INTER_NEAREST,
+    "linear": cv2.INTER_LINEAR,
+    "cubic": cv2.INTER_CUBIC,
+    "area": cv2.INTER_AREA,
+    "lanczos": cv2.INTER_LANCZOS4,
+}
+
+_REDUCED_FLAGS = {
+    1: cv2.IMREAD_COLOR,
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    8: cv2.IMREAD_REDUCED_COLOR_8,
+}
+
+_JPEG_MAGIC = b"\xff\xd8"
+
+STAGES = ("fetch", "decode", "resize", "total")
+
+
+@dataclass
+class ScreencapOptions:
+    """截图解码配置
+
+    - interpolation: "auto" 缩小用 AREA、放大用 LINEAR，也可指定 INTERPOLATIONS 中的名称
+    - reduce: 解码时缩小的倍数 1/2/4/8；"auto" 表示在不小于目标尺寸的前提下取最大倍数，
+      只对 JPEG 数据生效（PNG 的缩小解码并不会更快）
+    - resize: False 时直接返回解码结果，不缩放到目标尺寸
+    """
+    interpolation: str = "auto"
+    reduce: Union[int, str] = 1
+    resize: bool = True
+
+
+class ScreencapPipeline:
+    """截图获取 -> 解码 -> 缩放，并记录每个阶段的耗时(毫秒)
+
+    fetch 返回 FrameCache 的 CachedCapture 时，同一次截图只解码一次。
+    """
+
+    def __init__(self, options: Optional[ScreencapOptions] = None):
+        self.options = options or ScreencapOptions()
+        self.last: Dict[str, float] = {}
+        self.count = 0
+        self._totals: Dict[str, float] = {stage: 0.0 for stage in STAGES}
+        self._source_size: Optional[Tuple[int, int]] = None
+        self._last_key = None
+        self._last_image: Optional[np.ndarray] = None
+        self._lock = threading.Lock()
+
+    @property
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """最近一次与平均的各阶段耗时"""
+        average = {
+            stage: (total / self.count if self.count else 0.0)
+            for stage, total in self._totals.items()
+        }
+        return {"last": dict(self.last), "average": average, "count": self.count}
+
+    def run(self, fetch: Callable[[], Union[bytes, CachedCapture]], target_size: Optional[Tuple[int, int]]) -> np.ndarray:
+        """
+        :param fetch: 获取编码后截图数据(或缓存截图)的函数
+        :param target_size: 目标尺寸 (宽, 高)，None 表示保持原尺寸
+        :return: BGR 图像
+        """
+        with self._lock:
+            return self._run(fetch, target_size)
+
+    def _run(self, fetch: Callable[[], Union[bytes, CachedCapture]], target_size: Optional[Tuple[int, int]]) -> np.ndarray:
+        started = time.perf_counter()
+        data = fetch()
+        fetched = time.perf_counter()
+
+        key = None
+        if isinstance(data, CachedCapture):
+            key = (data.capture_id, target_size)
+            if key == self._last_key:
+                return self._last_image
+            data = data.data
+
+        image = self.decode(data, target_size)
+        decoded = time.perf_counter()
+        image = self.resize(image, target_size)
+        finished = time.perf_counter()
+        self._last_key = key
+        self._last_image = image
+
+        self._record({
+            "fetch": (fetched - started) * 1000,
+            "decode": (decoded - fetched) * 1000,
+            "resize": (finished - decoded) * 1000,
+            "total": (finished - started) * 1000,
+        })
+        return image
+
+    def decode(self, data: bytes, target_size: Optional[Tuple[int, int]] = None) -> np.ndarray:
+        factor = self._reduce_factor(data, target_size)
+        image = cv2.imdecode(np.frombuffer(data, np.uint8), _REDUCED_FLAGS[factor])
+        if image is None:
+            raise ValueError("截图解码失败")
+        self._source_size = (image.shape[1] * factor, image.shape[0] * factor)
+        return image
+
+    def resize(self, image: np.ndarray, target_size: Optional[Tuple[int, int]]) -> np.ndarray:
+        if not self.options.resize or not target_size or not all(target_size):
+            return image
+        height, width = image.shape[:2]
+        target_w, target_h = target_size
+        # 尺寸已一致时跳过缩放
+        if (width, height) == (target_w, target_h):
+            return image
+        interpolation = INTERPOLATIONS.get(self.options.interpolation)
+        if interpolation is None:
+            shrinking = target_w * target_h < width * height
+            interpolation = cv2.INTER_AREA if shrinking else cv2.INTER_LINEAR
+        return cv2.resize(image, (target_w, target_h), interpolation=interpolation)
+
+    def _reduce_factor(self, data: bytes, target_size: Optional[Tuple[int, int]]) -> int:
+        reduce = self.options.reduce
+        if reduce != "auto":
+            return int(reduce) if int(reduce) in _REDUCED_FLAGS else 1
+        if not data.startswith(_JPEG_MAGIC) or not target_size or self._source_size is None:
+            return 1
+        source_w, source_h = self._source_size
+        target_w, target_h = target_size
+        for factor in (8, 4, 2):
+            if source_w // factor >= target_w and source_h // factor >= target_h:
+                return factor
+        return 1
+
+    def _record(self, timings: Dict[str, float]):
+        self.last = timings
+        self.count += 1
+        for stage, value in timings.items():
+            self._totals[stage] += value
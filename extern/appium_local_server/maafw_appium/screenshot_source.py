@@ -0,0 +1,225 @@
+import threading
+import time
+import urllib.request
+from abc import ABC, abstractmethod
+from typing import Any, Dict, Optional, Union
+from urllib.parse import urlparse
+
+# 默认 MJPEG 端口: WebDriverAgent 为 9100，UiAutomator2 为 7810
+DEFAULT_MJPEG_PORTS = {
+    "ios": 9100,
+    "android": 7810,
+}
+
+_JPEG_SOI = b"\xff\xd8"
+_JPEG_EOI = b"\xff\xd9"
+
+
+class ScreenshotSource(ABC):
+    """截图来源，返回编码后的图像字节(PNG/JPEG)，由 ScreencapPipeline 统一解码"""
+
+    def start(self, controller):
+        """控制器创建好 driver 后调用"""
+
+    def stop(self):
+        """控制器关闭时调用"""
+
+    @abstractmethod
+    def fetch(self) -> bytes:
+        raise NotImplementedError
+
+
+class WebDriverPngSource(ScreenshotSource):
+    """通过 WebDriver 截图接口获取 PNG，每次一个 HTTP 往返"""
+
+    def __init__(self):
+        self.controller = None
+
+    def start(self, controller):
+        self.controller = controller
+
+    def fetch(self) -> bytes:
+        return self.controller.driver.get_screenshot_as_png()
+
+
+class WebDriverJpegSource(WebDriverPngSource):
+    """通过 WebDriver 截图接口获取较低质量的 JPEG 截图
+
+    启动时通过 update_settings 设置截图质量，之后仍走截图接口，
+    但返回的数据体积远小于 PNG。
+    """
+
+    def __init__(self, settings: Optional[Dict[str, Any]] = None, quality: int = 1):
+        """
+        :param settings: 启动时写入的 Appium settings，默认 {"screenshotQuality": quality}
+        :param quality: screenshotQuality 取值，0 最高质量，2 最低质量
+        """
+        super().__init__()
+        self.settings = settings if settings is not None else {"screenshotQuality": quality}
+
+    def start(self, controller):
+        super().start(controller)
+        try:
+            controller.driver.update_settings(self.settings)
+        except Exception as e:
+            print(f"设置截图质量失败: {e}")
+
+
+class MjpegStreamSource(ScreenshotSource):
+    """读取设备端 MJPEG 推流(appium:mjpegServerPort)
+
+    后台线程持续读取推流并只保留最新一帧，fetch() 只是一次内存读取，
+    不再产生 WebDriver 请求。连接断开后自动重连。
+    """
+
+    def __init__(
+            self,
+            url: str,
+            connect_timeout: float = 5.0,
+            first_frame_timeout: float = 5.0,
+            reconnect_delay: float = 1.0,
+            chunk_size: int = 64 * 1024,
+    ):
+        """
+        :param url: MJPEG 推流地址，如 http://127.0.0.1:9100
+        :param connect_timeout: 连接超时(秒)
+        :param first_frame_timeout: fetch() 等待第一帧的最长时间(秒)
+        :param reconnect_delay: 断线重连间隔(秒)
+        :param chunk_size: 每次读取的字节数
+        """
+        self.url = url
+        self.connect_timeout = connect_timeout
+        self.first_frame_timeout = first_frame_timeout
+        self.reconnect_delay = reconnect_delay
+        self.chunk_size = chunk_size
+        self.frame_count = 0
+        self.frame_timestamp: Optional[float] = None
+        self._frame: Optional[bytes] = None
+        self._cond = threading.Condition()
+        self._running = False
+        self._thread: Optional[threading.Thread] = None
+        self._response = None
+
+    def start(self, controller=None):
+        with self._cond:
+            if self._running:
+                return
+            self._running = True
+        self._thread = threading.Thread(target=self._run, name="MjpegStreamSource", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        response = self._response
+        if response is not None:
+            try:
+                response.close()
+            except Exception:
+                pass
+        if self._thread:
+            self._thread.join(timeout=self.connect_timeout)
+        self._thread = None
+
+    def fetch(self) -> bytes:
+        deadline = time.monotonic() + self.first_frame_timeout
+        with self._cond:
+            while self._frame is None:
+                remaining = deadline - time.monotonic()
+                if not self._running or remaining <= 0:
+                    raise TimeoutError(f"MJPEG 推流无数据: {self.url}")
+                self._cond.wait(remaining)
+            return self._frame
+
+    def _run(self):
+        while self._running:
+            try:
+                self._response = urllib.request.urlopen(self.url, timeout=self.connect_timeout)
+                self._read_stream(self._response)
+            except Exception as e:
+                if self._running:
+                    print(f"MJPEG 推流读取失败: {e}")
+            finally:
+                if self._response is not None:
+                    try:
+                        self._response.close()
+                    except Exception:
+                        pass
+                    self._response = None
+            with self._cond:
+                if self._running:
+                    self._cond.wait(self.reconnect_delay)
+
+    def _read_stream(self, response):
+        # 不依赖 multipart 边界格式，直接按 JPEG 起止标记切分帧
+        buffer = bytearray()
+        while self._running:
+            chunk = response.read1(self.chunk_size) if hasattr(response, "read1") else response.read(self.chunk_size)
+            if not chunk:
+                return
+            buffer.extend(chunk)
+            latest = None
+            while True:
+                start = buffer.find(_JPEG_SOI)
+                if start < 0:
+                    # 保留最后一个字节，它可能是被截断的起始标记
+                    del buffer[:-1]
+                    break
+                end = buffer.find(_JPEG_EOI, start + 2)
+                if end < 0:
+                    del buffer[:start]
+                    break
+                latest = bytes(buffer[start:end + 2])
+                del buffer[:end + 2]
+            if latest is not None:
+                self._publish(latest)
+
+    def _publish(self, frame: bytes):
+        with self._cond:
+            self._frame = frame
+            self.frame_count += 1
+            self.frame_timestamp = time.time()
+            self._cond.notify_all()
+
+
+def mjpeg_url(server_url: str, capabilities: Dict[str, Any], platform: str) -> str:
+    """根据 Appium 服务器地址和 capabilities 中的 mjpegServerPort 推断推流地址"""
+    port = capabilities.get("appium:mjpegServerPort", capabilities.get("mjpegServerPort"))
+    if not port:
+        port = DEFAULT_MJPEG_PORTS.get(platform, DEFAULT_MJPEG_PORTS["ios"])
+    host = urlparse(server_url).hostname or "127.0.0.1"
+    return f"http://{host}:{port}"
+
+
+def create_screenshot_source(
+        spec: Union[None, str, Dict[str, Any], ScreenshotSource],
+        server_url: str,
+        capabilities: Dict[str, Any],
+        platform: str,
+) -> ScreenshotSource:
+    """根据配置创建截图来源
+
+    :param spec: ScreenshotSource 实例，或 "png" / "jpeg" / "mjpeg"，
+                 或 {"type": "mjpeg", "url": ...} / {"type": "jpeg", "settings": {...}} 形式的字典
+    :param server_url: Appium 服务器地址
+    :param capabilities: Appium capabilities
+    :param platform: "ios" 或 "android"
+    """
+    if isinstance(spec, ScreenshotSource):
+        return spec
+    if spec is None:
+        spec = "png"
+    if isinstance(spec, str):
+        spec = {"type": spec}
+
+    options = dict(spec)
+    source_type = options.pop("type", "png")
+    if source_type == "png":
+        return WebDriverPngSource()
+    if source_type == "jpeg":
+        return WebDriverJpegSource(**options)
+    if source_type == "mjpeg":
+        url = options.pop("url", None) or mjpeg_url(server_url, capabilities, platform)
+        return MjpegStreamSource(url, **options)
+    raise ValueError(f"未知的截图来源: {source_type}")
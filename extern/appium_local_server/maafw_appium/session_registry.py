@@ -0,0 +1,73 @@
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from .device_session import DeviceSession
+
+
+def device_key(capabilities: Dict[str, Any], server_url: str) -> str:
+    """设备标识，同一设备重新 /init 时替换旧会话
+
+    capabilities 中既没有 udid 也没有 deviceName 时无法区分设备(例如客户端检查服务状态时的 /init)，
+    同一 server_url 下这类会话只保留最新的一个，不影响能识别设备的会话
+    """
+    udid = capabilities.get("appium:udid") or capabilities.get("udid")
+    if not udid:
+        udid = capabilities.get("appium:deviceName") or capabilities.get("deviceName")
+    if not udid:
+        return f"{server_url}|*"
+    return f"{server_url}|{udid}"
+
+
+class SessionRegistry:
+    """按 session_id 管理多个设备会话
+
+    每个会话拥有自己的控制器、Tasker 和截图生产者，Resource 通过资源缓存在会话之间共用。
+    未指定 session_id 时使用最近创建的会话，兼容只连接一台设备的客户端。
+    """
+
+    def __init__(self):
+        self._sessions: "OrderedDict[str, DeviceSession]" = OrderedDict()
+        # session_id -> 设备标识
+        self._keys: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def add(self, session: DeviceSession, key: str = None) -> List[DeviceSession]:
+        """登记会话，返回被替换的同一设备的旧会话，由调用方关闭"""
+        with self._lock:
+            replaced = []
+            if key is not None:
+                for session_id, existing in list(self._keys.items()):
+                    if existing == key:
+                        replaced.append(self._sessions.pop(session_id))
+                        del self._keys[session_id]
+                self._keys[session.session_id] = key
+            self._sessions[session.session_id] = session
+            return replaced
+
+    def get(self, session_id: str = None) -> Optional[DeviceSession]:
+        with self._lock:
+            if session_id:
+                return self._sessions.get(session_id)
+            if not self._sessions:
+                return None
+            return next(reversed(self._sessions.values()))
+
+    def remove(self, session_id: str) -> Optional[DeviceSession]:
+        with self._lock:
+            self._keys.pop(session_id, None)
+            return self._sessions.pop(session_id, None)
+
+    def find_by_broadcaster(self, broadcaster) -> Optional[DeviceSession]:
+        with self._lock:
+            for session in self._sessions.values():
+                if session.broadcaster is broadcaster:
+                    return session
+        return None
+
+    def all(self) -> List[DeviceSession]:
+        with self._lock:
+            return list(self._sessions.values())
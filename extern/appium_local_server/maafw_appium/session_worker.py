@@ -0,0 +1,558 @@
+import itertools
+import multiprocessing
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from multiprocessing.shared_memory import SharedMemory
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .device_session import DeviceSession, STATE_CLOSED, STATE_ERROR, STATE_LOADING, STATE_PENDING, STATE_READY
+from .screen_broadcaster import Frame
+
+# 工作进程使用 spawn 启动，不继承路由进程的线程和 MAA 原生库状态
+_mp = multiprocessing.get_context("spawn")
+
+# 允许通过 RPC 调用的方法
+CONTROLLER_METHODS = ("click", "swipe", "long_click", "perform_batch")
+BROADCASTER_METHODS = ("subscribe", "unsubscribe", "request_interval", "trigger_burst")
+
+# RPC 默认超时(秒)，运行流水线不设超时
+RPC_TIMEOUT = 30.0
+# 关闭工作进程时等待其退出的时间(秒)，超时后强制结束
+CLOSE_TIMEOUT = 5.0
+
+
+class SharedFrame:
+    """工作进程写入截图帧的共享内存
+
+    管道中只传递 (名称, 形状, 类型)，图像不经过序列化。路由进程每次只有一个等待中的
+    wait_for_frame 请求，读取完成后才会发出下一个，所以一块内存即可，不会读到写了一半的帧。
+    """
+
+    def __init__(self):
+        self._shm: Optional[SharedMemory] = None
+
+    def write(self, image: np.ndarray) -> Tuple[str, tuple, str]:
+        if self._shm is None or self._shm.size < image.nbytes:
+            self.close()
+            self._shm = SharedMemory(create=True, size=image.nbytes)
+        np.ndarray(image.shape, image.dtype, buffer=self._shm.buf)[...] = image
+        return self._shm.name, image.shape, image.dtype.str
+
+    def close(self):
+        if self._shm is not None:
+            self._shm.close()
+            self._shm.unlink()
+            self._shm = None
+
+
+class SharedFrameReader:
+    """路由进程中读取 SharedFrame，内存块更换时重新映射"""
+
+    def __init__(self):
+        self._shm: Optional[SharedMemory] = None
+
+    def read(self, name: str, shape: tuple, dtype: str) -> np.ndarray:
+        if self._shm is None or self._shm.name != name:
+            self.close()
+            self._shm = SharedMemory(name=name)
+        # 复制一份，工作进程之后会覆盖这块内存
+        return np.ndarray(shape, np.dtype(dtype), buffer=self._shm.buf).copy()
+
+    def close(self):
+        if self._shm is not None:
+            self._shm.close()
+            self._shm = None
+
+
+class _WorkerHost:
+    """工作进程内的 RPC 服务端，持有一个 DeviceSession
+
+    每个请求在线程池中执行，等待截图帧的请求不会阻塞点击等操作。
+    """
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.session: Optional[DeviceSession] = None
+        self._send_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="WorkerRPC")
+        self._frame = SharedFrame()
+
+    def serve(self):
+        while True:
+            try:
+                message = self.conn.recv()
+            except (EOFError, OSError):
+                # 路由进程已退出
+                break
+            kind = message[0]
+            if kind == "start":
+                self._start(*message[1:])
+            elif kind == "call":
+                self._executor.submit(self._call, *message[1:])
+            elif kind == "close":
+                break
+        if self.session:
+            self.session.close()
+        self._executor.shutdown(wait=False)
+        self._frame.close()
+
+    def _send(self, *message):
+        with self._send_lock:
+            self.conn.send(message)
+
+    def _start(self, session_id: str, controller_class, controller_kwargs: Dict[str, Any], resource_path: str):
+        self.session = DeviceSession(
+            lambda: controller_class(**controller_kwargs),
+            resource_path=resource_path,
+            on_session_lost=self._on_session_lost
+        )
+        # 与路由进程中的代理使用同一个 session_id
+        self.session.session_id = session_id
+        self.session.start()
+        threading.Thread(target=self._report, name="WorkerReport", daemon=True).start()
+
+    def _report(self):
+        self._send("event", "status", self.session.status)
+        self.session.wait()
+        self._send("event", "status", self.session.status)
+
+    def _on_session_lost(self, broadcaster, error: Exception):
+        self._send("event", "lost", str(error))
+
+    def _call(self, request_id: int, target: str, method: str, args: tuple):
+        try:
+            value = self._dispatch(target, method, args)
+        except Exception as e:
+            self._send("result", request_id, False, f"{type(e).__name__}: {e}")
+            return
+        try:
+            self._send("result", request_id, True, value)
+        except Exception as e:
+            self._send("result", request_id, False, f"结果无法序列化: {e}")
+
+    def _ready(self) -> DeviceSession:
+        session = self.session
+        if session is None or session.state != STATE_READY:
+            raise RuntimeError("会话未就绪")
+        return session
+
+    def _dispatch(self, target: str, method: str, args: tuple) -> Any:
+        if target == "session":
+            if method == "status":
+                return self.session.status
+            if method == "info":
+                return self._ready().info()
+            if method == "run_pipeline":
+                return self._ready().run_pipeline(*args)
+        elif target == "controller" and method in CONTROLLER_METHODS:
+            return getattr(self._ready().controller, method)(*args)
+        elif target == "broadcaster":
+            broadcaster = self._ready().broadcaster
+            if method in BROADCASTER_METHODS:
+                return getattr(broadcaster, method)(*args)
+            if method == "wait_for_frame":
+                frame = broadcaster.wait_for_frame(*args)
+                if frame is None:
+                    return None
+                shared = self._frame.write(frame.image)
+                return frame.seq, frame.timestamp, shared, frame.keyframe, frame.burst, broadcaster.capture_seconds
+        raise AttributeError(f"不支持的调用: {target}.{method}")
+
+
+def _worker_main(conn):
+    _WorkerHost(conn).serve()
+
+
+class WorkerProcess:
+    """一个会话工作进程及其 RPC 通道"""
+
+    def __init__(self):
+        parent_conn, child_conn = _mp.Pipe()
+        self.process = _mp.Process(target=_worker_main, args=(child_conn,), name="MaaSessionWorker", daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.conn = parent_conn
+        # 工作进程推送的事件 (名称, 数据)，进程退出时收到 ("exit", 退出码)
+        self.on_event: Optional[Callable[[str, Any], None]] = None
+        self._pending: Dict[int, Future] = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._send_lock = threading.Lock()
+        self._closed = False
+        threading.Thread(target=self._read, name=f"WorkerReader-{self.process.pid}", daemon=True).start()
+
+    @property
+    def pid(self) -> int:
+        return self.process.pid
+
+    @property
+    def alive(self) -> bool:
+        return not self._closed and self.process.is_alive()
+
+    def send(self, *message):
+        with self._send_lock:
+            self.conn.send(message)
+
+    def call(self, target: str, method: str, *args, timeout: Optional[float] = RPC_TIMEOUT) -> Any:
+        """调用工作进程中的方法，出错时抛出 RuntimeError"""
+        future = Future()
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("工作进程已退出")
+            request_id = next(self._ids)
+            self._pending[request_id] = future
+        try:
+            self.send("call", request_id, target, method, args)
+            return future.result(timeout)
+        except FutureTimeoutError:
+            raise RuntimeError(f"调用超时: {target}.{method}")
+        except (OSError, ValueError) as e:
+            raise RuntimeError(f"工作进程已退出: {e}")
+        finally:
+            with self._lock:
+                self._pending.pop(request_id, None)
+
+    def close(self):
+        try:
+            self.send("close")
+        except (OSError, ValueError):
+            pass
+        self.process.join(CLOSE_TIMEOUT)
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join(1)
+        self.conn.close()
+
+    def _read(self):
+        while True:
+            try:
+                message = self.conn.recv()
+            except (EOFError, OSError):
+                break
+            if message[0] == "result":
+                _, request_id, ok, value = message
+                with self._lock:
+                    future = self._pending.pop(request_id, None)
+                if future is None:
+                    continue
+                if ok:
+                    future.set_result(value)
+                else:
+                    future.set_exception(RuntimeError(value))
+            elif message[0] == "event" and self.on_event:
+                self.on_event(message[1], message[2])
+
+        with self._lock:
+            self._closed = True
+            pending = list(self._pending.values())
+            self._pending.clear()
+        for future in pending:
+            future.set_exception(RuntimeError("工作进程已退出"))
+        self.process.join(1)
+        if self.on_event:
+            self.on_event("exit", self.process.exitcode)
+
+
+class RemoteController:
+    """工作进程中控制器的代理，只提供 HTTP 接口用到的操作"""
+
+    def __init__(self, worker: WorkerProcess):
+        self._worker = worker
+
+    def click(self, x: int, y: int) -> bool:
+        return self._worker.call("controller", "click", x, y)
+
+    def swipe(self, x1: int, y1: int, x2: int, y2: int, duration: int) -> bool:
+        return self._worker.call("controller", "swipe", x1, y1, x2, y2, duration)
+
+    def long_click(self, x: int, y: int, duration: float = 1.0) -> bool:
+        return self._worker.call("controller", "long_click", x, y, duration)
+
+    def perform_batch(self, gestures: List[Dict[str, Any]]) -> bool:
+        return self._worker.call("controller", "perform_batch", gestures)
+
+
+class RemoteBroadcaster:
+    """工作进程中截图生产者的代理
+
+    图像通过共享内存传递，在路由进程内重新组成 Frame，编码和增量补丁在这里计算，
+    同一设备的多个 /screen 连接共享同一次拉取。
+    """
+
+    def __init__(self, worker: WorkerProcess):
+        self._worker = worker
+        self.capture_seconds: Optional[float] = None
+        self._latest: Optional[Frame] = None
+        self._fetch_lock = threading.Lock()
+        self._reader = SharedFrameReader()
+
+    def subscribe(self) -> int:
+        return self._worker.call("broadcaster", "subscribe")
+
+    def unsubscribe(self, token: int):
+        try:
+            self._worker.call("broadcaster", "unsubscribe", token)
+        except Exception:
+            # 工作进程已退出时没有需要清理的订阅
+            pass
+
+    def request_interval(self, token: int, interval: float):
+        self._worker.call("broadcaster", "request_interval", token, interval)
+
+    def trigger_burst(self):
+        self._worker.call("broadcaster", "trigger_burst")
+
+    def close(self):
+        with self._fetch_lock:
+            self._reader.close()
+
+    def wait_for_frame(self, after_seq: int = 0, timeout: float = 1.0, burst_only: bool = False) -> Optional[Frame]:
+        """等待序号大于 after_seq 的最新帧，超时返回 None
+
+        :param burst_only: 只返回突发截图产生的帧
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            frame = self._fetch(after_seq, timeout)
+            if frame is None or not burst_only or frame.burst:
+                return frame
+            # 拉取过程不带 burst_only，其他连接仍然可以共用这次拉取
+            after_seq = frame.seq
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                return None
+
+    def _fetch(self, after_seq: int, timeout: float) -> Optional[Frame]:
+        if not self._fetch_lock.acquire(timeout=timeout):
+            return None
+        try:
+            latest = self._latest
+            if latest is not None and latest.seq > after_seq:
+                return latest
+            result = self._worker.call("broadcaster", "wait_for_frame", after_seq, timeout,
+                                       timeout=timeout + RPC_TIMEOUT)
+            if result is None:
+                return None
+            seq, timestamp, shared, keyframe, burst, self.capture_seconds = result
+            image = self._reader.read(*shared)
+            prev = latest
+            if prev is not None and (prev.seq != seq - 1 or prev.image.shape != image.shape):
+                prev = None
+            frame = Frame(seq, timestamp, image, prev, keyframe, burst)
+            # 只保留相邻一帧的引用，避免帧链无限增长
+            if prev is not None:
+                prev.prev = None
+            self._latest = frame
+            return frame
+        finally:
+            self._fetch_lock.release()
+
+
+class WorkerSession:
+    """在独立工作进程中运行的设备会话，接口与 DeviceSession 一致
+
+    识别、截图和 WebDriver 调用都在工作进程中执行，一台设备的 OCR 占满 CPU 和 GIL 时
+    不影响其他设备的点击和推流。工作进程退出时会话进入 error 状态并通知 on_session_lost。
+    """
+
+    def __init__(
+            self,
+            worker: WorkerProcess,
+            controller_class,
+            controller_kwargs: Dict[str, Any],
+            resource_path: str = None,
+            on_session_lost: Callable[[RemoteBroadcaster, Exception], None] = None,
+    ):
+        """
+        :param worker: 运行会话的工作进程
+        :param controller_class: 控制器类，在工作进程中实例化
+        :param controller_kwargs: 控制器构造参数，需要能够序列化
+        :param resource_path: 资源路径
+        :param on_session_lost: WebDriver 会话断开或工作进程退出时调用
+        """
+        self.session_id = uuid.uuid4().hex
+        self.worker = worker
+        self.controller_class = controller_class
+        self.controller_kwargs = controller_kwargs
+        self.resource_path = resource_path
+        self.on_session_lost = on_session_lost
+        self.state = STATE_PENDING
+        self.error: Optional[str] = None
+        self.controller = RemoteController(worker)
+        self.broadcaster = RemoteBroadcaster(worker)
+        self.created_at = time.monotonic()
+        self._status: Dict[str, Any] = {}
+        self._done = threading.Event()
+        self._lock = threading.Lock()
+        worker.on_event = self._on_event
+
+    @property
+    def status(self) -> Dict[str, Any]:
+        status = dict(self._status)
+        if self.worker.alive and self.state != STATE_CLOSED:
+            try:
+                status = self.worker.call("session", "status", timeout=2.0)
+            except Exception:
+                pass
+        status.update({
+            "session_id": self.session_id,
+            "state": self.state,
+            "error": self.error or status.get("error"),
+            "elapsed_ms": (time.monotonic() - self.created_at) * 1000,
+            "worker_pid": self.worker.pid,
+        })
+        return status
+
+    def start(self) -> "WorkerSession":
+        self.state = STATE_LOADING
+        self.worker.send("start", self.session_id, self.controller_class, self.controller_kwargs, self.resource_path)
+        return self
+
+    def wait(self, timeout: float = None) -> bool:
+        """等待初始化结束，返回是否就绪"""
+        self._done.wait(timeout)
+        return self.state == STATE_READY
+
+    def info(self) -> Dict[str, Any]:
+        info = self.worker.call("session", "info")
+        info["worker"] = {"pid": self.worker.pid}
+        return info
+
+    def notify_input(self):
+        self.broadcaster.trigger_burst()
+
+    def run_pipeline(self, pipeline: Dict[str, Any]) -> Dict[str, Any]:
+        return self.worker.call("session", "run_pipeline", pipeline, timeout=None)
+
+    def close(self):
+        with self._lock:
+            if self.state == STATE_CLOSED:
+                return
+            self.state = STATE_CLOSED
+            self._done.set()
+        self.broadcaster.close()
+        # 工作进程退出可能需要几秒，不阻塞调用方
+        threading.Thread(target=self.worker.close, name=f"WorkerClose-{self.worker.pid}", daemon=True).start()
+
+    def _on_event(self, name: str, data: Any):
+        if name == "status":
+            self._status = data
+            with self._lock:
+                if self.state == STATE_CLOSED or data["state"] == STATE_PENDING:
+                    return
+                self.state = data["state"]
+                self.error = data.get("error")
+                if self.state in (STATE_READY, STATE_ERROR):
+                    self._done.set()
+        elif name == "lost":
+            if self.on_session_lost:
+                self.on_session_lost(self.broadcaster, RuntimeError(data))
+        elif name == "exit":
+            with self._lock:
+                if self.state == STATE_CLOSED:
+                    return
+                was_ready = self.state == STATE_READY
+                self.state = STATE_ERROR
+                self.error = f"工作进程已退出: {data}"
+                self._done.set()
+            if was_ready and self.on_session_lost:
+                self.on_session_lost(self.broadcaster, RuntimeError(self.error))
+
+
+class WorkerPool:
+    """会话工作进程池
+
+    保持 standby 个已启动的空闲进程，新会话不需要等待解释器启动和 MAA 导入。
+    每个会话独占一个进程，会话关闭时进程退出。服务退出前调用 shutdown 结束所有工作进程。
+
+    MAA 的 Resource 是原生对象，不能跨进程共享，每个工作进程各自加载一份资源和 OCR 模型，
+    内存占用随会话数量增长；需要共享模型内存时使用默认的 thread 模式。
+    """
+
+    def __init__(self, standby: int = 1):
+        """
+        :param standby: 预先启动的空闲进程数量
+        """
+        self.standby = standby
+        self.spawned = 0
+        self._idle: List[WorkerProcess] = []
+        # 启动过的所有工作进程，shutdown 时逐个关闭
+        self._workers: List[WorkerProcess] = []
+        self._lock = threading.Lock()
+        self._filling = False
+
+    @property
+    def stats(self) -> dict:
+        with self._lock:
+            idle = len(self._idle)
+        return {"spawned": self.spawned, "idle": idle}
+
+    def warm(self):
+        """在后台补足空闲进程"""
+        with self._lock:
+            if self._filling or len(self._idle) >= self.standby:
+                return
+            self._filling = True
+        threading.Thread(target=self._fill, name="WorkerPoolFill", daemon=True).start()
+
+    def acquire(self) -> WorkerProcess:
+        worker = None
+        with self._lock:
+            while self._idle and worker is None:
+                candidate = self._idle.pop()
+                if candidate.alive:
+                    worker = candidate
+        if worker is None:
+            worker = self._spawn()
+        self.warm()
+        return worker
+
+    def create_session(
+            self,
+            controller_class,
+            controller_kwargs: Dict[str, Any],
+            resource_path: str = None,
+            on_session_lost: Callable[[RemoteBroadcaster, Exception], None] = None,
+    ) -> WorkerSession:
+        """在独立进程中创建会话，调用 start() 后开始初始化"""
+        return WorkerSession(self.acquire(), controller_class, controller_kwargs, resource_path, on_session_lost)
+
+    def shutdown(self):
+        """关闭空闲和正在运行会话的工作进程，工作进程退出前结束各自的 WebDriver 会话"""
+        with self._lock:
+            workers = [worker for worker in self._workers if worker.alive]
+            self._idle.clear()
+            self._workers.clear()
+        # 并行关闭，总耗时不超过单个进程的 CLOSE_TIMEOUT
+        threads = [threading.Thread(target=worker.close, daemon=True) for worker in workers]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(CLOSE_TIMEOUT + 2)
+
+    def _spawn(self) -> WorkerProcess:
+        worker = WorkerProcess()
+        with self._lock:
+            self.spawned += 1
+            self._workers = [existing for existing in self._workers if existing.alive]
+            self._workers.append(worker)
+        return worker
+
+    def _fill(self):
+        try:
+            while True:
+                with self._lock:
+                    if len(self._idle) >= self.standby:
+                        return
+                worker = self._spawn()
+                with self._lock:
+                    self._idle.append(worker)
+        except Exception as e:
+            print(f"启动工作进程失败: {e}")
+        finally:
+            with self._lock:
+                self._filling = False
@@ -0,0 +1,142 @@
+import json
+import time
+from typing import Any, Mapping, Optional, Union
+
+from .adaptive_rate import AdaptiveRateController, StreamBounds
+from .frame_protocol import (
+    FORMAT_BINARY,
+    FORMAT_JSON,
+    heartbeat_message,
+    json_delta_frame,
+    json_frame,
+    pack_delta_frame,
+    pack_frame,
+    parse_codec,
+)
+from .screen_broadcaster import Frame
+
+# 画面无变化时的心跳间隔(秒)
+HEARTBEAT_INTERVAL = 5.0
+
+Message = Union[str, bytes]
+
+
+class StreamClient:
+    """单个 /screen 连接的推流状态
+
+    负责格式协商、增量帧、心跳以及自适应帧率/质量，与具体的 WebSocket 实现无关。
+
+    连接参数(查询参数)与控制消息字段:
+    - format: json(默认，兼容旧客户端) 或 binary(帧头 + 原始图像字节)
+    - codec: jpeg(默认) 或 webp
+    - delta: 1 表示启用增量模式，连续帧只发送变化区域的补丁，定期发送关键帧
+    - target_fps / min_fps / max_kbps / min_quality / max_quality / min_scale / max_scale:
+      自适应控制的约束，推流过程中可通过 {"type": "config", ...} 控制消息修改
+    """
+
+    def __init__(
+            self,
+            stream_format: str = FORMAT_JSON,
+            codec_name: Optional[str] = None,
+            delta_mode: bool = False,
+            bounds: Optional[StreamBounds] = None,
+    ):
+        self.stream_format = stream_format
+        self.codec = parse_codec(codec_name)
+        self.delta_mode = delta_mode
+        self.rate = AdaptiveRateController(bounds)
+        self.last_seq = 0
+        self._last_scale: Optional[float] = None
+        self._last_sent = time.monotonic()
+        self._next_send_at = 0.0
+
+    @classmethod
+    def from_args(cls, args: Mapping[str, Any]) -> "StreamClient":
+        """根据连接查询参数创建，无效的参数使用默认值"""
+        bounds = StreamBounds()
+        bounds.update(dict(args))
+        return cls(
+            stream_format=args.get('format', FORMAT_JSON),
+            codec_name=args.get('codec'),
+            delta_mode=args.get('delta') in ('1', 'true'),
+            bounds=bounds,
+        )
+
+    @property
+    def interval(self) -> float:
+        return self.rate.interval
+
+    def reset(self):
+        """切换到新的截图生产者后重新开始计数"""
+        self.last_seq = 0
+        self._last_scale = None
+
+    def handle_control(self, message: Message) -> bool:
+        """处理客户端发来的控制消息，返回是否修改了约束"""
+        try:
+            data = json.loads(message)
+        except (TypeError, ValueError):
+            return False
+        if not isinstance(data, dict) or data.get('type') != 'config':
+            return False
+        try:
+            self.rate.update_bounds(data)
+        except (TypeError, ValueError) as e:
+            print(f"忽略无效的推流配置: {e}")
+            return False
+        return True
+
+    def wait_time(self) -> float:
+        """距离允许发送下一帧还需等待的时间(秒)"""
+        return max(0.0, self._next_send_at - time.monotonic())
+
+    def heartbeat(self) -> Optional[str]:
+        """距上次发送超过 HEARTBEAT_INTERVAL 时返回心跳消息"""
+        if time.monotonic() - self._last_sent < HEARTBEAT_INTERVAL:
+            return None
+        self._last_sent = time.monotonic()
+        return heartbeat_message(self.last_seq)
+
+    def is_cached(self, frame: Frame) -> bool:
+        """render(frame) 是否只需要读取其他连接已经生成的编码结果，不需要编码图像"""
+        quality = self.rate.quality
+        scale = self.rate.scale
+        if self.delta_mode and frame.seq == self.last_seq + 1 and scale == self._last_scale:
+            return frame.is_delta_ready(self.codec, quality, scale=scale)
+        return frame.is_encoded(self.codec, quality, scale)
+
+    def render(self, frame: Frame, capture_seconds: Optional[float] = None) -> Message:
+        """按协商的格式生成帧消息
+
+        :param frame: 要发送的帧
+        :param capture_seconds: 生产者统计的截图耗时，用于约束帧率
+        """
+        if capture_seconds is not None:
+            self.rate.record_capture(capture_seconds)
+        quality = self.rate.quality
+        scale = self.rate.scale
+        width, height = frame.size(scale)
+
+        # 只有收到了上一帧且分辨率未变的客户端才能应用增量补丁
+        tiles = None
+        if self.delta_mode and frame.seq == self.last_seq + 1 and scale == self._last_scale:
+            tiles = frame.delta(self.codec, quality, scale=scale)
+        self.last_seq = frame.seq
+        self._last_scale = scale
+
+        if tiles is not None:
+            if self.stream_format == FORMAT_BINARY:
+                return pack_delta_frame(tiles, frame.seq, frame.timestamp, width, height, self.codec)
+            return json_delta_frame(tiles, frame.seq, frame.timestamp, width, height)
+
+        payload = frame.encoded(self.codec, quality, scale)
+        if self.stream_format == FORMAT_BINARY:
+            return pack_frame(payload, frame.seq, frame.timestamp, width, height, self.codec)
+        return json_frame(payload, frame.seq, frame.timestamp, width, height)
+
+    def record_sent(self, message: Message, encode_seconds: float, send_seconds: float):
+        """记录发送耗时(背压)，调整后续参数并安排下一帧的发送时间"""
+        now = time.monotonic()
+        self._last_sent = now
+        self.rate.record_frame(len(message), encode_seconds, send_seconds)
+        self._next_send_at = now + max(0.0, self.rate.interval - send_seconds)
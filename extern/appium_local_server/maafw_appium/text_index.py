@@ -0,0 +1,150 @@
+import bisect
+from collections import defaultdict
+from typing import Dict, Iterable, List, Sequence, Set, Tuple
+
+Bounds = Tuple[int, int, int, int]
+
+# 查找方式
+MATCH_EXACT = "exact"
+MATCH_CONTAINS = "contains"
+MATCH_PREFIX = "prefix"
+MATCH_FUZZY = "fuzzy"
+MATCH_MODES = (MATCH_EXACT, MATCH_CONTAINS, MATCH_PREFIX, MATCH_FUZZY)
+
+# 建立索引的 n-gram 长度，中文界面常见单字查询，所以从 1 开始
+GRAM_SIZES = (1, 2, 3)
+
+
+def _grams(text: str, size: int) -> Set[str]:
+    return {text[i:i + size] for i in range(len(text) - size + 1)}
+
+
+def edit_distance(a: str, b: str, limit: int) -> int:
+    """Levenshtein 距离，超过 limit 时提前返回 limit + 1"""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + (ca != cb),
+            ))
+        if min(current) > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
+
+
+class TextIndex:
+    """界面元素文本的倒排索引
+
+    同一文本只索引一次，记录拥有该文本的元素；查找结果按元素在页面中的顺序返回坐标。
+    - exact: 文本完全相等
+    - contains: 子串查找，先用 n-gram 倒排表求候选再逐个确认
+    - prefix: 前缀查找，在排好序的文本列表上二分
+    - fuzzy: 编辑距离不超过 max_distance
+    """
+
+    def __init__(self, entries: Iterable[Tuple[Bounds, Iterable[str]]]):
+        """
+        :param entries: (元素坐标, 元素的文本属性值) 序列，按页面顺序
+        """
+        self.bounds: List[Bounds] = []
+        self.values: List[str] = []
+        # 文本 -> 文本编号
+        self._value_ids: Dict[str, int] = {}
+        # 文本编号 -> 元素编号列表
+        self._postings: List[List[int]] = []
+        # n-gram -> 文本编号集合
+        self._grams: Dict[str, Set[int]] = defaultdict(set)
+
+        for bounds, texts in entries:
+            element_id = len(self.bounds)
+            self.bounds.append(bounds)
+            for text in set(texts):
+                value_id = self._value_ids.get(text)
+                if value_id is None:
+                    value_id = self._add_value(text)
+                self._postings[value_id].append(element_id)
+
+        self._sorted = sorted(self.values)
+
+    def __len__(self) -> int:
+        return len(self.bounds)
+
+    def _add_value(self, text: str) -> int:
+        value_id = len(self.values)
+        self.values.append(text)
+        self._value_ids[text] = value_id
+        self._postings.append([])
+        for size in GRAM_SIZES:
+            for gram in _grams(text, size):
+                self._grams[gram].add(value_id)
+        return value_id
+
+    def find(self, text: str, match: str = MATCH_CONTAINS, max_distance: int = 1) -> List[Bounds]:
+        """
+        :param text: 要查找的文本
+        :param match: exact / contains / prefix / fuzzy
+        :param max_distance: fuzzy 查找允许的最大编辑距离
+        :return: 元素坐标 [(x, y, w, h), ...]，fuzzy 按距离从近到远，其余按页面顺序
+        """
+        if match == MATCH_EXACT:
+            value_id = self._value_ids.get(text)
+            return self._collect([] if value_id is None else [value_id])
+        if match == MATCH_CONTAINS:
+            return self._collect(self._contains(text))
+        if match == MATCH_PREFIX:
+            return self._collect(self._prefix(text))
+        if match == MATCH_FUZZY:
+            return self._fuzzy(text, max_distance)
+        raise ValueError(f"未知的查找方式: {match}")
+
+    def _contains(self, text: str) -> List[int]:
+        if not text:
+            return list(range(len(self.values)))
+        size = min(len(text), GRAM_SIZES[-1])
+        candidates = None
+        for gram in _grams(text, size):
+            postings = self._grams.get(gram)
+            if not postings:
+                return []
+            candidates = set(postings) if candidates is None else candidates & postings
+            if not candidates:
+                return []
+        return [value_id for value_id in candidates if text in self.values[value_id]]
+
+    def _prefix(self, text: str) -> List[int]:
+        start = bisect.bisect_left(self._sorted, text)
+        value_ids = []
+        for value in self._sorted[start:]:
+            if not value.startswith(text):
+                break
+            value_ids.append(self._value_ids[value])
+        return value_ids
+
+    def _fuzzy(self, text: str, max_distance: int) -> List[Bounds]:
+        ranked = []
+        for value_id, value in enumerate(self.values):
+            distance = edit_distance(text, value, max_distance)
+            if distance <= max_distance:
+                ranked.append((distance, value_id))
+        seen = set()
+        positions = []
+        for distance in sorted({distance for distance, _ in ranked}):
+            element_ids = sorted({
+                element_id
+                for d, value_id in ranked if d == distance
+                for element_id in self._postings[value_id]
+                if element_id not in seen
+            })
+            seen.update(element_ids)
+            positions.extend(self.bounds[element_id] for element_id in element_ids)
+        return positions
+
+    def _collect(self, value_ids: Sequence[int]) -> List[Bounds]:
+        element_ids = sorted({element_id for value_id in value_ids for element_id in self._postings[value_id]})
+        return [self.bounds[element_id] for element_id in element_ids]
@@ -0,0 +1,196 @@
+import time
+from typing import Any, Dict, Iterable, List
+
+from selenium.webdriver.remote.command import Command
+
+# 与 selenium PointerInput 的默认移动耗时保持一致(毫秒)
+DEFAULT_MOVE_DURATION = 250
+# 单击按下的保持时间(秒)
+TAP_HOLD = 0.1
+# 不同触点的移动间隔小于该值(毫秒)时视为同时发生
+MERGE_WINDOW = 5
+
+
+class TouchActionBuilder:
+    """把多个触摸手势拼接成一个 W3C actions 请求
+
+    所有手势按顺序排在同一个触摸指针上，perform() 只产生一次 HTTP 往返。
+    生成的动作与 selenium ActionChains 触摸指针的写法一致。
+    """
+
+    def __init__(self, pointer_id: str = "touch"):
+        self.pointer_id = pointer_id
+        self.actions: List[Dict[str, Any]] = []
+
+    def __len__(self) -> int:
+        return len(self.actions)
+
+    def move(self, x: int, y: int, duration: int = DEFAULT_MOVE_DURATION) -> "TouchActionBuilder":
+        self.actions.append(_pointer_move(x, y, duration))
+        return self
+
+    def down(self) -> "TouchActionBuilder":
+        self.actions.append({"type": "pointerDown", "button": 0})
+        return self
+
+    def up(self) -> "TouchActionBuilder":
+        self.actions.append({"type": "pointerUp", "button": 0})
+        return self
+
+    def pause(self, seconds: float) -> "TouchActionBuilder":
+        self.actions.append({"type": "pause", "duration": int(seconds * 1000)})
+        return self
+
+    def tap(self, x: int, y: int) -> "TouchActionBuilder":
+        return self.move(x, y).down().pause(TAP_HOLD).up()
+
+    def long_press(self, x: int, y: int, duration: float = 2.0) -> "TouchActionBuilder":
+        """
+        :param duration: 按住时长(秒)
+        """
+        return self.move(x, y).down().pause(duration).up()
+
+    def swipe(self, x1: int, y1: int, x2: int, y2: int, duration: int) -> "TouchActionBuilder":
+        """
+        :param duration: 按下后停留的时长(毫秒)
+        """
+        return self.move(x1, y1).down().pause(duration / 1000).move(x2, y2).up()
+
+    def add(self, gesture: Dict[str, Any]) -> "TouchActionBuilder":
+        """按字典描述添加手势，字段与 /action/* 接口一致，时长单位为秒
+
+        - {"type": "tap", "x": 100, "y": 200}
+        - {"type": "long_press", "x": 100, "y": 200, "duration": 1.0}
+        - {"type": "swipe", "startX": 0, "startY": 0, "endX": 100, "endY": 100, "duration": 0.5}
+        - {"type": "pause", "duration": 0.2}
+        """
+        gesture_type = gesture.get("type")
+        if gesture_type == "tap":
+            return self.tap(gesture.get("x", 0), gesture.get("y", 0))
+        if gesture_type == "long_press":
+            return self.long_press(gesture.get("x", 0), gesture.get("y", 0), float(gesture.get("duration", 1.0)))
+        if gesture_type == "swipe":
+            return self.swipe(
+                gesture.get("startX", 0),
+                gesture.get("startY", 0),
+                gesture.get("endX", 0),
+                gesture.get("endY", 0),
+                int(float(gesture.get("duration", 0.5)) * 1000),
+            )
+        if gesture_type == "pause":
+            return self.pause(float(gesture.get("duration", 0)))
+        raise ValueError(f"未知的手势类型: {gesture_type}")
+
+    def extend(self, gestures: Iterable[Dict[str, Any]]) -> "TouchActionBuilder":
+        for gesture in gestures:
+            self.add(gesture)
+        return self
+
+    def payload(self) -> Dict[str, Any]:
+        return {
+            "actions": [{
+                "type": "pointer",
+                "id": self.pointer_id,
+                "parameters": {"pointerType": "touch"},
+                "actions": list(self.actions),
+            }]
+        }
+
+    def perform(self, driver):
+        if self.actions:
+            driver.execute(Command.W3C_ACTIONS, self.payload())
+
+
+class MultiTouchSequence:
+    """记录多个触点的按下/移动/抬起事件，生成一个多指针 W3C actions 请求
+
+    事件按 tick 排列，同一 tick 内没有动作的触点补零时长的 pause，保证事件顺序不变。
+    几乎同时到达的不同触点的移动合并到同一个 tick，双指缩放等手势同步回放；
+    事件之间的真实间隔转换为移动耗时或 pause，回放时保留原来的手势速度。
+    """
+
+    def __init__(self, pressed: Dict[int, tuple] = None):
+        """
+        :param pressed: 上一段序列结束时仍按下的触点及其坐标，在本序列开头重新按下
+        """
+        self.pressed: Dict[int, tuple] = dict(pressed or {})
+        self.contacts = set(self.pressed)
+        self.ticks: List[Dict[Any, Dict[str, Any]]] = []
+        self.events = 0
+        self.last_event = time.monotonic()
+        if self.pressed:
+            # 重新按下不计入事件数，没有新事件的序列不会发送
+            self.ticks.append({contact: _pointer_move(x, y, 0) for contact, (x, y) in self.pressed.items()})
+            self.ticks.append({contact: {"type": "pointerDown", "button": 0} for contact in self.pressed})
+
+    def __len__(self) -> int:
+        return self.events
+
+    def _elapsed(self) -> int:
+        now = time.monotonic()
+        elapsed = int((now - self.last_event) * 1000)
+        self.last_event = now
+        return elapsed if self.ticks else 0
+
+    def _append(self, contact, action: Dict[str, Any]):
+        self.ticks.append({contact: action})
+
+    def _pause(self, duration: int):
+        if duration > 0:
+            self._append(None, {"type": "pause", "duration": duration})
+
+    def down(self, contact: int, x: int, y: int):
+        self._pause(self._elapsed())
+        self.events += 1
+        self.contacts.add(contact)
+        self.pressed[contact] = (x, y)
+        self._append(contact, _pointer_move(x, y, 0))
+        self._append(contact, {"type": "pointerDown", "button": 0})
+
+    def move(self, contact: int, x: int, y: int):
+        elapsed = self._elapsed()
+        self.events += 1
+        self.contacts.add(contact)
+        self.pressed[contact] = (x, y)
+        last = self.ticks[-1] if self.ticks else None
+        if (
+                last is not None
+                and elapsed <= MERGE_WINDOW
+                and contact not in last
+                and all(action["type"] == "pointerMove" for action in last.values())
+        ):
+            # 与上一个 tick 中其他触点的移动同时进行
+            duration = max(action["duration"] for action in last.values())
+            last[contact] = _pointer_move(x, y, duration)
+            return
+        self._append(contact, _pointer_move(x, y, elapsed))
+
+    def up(self, contact: int):
+        self._pause(self._elapsed())
+        self.events += 1
+        self.contacts.add(contact)
+        self.pressed.pop(contact, None)
+        self._append(contact, {"type": "pointerUp", "button": 0})
+
+    def payload(self) -> Dict[str, Any]:
+        sources = []
+        for contact in sorted(self.contacts):
+            actions = []
+            for tick in self.ticks:
+                action = tick.get(contact, tick.get(None))
+                actions.append(action if action is not None else {"type": "pause", "duration": 0})
+            sources.append({
+                "type": "pointer",
+                "id": f"finger{contact}",
+                "parameters": {"pointerType": "touch"},
+                "actions": actions,
+            })
+        return {"actions": sources}
+
+    def perform(self, driver):
+        if self.ticks:
+            driver.execute(Command.W3C_ACTIONS, self.payload())
+
+
+def _pointer_move(x: int, y: int, duration: int) -> Dict[str, Any]:
+    return {"type": "pointerMove", "duration": int(duration), "x": int(x), "y": int(y), "origin": "viewport"}
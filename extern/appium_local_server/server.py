@@ -4,13 +4,11 @@ from typing import Optional
 from flask import Flask, request, jsonify
 
 from flask_sock import Sock
-import base64
-import cv2
-import time
 import json
-from maa.tasker import Tasker
-from maa.resource import Resource
-from maafw_appium.appium_ios_controller import AppiumIOSController
+import time
+from maafw_appium import api_handlers
+from maafw_appium.screen_broadcaster import ScreenBroadcaster
+from maafw_appium.stream_client import StreamClient
 
 app = Flask(__name__)
 sock = Sock(app)
@@ -18,209 +16,90 @@ sock = Sock(app)
 # 从环境变量获取端口
 port = int(os.environ.get('FLASK_PORT', 5000))
 
-# 全局实例
-# 添加会话状态标志
-controller: Optional[AppiumIOSController] = None
-tasker: Optional[Tasker] = None
-resource: Optional[Resource] = None
-session_active = False
-
-
-@app.route('/init', methods=['POST'])
-def init_controller():
-    global controller, tasker, resource, session_active
-    try:
-        data = request.json
-        capabilities = data.get('capabilities', {})
-        server_url = data.get('server_url', 'http://127.0.0.1:4723')
-
-        # 如果已存在会话，先清理
-        reset_controller()
-
-        controller = AppiumIOSController(
-            capabilities=capabilities,
-            server_url=server_url
-        )
-
-        # 初始化并连接控制器
-        if not controller.connect():
-            reset_controller()
-            return jsonify({"status": "error", "message": "控制器连接失败"})
-
-        # 验证会话是否成功创建
-        try:
-            controller.driver.session_id
-            session_active = True
-        except Exception as e:
-            reset_controller()
-            return jsonify({"status": "error", "message": f"会话创建失败: {str(e)}"})
-
-        # 初始化资源
-        resource = Resource()
-        resource.use_cpu()
-
-        # 初始化任务管理器
-        tasker = Tasker()
-
-        # 绑定资源和控制器
-        if not tasker.bind(resource, controller):
-            return jsonify({"status": "error", "message": "任务管理器绑定失败"})
-
-        return jsonify({"status": "success"})
-    except Exception as e:
-        session_active = False
-        reset_controller()
-        return jsonify({"status": "error", "message": str(e)})
-
-
-@sock.route('/screen')
-def screen_stream(ws):
-    global controller, tasker, session_active
-    try:
-        while True:
-            if controller and tasker and session_active:
-                try:
-                    screen = None
-                    # 检查会话状态并尝试重连
-                    try:
-                        if not controller.driver.session_id:
-                            if not controller.connect():
-                                session_active = False
-                                raise Exception("会话重连失败")
-                    except:
-                        session_active = False
-                        reset_controller()
-                        raise Exception("会话已断开")
-                except Exception as e:
-                    print(f"Failed to get cached image: {e}")
-                    continue
-
-                if screen is None and controller:
-                    try:
-                        screen = controller.screencap()
-                    except Exception as e:
-                        session_active = False
-                        reset_controller()
-                        print(f"截图失败，会话可能已断开: {e}")
-                        continue
-
-                if screen is not None:
-                    # 将图像编码为JPEG格式
-                    _, buffer = cv2.imencode('.jpg', screen)
-                    # 转换为base64字符串
-                    base64_image = base64.b64encode(buffer).decode('utf-8')
-                    # 发送给客户端
-                    ws.send(json.dumps({
-                        'type': 'screen',
-                        'data': base64_image
-                    }))
-            time.sleep(0.5)  # 控制刷新率
-    except Exception as e:
-        print(f"WebSocket error: {e}")
-        session_active = False
-
-
-def reset_controller():
-    global controller, tasker, resource, session_active
-    if controller:
-        try:
-            if hasattr(controller, 'driver') and controller.driver:
-                controller.driver.quit()
-        except:
-            pass
-    controller = None
-    tasker = None
-    resource = None
-    session_active = False
-
-
-@app.route('/action/tap', methods=['POST'])
-def handle_tap():
-    global controller, session_active
-    try:
-        if not controller or not session_active:
-            return jsonify({"status": "error", "message": "控制器未初始化"})
-
-        data = request.json
-        x = data.get('x', 0)
-        y = data.get('y', 0)
-
-        # 使用 click 方法替代 tap
-        success = controller.click(int(x), int(y))
-        if not success:
-            return jsonify({"status": "error", "message": "点击操作失败"})
-        return jsonify({"status": "success"})
-    except Exception as e:
-        return jsonify({"status": "error", "message": str(e)})
-
-
-@app.route('/action/swipe', methods=['POST'])
-def handle_swipe():
-    global controller, session_active
-    try:
-        if not controller or not session_active:
-            return jsonify({"status": "error", "message": "控制器未初始化"})
-
-        data = request.json
-        start_x = data.get('startX', 0)
-        start_y = data.get('startY', 0)
-        end_x = data.get('endX', 0)
-        end_y = data.get('endY', 0)
-        duration = data.get('duration', 0.5)
-
-        # 转换为整数并将秒转为毫秒
-        success = controller.swipe(
-            int(start_x),
-            int(start_y),
-            int(end_x),
-            int(end_y),
-            int(duration * 1000)
-        )
-        if not success:
-            return jsonify({"status": "error", "message": "滑动操作失败"})
-        return jsonify({"status": "success"})
-    except Exception as e:
-        return jsonify({"status": "error", "message": str(e)})
 
+def request_data() -> dict:
+    """合并查询参数和 JSON 请求体，session_id 可以放在任意一处"""
+    data = request.args.to_dict()
+    body = request.get_json(silent=True) if request.is_json else None
+    if isinstance(body, dict):
+        data.update(body)
+    return data
 
-@app.route('/action/long_press', methods=['POST'])
-def handle_long_press():
-    global controller, session_active
-    try:
-        if not controller or not session_active:
-            return jsonify({"status": "error", "message": "控制器未初始化"})
 
-        data = request.json
-        x = data.get('x', 0)
-        y = data.get('y', 0)
-        duration = data.get('duration', 1.0)
+def route(path: str, method: str):
+    """把 api_handlers 中的处理函数注册为 Flask 路由"""
+    func = api_handlers.ROUTES[(method, path)]
+    app.add_url_rule(path, func.__name__, lambda: jsonify(func(request_data())), methods=[method])
 
-        success = controller.long_click(x, y, duration)
 
-        if not success:
-            return jsonify({"status": "error", "message": "长按操作失败"})
-        return jsonify({"status": "success"})
-    except Exception as e:
-        return jsonify({"status": "error", "message": str(e)})
+for method, path in api_handlers.ROUTES:
+    route(path, method)
 
 
-@app.route('/screen_info', methods=['GET'])
-def get_screen_info():
-    global controller, session_active
+@sock.route('/screen')
+def screen_stream(ws):
+    """屏幕推流
+
+    通过 session_id 查询参数指定设备，未指定时跟随最近创建的会话。
+    同一设备的所有连接共享一个截图生产者，每个连接只读取缓冲区中的最新帧。
+    画面没有变化时不推送新帧，定期发送心跳。帧率、质量和缩放按
+    截图耗时与发送背压自适应调整，支持的参数见 StreamClient。
+    会话初始化期间推送 {"type": "session", "state": ..., "steps": ...} 进度消息。
+    """
+    client = StreamClient.from_args(request.args)
+    session_id = request.args.get('session_id')
+    subscribed: Optional[ScreenBroadcaster] = None
+    token = 0
+    reported = None
     try:
-        if not controller or not session_active:
-            return jsonify({"status": "error", "message": "控制器未初始化"})
-
-        return jsonify({
-            "status": "success",
-            "data": {
-                "width": controller.device_width,
-                "height": controller.device_height
-            }
-        })
+        while ws.connected:
+            session, current = api_handlers.stream_source(session_id)
+            if current is not subscribed:
+                # 会话重建后切换到新的生产者
+                if subscribed:
+                    subscribed.unsubscribe(token)
+                subscribed = current
+                client.reset()
+                if subscribed:
+                    token = subscribed.subscribe()
+                    subscribed.request_interval(token, client.interval)
+
+            # 处理客户端的控制消息
+            message = ws.receive(timeout=0)
+            if message is not None and client.handle_control(message) and subscribed:
+                subscribed.request_interval(token, client.interval)
+
+            if not subscribed:
+                # 会话初始化期间推送进度
+                if session is not None and (session.session_id, session.state) != reported:
+                    reported = (session.session_id, session.state)
+                    ws.send(json.dumps({"type": "session", **session.status}))
+                time.sleep(0.5)
+                continue
+
+            # 按自适应帧率限速，期间产生的旧帧直接跳过，只有输入操作后的突发帧立即发送
+            wait = client.wait_time()
+            paced = wait > 0
+            frame = subscribed.wait_for_frame(client.last_seq, timeout=min(wait, 0.5) if paced else 0.5, burst_only=paced)
+            if frame is None:
+                heartbeat = None if paced else client.heartbeat()
+                if heartbeat:
+                    ws.send(heartbeat)
+                continue
+
+            started = time.monotonic()
+            message = client.render(frame, subscribed.capture_seconds)
+            encoded = time.monotonic()
+            ws.send(message)
+            client.record_sent(message, encoded - started, time.monotonic() - encoded)
+            subscribed.request_interval(token, client.interval)
     except Exception as e:
-        return jsonify({"status": "error", "message": str(e)})
+        print(f"WebSocket error: {e}")
+    finally:
+        if subscribed:
+            subscribed.unsubscribe(token)
 
 
 if __name__ == '__main__':
+    api_handlers.preload_resources()
     app.run(host='127.0.0.1', port=port)
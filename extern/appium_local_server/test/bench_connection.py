@@ -0,0 +1,109 @@
+from extern.appium_local_server.maafw_appium.connection import ConnectionOptions, create_connection
+from appium.webdriver.appium_connection import AppiumConnection
+from selenium.webdriver.remote.client_config import ClientConfig
+from selenium.webdriver.remote.command import Command
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from concurrent.futures import ThreadPoolExecutor
+import base64
+import json
+import threading
+import time
+
+SCREENSHOT = base64.b64encode(b"\0" * 256 * 1024).decode()
+
+
+# 本地伪 WebDriver 服务器，统计建立的 TCP 连接数
+class FakeWebDriverHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    connections = 0
+    lock = threading.Lock()
+
+    def setup(self):
+        super().setup()
+        with FakeWebDriverHandler.lock:
+            FakeWebDriverHandler.connections += 1
+
+    def do_GET(self):
+        body = json.dumps({"value": SCREENSHOT}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+# 接受连接但从不响应，模拟卡住的 Appium / WebDriverAgent
+class StalledHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        time.sleep(3600)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def bench_stalled(name, connection, wait=10.0):
+    result = {}
+
+    def one():
+        started = time.perf_counter()
+        try:
+            connection.execute(Command.SCREENSHOT, {"sessionId": "fake"})
+            result["outcome"] = "返回"
+        except Exception as e:
+            result["outcome"] = f"抛出 {type(e).__name__}"
+        result["elapsed"] = time.perf_counter() - started
+
+    thread = threading.Thread(target=one, daemon=True)
+    thread.start()
+    thread.join(wait)
+    if thread.is_alive():
+        print(f"{name}: 服务端无响应时 {wait:.0f}s 内仍未返回，调用线程被挂起")
+    else:
+        print(f"{name}: 服务端无响应时 {result['elapsed']:.2f}s 后{result['outcome']}")
+
+
+def bench(name, connection, requests=200, workers=4):
+    FakeWebDriverHandler.connections = 0
+    latencies = []
+
+    def one(_):
+        started = time.perf_counter()
+        connection.execute(Command.SCREENSHOT, {"sessionId": "fake"})
+        latencies.append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(workers) as executor:
+        list(executor.map(one, range(requests)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    print(
+        f"{name}: 总耗时 {elapsed:.2f}s, 平均 {sum(latencies) / len(latencies):.2f}ms, "
+        f"p95 {latencies[int(len(latencies) * 0.95)]:.2f}ms, 新建连接 {FakeWebDriverHandler.connections}"
+    )
+
+
+if __name__ == "__main__":
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeWebDriverHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}"
+
+    # 截图线程、MAA 任务线程和操作请求并发访问同一会话
+    # selenium 默认连接本身已经复用长连接，吞吐量应与配置后的连接持平
+    bench("默认连接", AppiumConnection(client_config=ClientConfig(url)))
+    pooled = create_connection(url, ConnectionOptions(pool_size=4))
+    bench("配置后的连接", pooled)
+    print(f"请求耗时统计: {pooled.latency.stats}")
+    server.shutdown()
+
+    # 差别在于服务端卡住时: 默认连接没有超时，配置后的连接按读取超时和重试次数失败
+    stalled = ThreadingHTTPServer(("127.0.0.1", 0), StalledHandler)
+    stalled.daemon_threads = True
+    threading.Thread(target=stalled.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{stalled.server_address[1]}"
+    bench_stalled("默认连接", AppiumConnection(client_config=ClientConfig(url)))
+    bench_stalled("配置后的连接", create_connection(url, ConnectionOptions(read_timeout=1.0, retries=1)))
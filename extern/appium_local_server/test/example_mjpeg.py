@@ -0,0 +1,57 @@
+from extern.appium_local_server.maafw_appium.screenshot_source import MjpegStreamSource
+from extern.appium_local_server.maafw_appium.screencap_pipeline import ScreencapOptions, ScreencapPipeline
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import threading
+import time
+import cv2
+import numpy as np
+
+BOUNDARY = "--BoundaryString"
+
+
+# 本地伪 MJPEG 服务器，模拟 WebDriverAgent / UiAutomator2 的 mjpegServerPort 推流
+class FakeMjpegHandler(BaseHTTPRequestHandler):
+    fps = 30
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Type", f"multipart/x-mixed-replace; boundary={BOUNDARY}")
+        self.end_headers()
+        index = 0
+        try:
+            while True:
+                image = np.full((2532, 1170, 3), 255, dtype=np.uint8)
+                cv2.putText(image, f"frame {index}", (100, 400), cv2.FONT_HERSHEY_SIMPLEX, 4, (0, 0, 0), 8)
+                _, buffer = cv2.imencode(".jpg", image)
+                self.wfile.write(
+                    f"{BOUNDARY}\r\nContent-Type: image/jpeg\r\nContent-Length: {len(buffer)}\r\n\r\n".encode()
+                )
+                self.wfile.write(buffer.tobytes())
+                self.wfile.write(b"\r\n")
+                index += 1
+                time.sleep(1 / self.fps)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def log_message(self, format, *args):
+        pass
+
+
+if __name__ == "__main__":
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeMjpegHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}"
+
+    source = MjpegStreamSource(url)
+    source.start()
+    pipeline = ScreencapPipeline(ScreencapOptions(interpolation="linear", reduce="auto"))
+
+    # fetch() 只读取后台线程缓存的最新帧
+    for _ in range(10):
+        image = pipeline.run(source.fetch, (390, 844))
+        print(f"图像尺寸: {image.shape}, 已接收帧数: {source.frame_count}, 耗时: {pipeline.last}")
+        time.sleep(0.1)
+
+    print(f"平均耗时: {pipeline.stats['average']}")
+    source.stop()
+    server.shutdown()
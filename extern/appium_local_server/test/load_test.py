@@ -0,0 +1,321 @@
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+
+from extern.appium_local_server.maafw_appium.appium_controller import AppiumController
+from selenium.webdriver.remote.command import Command
+import cv2
+import numpy as np
+import websocket
+
+DEVICE_SIZE = (390, 844)
+# server.py 和 asgi_server.py 所在目录
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class FakeDriver:
+    """模拟 WebDriver，每个请求固定延迟，截图请求使用单独的延迟
+
+    与 Appium 服务端一样，同一会话的请求逐个处理。
+    """
+    session_id = "load-test"
+
+    def __init__(self, latency: float, capture_latency: float):
+        self.latency = latency
+        self.capture_latency = capture_latency
+        self._lock = threading.Lock()
+
+    def execute(self, command, params=None):
+        with self._lock:
+            time.sleep(self.capture_latency if command == Command.SCREENSHOT else self.latency)
+        return {"value": None}
+
+    def quit(self):
+        pass
+
+
+class FakeScreenshotSource:
+    """循环返回预先编码好的截图，每帧内容不同，推流不会因为画面不变而跳过
+
+    每次截图向 driver 发送一次截图请求，与点击争用同一会话。
+    """
+
+    def __init__(self, controller, count: int = 8):
+        self.controller = controller
+        self.frames = []
+        for i in range(count):
+            image = np.full((DEVICE_SIZE[1], DEVICE_SIZE[0], 3), 40, np.uint8)
+            cv2.putText(image, f"frame {i}", (40, 200 + i * 60), cv2.FONT_HERSHEY_SIMPLEX, 1.5, (255, 255, 255), 3)
+            self.frames.append(cv2.imencode(".png", image)[1].tobytes())
+        self.index = 0
+
+    def fetch(self) -> bytes:
+        self.controller.driver.execute(Command.SCREENSHOT)
+        self.index = (self.index + 1) % len(self.frames)
+        return self.frames[self.index]
+
+    def stop(self):
+        pass
+
+
+class LoadTestController(AppiumController):
+    """不连接设备的控制器，截图解码、推流和手势构造走真实代码路径"""
+    latency = 0.02
+    capture_latency = 0.1
+    # 为 False 时不使用命令调度器，点击与截图按到达顺序争用 driver
+    use_scheduler = True
+
+    def __init__(self, **kwargs):
+        super().__init__()
+        self.device_width, self.device_height = DEVICE_SIZE
+        # 不缓存截图，推流帧率只受服务端分发能力限制
+        self.init_screencap_pipelines(frame_cache_max_age=0)
+        self.init_actions()
+
+    def connect(self) -> bool:
+        self.driver = FakeDriver(self.latency, self.capture_latency)
+        if self.use_scheduler:
+            self.init_scheduler()
+        self.screenshot_source = FakeScreenshotSource(self)
+        return True
+
+    def request_uuid(self) -> str:
+        return "load-test"
+
+    def start_app(self, intent: str) -> bool:
+        return True
+
+    def stop_app(self, intent: str) -> bool:
+        return True
+
+    def press_key(self, keycode: int) -> bool:
+        return True
+
+    def input_text(self, text: str) -> bool:
+        return True
+
+    def query_elements_by_text(self, text: str) -> list[tuple[int, int, int, int]]:
+        return []
+
+    def device_size(self) -> tuple[int, int]:
+        return DEVICE_SIZE
+
+
+def post(base: str, path: str, data: dict) -> dict:
+    request = urllib.request.Request(
+        base + path, data=json.dumps(data).encode(), headers={"Content-Type": "application/json"}
+    )
+    with urllib.request.urlopen(request, timeout=30) as response:
+        return json.loads(response.read())
+
+
+class Results:
+    def __init__(self):
+        self.frames = 0
+        self.stream_errors = 0
+        self.latencies = []
+        self.action_errors = 0
+        self.peak_threads = None
+        self.scheduler = None
+        self.lock = threading.Lock()
+
+
+def stream_client(base: str, session_id: str, deadline: float, results: Results, fps: int):
+    url = base.replace("http://", "ws://") + f"/screen?format=binary&session_id={session_id}&target_fps={fps}"
+    try:
+        ws = websocket.create_connection(url, timeout=10)
+    except Exception:
+        with results.lock:
+            results.stream_errors += 1
+        return
+    frames = 0
+    try:
+        while time.monotonic() < deadline:
+            message = ws.recv()
+            if isinstance(message, bytes):
+                frames += 1
+    except Exception:
+        with results.lock:
+            results.stream_errors += 1
+    finally:
+        ws.close()
+        with results.lock:
+            results.frames += frames
+
+
+def action_client(base: str, session_id: str, deadline: float, results: Results, rate: float):
+    # 按固定速率发送点击，两种模式承受相同的负载，延迟不会反过来影响请求数量
+    # 各客户端的起始时间随机错开，点击不会同时到达
+    next_at = time.monotonic() + random.random() / rate
+    time.sleep(max(0.0, next_at - time.monotonic()))
+    while time.monotonic() < deadline:
+        next_at += 1.0 / rate
+        started = time.perf_counter()
+        try:
+            ok = post(base, "/action/tap", {"x": 100, "y": 200, "session_id": session_id})["status"] == "success"
+        except Exception:
+            ok = False
+        elapsed = (time.perf_counter() - started) * 1000
+        with results.lock:
+            if ok:
+                results.latencies.append(elapsed)
+            else:
+                results.action_errors += 1
+        time.sleep(max(0.0, next_at - time.monotonic()))
+
+
+def server_threads(pid: int):
+    """服务进程的线程数，只在 Linux 上可用"""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("Threads:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def run_load(
+        base: str, pid: int, streams: int, actors: int, duration: float, fps: int, tap_rate: float
+) -> Results:
+    session_id = post(base, "/init", {"capabilities": {"udid": "load-test"}})["session_id"]
+    results = Results()
+    deadline = time.monotonic() + duration
+    clients = [
+        threading.Thread(target=stream_client, args=(base, session_id, deadline, results, fps), daemon=True)
+        for _ in range(streams)
+    ] + [
+        threading.Thread(target=action_client, args=(base, session_id, deadline, results, tap_rate), daemon=True)
+        for _ in range(actors)
+    ]
+    for client in clients:
+        client.start()
+    while time.monotonic() < deadline:
+        threads = server_threads(pid)
+        if threads is not None:
+            results.peak_threads = max(results.peak_threads or 0, threads)
+        time.sleep(0.2)
+    for client in clients:
+        client.join(15)
+    with urllib.request.urlopen(f"{base}/screen_info?session_id={session_id}", timeout=30) as response:
+        results.scheduler = json.loads(response.read())["data"].get("scheduler")
+    post(base, "/session/close", {"session_id": session_id})
+    return results
+
+
+def query_worker(sessions, interval: float):
+    """模拟任务流水线运行时的页面结构查询，与截图、点击争用同一 driver"""
+    while True:
+        time.sleep(interval)
+        session = sessions.get()
+        if session is None or session.controller is None:
+            continue
+        try:
+            session.controller.driver.execute(Command.GET_PAGE_SOURCE)
+        except Exception:
+            pass
+
+
+def serve(mode: str, port: int, queries: int):
+    """在当前进程中运行服务，设备替换为 LoadTestController"""
+    # server.py 和 asgi_server.py 以所在目录为根导入 maafw_appium，与直接启动服务时一致
+    sys.path.insert(0, SERVER_DIR)
+    if mode == "flask":
+        import server as app_module
+    else:
+        import asgi_server as app_module
+    api_handlers = app_module.api_handlers
+    api_handlers.controller_class_for = lambda capabilities: LoadTestController
+    for _ in range(queries):
+        threading.Thread(target=query_worker, args=(api_handlers.sessions, 0.05), daemon=True).start()
+    # 控制器每次点击都会打印日志，测试期间不输出
+    sys.stdout = open(os.devnull, "w")
+    if mode == "flask":
+        from werkzeug.serving import make_server
+        make_server("127.0.0.1", port, app_module.app, threaded=True).serve_forever()
+    else:
+        import uvicorn
+        uvicorn.run(app_module.app, host="127.0.0.1", port=port, log_level="warning", backlog=4096)
+
+
+def start_server(mode: str, port: int, args: argparse.Namespace) -> subprocess.Popen:
+    """服务端运行在独立进程中，避免与大量客户端线程争用 GIL"""
+    command = [
+        sys.executable, "-m", "extern.appium_local_server.test.load_test", "--serve", mode, "--port", str(port),
+        "--latency", str(args.latency), "--capture-latency", str(args.capture_latency), "--queries", str(args.queries)
+    ]
+    if args.no_scheduler:
+        command.append("--no-scheduler")
+    # 子进程以包的方式运行本脚本，工作目录为仓库根目录
+    process = subprocess.Popen(command, cwd=os.path.dirname(os.path.dirname(SERVER_DIR)))
+    for _ in range(200):
+        try:
+            urllib.request.urlopen(f"http://127.0.0.1:{port}/sessions", timeout=1).read()
+            return process
+        except OSError:
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError(f"{mode} 服务启动失败")
+
+
+def report(mode: str, results: Results, duration: float, streams: int):
+    latencies = sorted(results.latencies)
+
+    def percentile(p):
+        return latencies[min(len(latencies) - 1, int(len(latencies) * p))] if latencies else 0.0
+
+    print(
+        f"{mode}: 推流 {results.frames / duration:.1f} 帧/秒 (每连接 {results.frames / duration / max(1, streams):.2f}), "
+        f"推流错误 {results.stream_errors}, 点击 {len(latencies) / duration:.1f} 次/秒, "
+        f"p50 {percentile(0.5):.1f}ms, p95 {percentile(0.95):.1f}ms, p99 {percentile(0.99):.1f}ms, "
+        f"点击错误 {results.action_errors}, 服务端峰值线程 {results.peak_threads if results.peak_threads is not None else '-'}"
+    )
+    if results.scheduler:
+        wait = results.scheduler["wait"]
+        print(
+            f"  命令排队: 点击 p95 {wait['input']['p95']:.1f}ms, 截图 p95 {wait['capture']['p95']:.1f}ms, "
+            f"合并截图 {results.scheduler['coalesced']} 次"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="对比 Flask 与 ASGI 两种服务模式的并发推流和点击性能")
+    parser.add_argument("--streams", type=int, default=200, help="并发 /screen 连接数")
+    parser.add_argument("--actors", type=int, default=50, help="并发点击客户端数")
+    parser.add_argument("--duration", type=float, default=10.0, help="每种模式的测试时长(秒)")
+    parser.add_argument("--fps", type=int, default=10, help="推流目标帧率")
+    parser.add_argument("--tap-rate", type=float, default=5.0, help="每个点击客户端每秒的点击次数")
+    parser.add_argument("--latency", type=float, default=0.02, help="模拟的 WebDriver 请求延迟(秒)")
+    parser.add_argument("--capture-latency", type=float, default=0.1, help="模拟的截图请求延迟(秒)")
+    parser.add_argument("--queries", type=int, default=0, help="服务端模拟页面结构查询的线程数")
+    parser.add_argument("--no-scheduler", action="store_true", help="不使用命令调度器，用于对比点击延迟")
+    parser.add_argument("--modes", default="flask,asgi", help="要测试的服务模式，逗号分隔")
+    parser.add_argument("--serve", help=argparse.SUPPRESS)
+    parser.add_argument("--port", type=int, default=5091, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    LoadTestController.latency = args.latency
+    LoadTestController.capture_latency = args.capture_latency
+    LoadTestController.use_scheduler = not args.no_scheduler
+    if args.serve:
+        serve(args.serve, args.port, args.queries)
+        sys.exit(0)
+
+    for mode in args.modes.split(","):
+        process = start_server(mode, args.port, args)
+        try:
+            results = run_load(
+                f"http://127.0.0.1:{args.port}", process.pid, args.streams, args.actors, args.duration, args.fps,
+                args.tap_rate
+            )
+        finally:
+            process.terminate()
+            process.wait()
+        report(mode, results, args.duration, args.streams)
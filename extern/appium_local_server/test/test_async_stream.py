@@ -0,0 +1,56 @@
+import asyncio
+import threading
+import time
+import unittest
+
+from extern.appium_local_server.maafw_appium.async_stream import FrameHubs
+
+
+class SlowBroadcaster:
+    """没有新帧的生产者，记录同时等待帧的线程数"""
+    running = True
+
+    def __init__(self):
+        self.waiting = 0
+        self.max_waiting = 0
+        self._lock = threading.Lock()
+
+    def wait_for_frame(self, after_seq: int = 0, timeout: float = 1.0):
+        with self._lock:
+            self.waiting += 1
+            self.max_waiting = max(self.max_waiting, self.waiting)
+        time.sleep(timeout)
+        with self._lock:
+            self.waiting -= 1
+        return None
+
+
+def pump_threads() -> int:
+    return sum(1 for thread in threading.enumerate() if thread.name == "FrameHub")
+
+
+class FrameHubTest(unittest.TestCase):
+
+    def test_reattach_while_pump_winding_down(self):
+        async def scenario():
+            hubs = FrameHubs()
+            broadcaster = SlowBroadcaster()
+            hub = hubs.acquire(broadcaster)
+            await asyncio.sleep(0.1)
+            # 等待线程还在 wait_for_frame 中时断开，随后立即有新连接
+            hubs.release(hub)
+            again = hubs.acquire(broadcaster)
+            await asyncio.sleep(1.2)
+            self.assertIs(again, hub)
+            self.assertEqual(broadcaster.max_waiting, 1)
+            self.assertEqual(pump_threads(), 1)
+            hubs.release(again)
+            await asyncio.sleep(0.7)
+            self.assertEqual(pump_threads(), 0)
+            self.assertTrue(hub.idle)
+
+        asyncio.run(scenario())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,94 @@
+import json
+import threading
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+from extern.appium_local_server.maafw_appium import custom_actions
+from extern.appium_local_server.maafw_appium.custom_actions import CANCELLED, ForEach
+
+
+class StubController:
+    cached_image = object()
+
+    def post_screencap(self):
+        return SimpleNamespace(wait=lambda: None)
+
+
+class StubContext:
+    """按流水线中的 expected 返回识别结果，记录每次识别的项
+
+    gate 不为空时，item 为 "slow" 的项等待 gate 之后才返回
+    """
+
+    def __init__(self):
+        self.tasker = SimpleNamespace(controller=StubController())
+        self.recognized = []
+        self.gate = None
+        self._lock = threading.Lock()
+
+    def clone(self):
+        return self
+
+    def run_recognition(self, entry: str, image, pipeline: dict):
+        node = pipeline[entry]
+        item = node["recognition"]["text"]
+        with self._lock:
+            self.recognized.append(item)
+        if item == "slow" and self.gate is not None:
+            self.gate.wait(5)
+        if item == "hit" and self.gate is not None:
+            self.gate.set()
+        return SimpleNamespace(box=(0, 0, 1, 1) if item == "hit" else None)
+
+
+def make_pipelines(items: list) -> list:
+    return [{"Entry": {"recognition": {"text": item}}} for item in items]
+
+
+class RecognizeItemsTest(unittest.TestCase):
+    """parallel 分支: 共用截图、提前结束和 cancelled 记录"""
+
+    def statuses(self, outcomes: list) -> list:
+        return [ForEach._status(outcome) for outcome in outcomes]
+
+    def test_sequential_short_circuit(self):
+        context = StubContext()
+        with mock.patch.object(custom_actions, "CONCURRENT_RECOGNITION", False):
+            outcomes = ForEach()._recognize_items(context, make_pipelines(["miss", "hit", "a", "b"]), 1, 4)
+        self.assertEqual(self.statuses(outcomes), ["failed", "success", "cancelled", "cancelled"])
+        self.assertEqual(context.recognized, ["miss", "hit"])
+        self.assertIs(outcomes[2], CANCELLED)
+
+    def test_concurrent_reports_running_items(self):
+        context = StubContext()
+        context.gate = threading.Event()
+        with mock.patch.object(custom_actions, "CONCURRENT_RECOGNITION", True):
+            outcomes = ForEach()._recognize_items(context, make_pipelines(["slow", "hit", "a", "b"]), 1, 2)
+        # slow 在结果确定时已经开始，记录真实结果而不是 cancelled
+        self.assertEqual(self.statuses(outcomes), ["failed", "success", "cancelled", "cancelled"])
+        self.assertEqual(sorted(context.recognized), ["hit", "slow"])
+
+    def test_and_flag_stops_on_failure(self):
+        context = StubContext()
+        with mock.patch.object(custom_actions, "CONCURRENT_RECOGNITION", False):
+            outcomes = ForEach()._recognize_items(context, make_pipelines(["hit", "miss", "hit"]), 0, 4)
+        self.assertEqual(self.statuses(outcomes), ["success", "failed", "cancelled"])
+
+    def test_run_parallel(self):
+        param = {
+            "forEachList": ["miss", "hit", "a"],
+            "forEachTarget": [["Entry", "recognition", "text"]],
+            "pipeline": {"Entry": {"recognition": {"text": "placeholder"}}},
+            "flag": 1,
+            "parallel": True,
+        }
+        context = StubContext()
+        with mock.patch.object(custom_actions, "CONCURRENT_RECOGNITION", True):
+            result = ForEach().run(context, SimpleNamespace(custom_action_param=json.dumps(param)))
+        self.assertTrue(result.success)
+        self.assertIn("hit", context.recognized)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,49 @@
+import unittest
+
+import cv2
+import numpy as np
+
+from extern.appium_local_server.maafw_appium.frame_diff import dirty_rects
+
+
+def screen() -> np.ndarray:
+    """带文字和色块的模拟界面"""
+    image = np.full((844, 390, 3), 235, np.uint8)
+    for i in range(16):
+        cv2.putText(image, f"Item {i} settings", (10, 40 + i * 40), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (20, 20, 20), 2)
+    cv2.rectangle(image, (0, 700), (390, 844), (200, 120, 40), -1)
+    return image
+
+
+def jpeg(image: np.ndarray, quality: int) -> np.ndarray:
+    return cv2.imdecode(cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, quality])[1], cv2.IMREAD_COLOR)
+
+
+class DirtyRectsTest(unittest.TestCase):
+
+    def test_identical_frames(self):
+        image = screen()
+        self.assertEqual(dirty_rects(image, image.copy()), [])
+
+    def test_jpeg_recompressed_frames(self):
+        # 同一画面重新编码，只有编码噪声，不应产生任何变化区域
+        first = jpeg(screen(), 80)
+        for quality in (75, 80, 90):
+            self.assertEqual(dirty_rects(first, jpeg(first, quality)), [], quality)
+
+    def test_real_change_detected(self):
+        image = screen()
+        changed = image.copy()
+        cv2.line(changed, (100, 600), (140, 600), (180, 180, 180), 1)
+        rects = dirty_rects(jpeg(image, 80), jpeg(changed, 80))
+        self.assertEqual(len(rects), 1)
+        x, y, w, h = rects[0]
+        self.assertTrue(x <= 100 and x + w >= 140 and y <= 600 < y + h)
+
+    def test_strict_threshold(self):
+        first = jpeg(screen(), 80)
+        self.assertNotEqual(dirty_rects(first, jpeg(first, 75), threshold=0), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
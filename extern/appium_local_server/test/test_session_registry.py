@@ -0,0 +1,63 @@
+import unittest
+from unittest import mock
+
+from extern.appium_local_server.maafw_appium import api_handlers
+from extern.appium_local_server.maafw_appium.session_registry import SessionRegistry
+
+
+class FakeSession:
+    """不连接设备的会话，记录是否被关闭"""
+    count = 0
+
+    def __init__(self, controller_factory, **kwargs):
+        FakeSession.count += 1
+        self.session_id = f"fake-{FakeSession.count}"
+        self.closed = False
+
+    def start(self):
+        return self
+
+    def wait(self, timeout: float = None) -> bool:
+        return True
+
+    def close(self):
+        self.closed = True
+
+
+class InitSessionTest(unittest.TestCase):
+    """/init 按设备替换会话"""
+
+    def setUp(self):
+        patcher = mock.patch.multiple(api_handlers, sessions=SessionRegistry(), DeviceSession=FakeSession)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def init(self, capabilities: dict, server_url: str = "http://127.0.0.1:4723") -> dict:
+        result = api_handlers.init_controller({"capabilities": capabilities, "server_url": server_url})
+        self.assertEqual(result["status"], "success")
+        return result
+
+    def test_empty_capabilities_replace_previous(self):
+        # 客户端检查服务状态时反复发送空 capabilities
+        first = self.init({})
+        self.init({})
+        self.assertEqual(len(api_handlers.sessions), 1)
+        self.assertNotEqual(api_handlers.sessions.get().session_id, first["session_id"])
+
+    def test_identified_devices_kept(self):
+        self.init({"appium:udid": "device-a"})
+        self.init({"appium:udid": "device-b"})
+        self.init({})
+        self.assertEqual(len(api_handlers.sessions), 3)
+        self.init({"appium:udid": "device-a"})
+        self.init({})
+        self.assertEqual(len(api_handlers.sessions), 3)
+
+    def test_other_server_kept(self):
+        self.init({})
+        self.init({}, server_url="http://127.0.0.1:4724")
+        self.assertEqual(len(api_handlers.sessions), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
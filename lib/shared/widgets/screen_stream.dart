@@ -32,6 +32,9 @@ class _ScreenStreamState extends State<ScreenStream> {
   int _reconnectAttempts = 0; // 添加重连次数计数
   static const int maxReconnectAttempts = 3; // 最大重连次数
   static const Duration reconnectDelay = Duration(seconds: 3); // 重连延迟
+  // 二进制帧头: magic(2) version(1) frame_type(1) codec(1) 保留(1)
+  // seq(4) timestamp_ms(8) width(2) height(2)
+  static const int frameHeaderSize = 22;
 
   @override
   void initState() {
@@ -65,7 +68,7 @@ class _ScreenStreamState extends State<ScreenStream> {
     try {
       final serverState = context.read<ServerState>();
       final port = serverState.pythonStatus.port;
-      final uri = Uri.parse('ws://127.0.0.1:$port/screen');
+      final uri = Uri.parse('ws://127.0.0.1:$port/screen?format=binary');
 
       print('正在连接 WebSocket: $uri');
       final channel = WebSocketChannel.connect(uri);
@@ -74,7 +77,9 @@ class _ScreenStreamState extends State<ScreenStream> {
         (message) {
           _reconnectAttempts = 0; // 连接成功后重置计数
           _channel = channel;
-          if (message is String) {
+          if (message is List<int>) {
+            _handleBinaryFrame(message);
+          } else if (message is String) {
             try {
               final jsonData = json.decode(message);
               if (jsonData['type'] == 'screen') {
@@ -112,6 +117,19 @@ class _ScreenStreamState extends State<ScreenStream> {
     }
   }
 
+  void _handleBinaryFrame(List<int> message) {
+    // 校验帧头魔数 'MF'
+    if (message.length <= frameHeaderSize ||
+        message[0] != 0x4D ||
+        message[1] != 0x46) {
+      print('无效的二进制帧');
+      return;
+    }
+    final bytes =
+        message is Uint8List ? message : Uint8List.fromList(message);
+    _updateImage(Uint8List.sublistView(bytes, frameHeaderSize));
+  }
+
   void _reconnect() {
     if (!mounted ||
         !widget.isConnected ||